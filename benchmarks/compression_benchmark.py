@@ -0,0 +1,81 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+'''
+Compares bytes on the wire and encoding time of uncompressed and compressed
+:class:`.QTable` messages serialized by :class:`.QWriter`.
+
+Usage::
+
+    python setup.py build_ext --inplace
+    env PYTHONPATH=. python benchmarks/compression_benchmark.py [rows]
+'''
+
+import sys
+import time
+
+import numpy
+
+from qpython import qwriter, utils
+from qpython.qconnection import MessageType
+from qpython.qtype import QSYMBOL_LIST, QTIMESPAN_LIST, QDOUBLE_LIST, QINT_LIST
+from qpython.qcollection import qlist, qtable
+
+
+
+def sample_table(rows):
+    '''Builds a table resembling a batch of trades.'''
+    rnd = numpy.random.RandomState(0)
+    symbols = numpy.array([b'AAPL', b'MSFT', b'IBM', b'GOOG', b'ORCL', b'CSCO'])
+
+    return qtable(qlist(numpy.array(['sym', 'time', 'price', 'size']), qtype = QSYMBOL_LIST),
+                  [qlist(symbols[rnd.randint(0, len(symbols), rows)], qtype = QSYMBOL_LIST),
+                   qlist(numpy.cumsum(rnd.randint(0, 1000000, rows)).astype(numpy.int64), qtype = QTIMESPAN_LIST),
+                   qlist(100 + rnd.randint(0, 20, rows) * 0.25, qtype = QDOUBLE_LIST),
+                   qlist(rnd.randint(1, 10, rows) * 100, qtype = QINT_LIST)])
+
+
+def measure(table, repeat, **options):
+    writer = qwriter.QWriter(None, 3)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        message = writer.write(table, MessageType.ASYNC, **options)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return message, best
+
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    table = sample_table(rows)
+
+    print('%-24s %12s %8s %12s' % ('mode', 'bytes', 'ratio', 'encode [s]'))
+    message, elapsed = measure(table, 5)
+    print('%-24s %12d %7.1f%% %12.4f' % ('uncompressed', len(message), 100., elapsed))
+
+    implementations = [('compressed (python)', utils.compress)]
+    try:
+        from qpython import fastutils
+        implementations.append(('compressed (compiled)', fastutils.compress))
+    except ImportError:
+        print('qpython.fastutils is not available, build it with: python setup.py build_ext --inplace')
+
+    for name, compress in implementations:
+        qwriter.compress = compress
+        compressed, elapsed = measure(table, 1 if compress is utils.compress else 5, compress = True)
+        print('%-24s %12d %7.1f%% %12.4f' % (name, len(compressed), 100. * len(compressed) / len(message), elapsed))
@@ -0,0 +1,92 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+'''
+Compares decoding time of deeply nested general lists of atoms read by
+:class:`.QReader` with the former buffer, which built the struct format and
+sliced the data for each read value.
+
+Usage::
+
+    env PYTHONPATH=. python benchmarks/nested_benchmark.py [items] [depth]
+'''
+
+import struct
+import sys
+import time
+
+import numpy
+
+from qpython import qreader, qwriter
+from qpython.qconnection import MessageType
+from qpython.qcollection import QDictionary
+
+
+
+class FormatBuffer(qreader.QReader.BytesBuffer):
+    '''Buffer unpacking values with format strings built per read.'''
+
+    def get(self, fmt, offset = None):
+        fmt = self.endianness + fmt
+        offset = offset if offset else struct.calcsize(fmt)
+        return struct.unpack(fmt, self.raw(offset))[0]
+
+    def get_byte(self):
+        return self.get('b')
+
+    def get_int(self):
+        return self.get('i')
+
+    def get_uint(self):
+        return self.get('I')
+
+    def get_long(self):
+        return self.get('q')
+
+
+def nested(items, depth):
+    '''Creates general list of `items` elements nested `depth` times.'''
+    if depth == 0:
+        return [1, 2.5, numpy.bytes_('sym'), True, numpy.int32(7), 'ab', None]
+
+    return [nested(items, depth - 1) for _ in range(items)] + [QDictionary([numpy.bytes_('a'), numpy.bytes_('b')], [depth, depth * 0.5])]
+
+
+def measure(reader, message, repeat = 5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        reader.read(source = message)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+
+if __name__ == '__main__':
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    depth = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    message = qwriter.QWriter(None, 3).write(nested(items, depth), MessageType.ASYNC)
+
+    reader = qreader.QReader(None)
+    legacy = qreader.QReader(None)
+    legacy._buffer = FormatBuffer()
+    assert reader.read(source = message).data == legacy.read(source = message).data
+
+    print('message size: %d bytes' % len(message))
+    print('%-24s %12s' % ('buffer', 'decode [s]'))
+    print('%-24s %12.4f' % ('format per read', measure(legacy, message)))
+    print('%-24s %12.4f' % ('precompiled structs', measure(reader, message)))
@@ -0,0 +1,79 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+'''
+Measures throughput of publishing single row updates, i.e. asynchronous
+``.u.upd`` calls, serialized by :class:`.QWriter` and written to a socket.
+
+Usage::
+
+    env PYTHONPATH=. python benchmarks/publish_benchmark.py [messages]
+'''
+
+import socket
+import sys
+import threading
+import time
+
+import numpy
+
+from qpython import qwriter, CONVERSION_OPTIONS
+from qpython.qconnection import MessageType
+
+
+
+def drain(connection):
+    while connection.recv(1 << 20):
+        pass
+
+
+def measure(function, messages, repeat = 5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for message in messages:
+            function(message)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(messages) / best
+
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rnd = numpy.random.RandomState(0)
+    symbols = [numpy.bytes_(symbol) for symbol in (b'AAPL', b'MSFT', b'IBM', b'GOOG')]
+    messages = [['.u.upd', numpy.bytes_('trade'), [numpy.timedelta64(i, 'ns'), symbols[i % len(symbols)], float(rnd.rand()), int(rnd.randint(1000))]]
+                for i in range(count)]
+
+    options = CONVERSION_OPTIONS.as_dict()
+    writer = qwriter.QWriter(None, 3)
+
+    print('%-32s %12s' % ('mode', 'msgs/s'))
+    print('%-32s %12.0f' % ('serialize, per call options', measure(lambda data: writer.write(data, MessageType.ASYNC, **options), messages)))
+    print('%-32s %12.0f' % ('serialize', measure(lambda data: writer.write(data, MessageType.ASYNC), messages)))
+
+    left, right = socket.socketpair()
+    thread = threading.Thread(target = drain, args = (right, ))
+    thread.daemon = True
+    thread.start()
+    try:
+        writer = qwriter.QWriter(left, 3)
+        print('%-32s %12.0f' % ('publish', measure(lambda data: writer.write(data, MessageType.ASYNC), messages)))
+    finally:
+        left.close()
+        thread.join()
+        right.close()
@@ -0,0 +1,87 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+'''
+Compares encoding time of symbol vectors serialized by :class:`.QWriter`
+with the former element by element loop.
+
+Usage::
+
+    env PYTHONPATH=. python benchmarks/symbol_benchmark.py [rows]
+'''
+
+import io
+import struct
+import sys
+import time
+
+import numpy
+
+from qpython import qwriter
+from qpython.qconnection import MessageType
+from qpython.qtype import QSYMBOL_LIST
+from qpython.qcollection import qlist
+
+
+
+def loop_write(data):
+    '''Serializes symbol vector writing each symbol separately.'''
+    buffer = io.BytesIO()
+    buffer.write(struct.pack('=bxi', QSYMBOL_LIST, len(data)))
+    for symbol in data:
+        if symbol:
+            buffer.write(symbol)
+        buffer.write(b'\0')
+    return buffer.getvalue()
+
+
+def measure(function, data, repeat = 5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    rnd = numpy.random.RandomState(0)
+    symbols = numpy.array([b'AAPL', b'MSFT', b'IBM', b'GOOG', b'ORCL', b'CSCO', b'', b'BRK.B'])
+    data = symbols[rnd.randint(0, len(symbols), rows)]
+
+    writer = qwriter.QWriter(None, 3)
+    write = lambda data: writer.write(data, MessageType.ASYNC)
+
+    vector = qlist(data, qtype = QSYMBOL_LIST)
+    assert write(vector)[8:] == loop_write(data)
+
+    print('%-24s %12s' % ('mode', 'encode [s]'))
+    print('%-24s %12.4f' % ('loop', measure(loop_write, data)))
+    print('%-24s %12.4f' % ('bytes vector', measure(write, vector)))
+    print('%-24s %12.4f' % ('object vector', measure(write, qlist(data.astype(object), qtype = QSYMBOL_LIST))))
+
+    try:
+        import pandas
+        from qpython._pandas import PandasQWriter
+    except ImportError:
+        print('pandas is not available')
+    else:
+        writer = PandasQWriter(None, 3)
+        series = pandas.Series(data.astype(str), dtype = object)
+        print('%-24s %12.4f' % ('pandas object series', measure(write, series)))
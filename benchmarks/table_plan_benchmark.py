@@ -0,0 +1,76 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+'''
+Measures throughput of decoding small tables of the same schema, e.g. tick
+updates, by :class:`.QReader` with and without cached table decode plans.
+
+Usage::
+
+    env PYTHONPATH=. python benchmarks/table_plan_benchmark.py [messages] [rows]
+'''
+
+import sys
+import time
+
+import numpy
+
+from qpython import qreader, qwriter
+from qpython.qconnection import MessageType
+from qpython.qtype import *  # @UnusedWildImport
+from qpython.qcollection import qlist, qtable
+
+
+
+def trade(rows, rnd):
+    columns = ['time', 'sym', 'price', 'size', 'stop', 'cond', 'ex', 'id']
+    data = [qlist(numpy.arange(rows, dtype = numpy.int64), qtype = QTIMESPAN_LIST),
+            qlist(numpy.array([b'AAPL', b'MSFT'])[rnd.randint(0, 2, rows)], qtype = QSYMBOL_LIST),
+            qlist(rnd.rand(rows), qtype = QDOUBLE_LIST),
+            qlist(rnd.randint(0, 1000, rows).astype(numpy.int32), qtype = QINT_LIST),
+            qlist(numpy.zeros(rows, dtype = bool), qtype = QBOOL_LIST),
+            qlist(numpy.zeros(rows, dtype = numpy.int8), qtype = QBYTE_LIST),
+            qlist(numpy.ones(rows, dtype = numpy.int16), qtype = QSHORT_LIST),
+            qlist(numpy.arange(rows, dtype = numpy.int64), qtype = QLONG_LIST)]
+    return qtable(qlist(numpy.array(columns), qtype = QSYMBOL_LIST), data)
+
+
+def measure(reader, messages, repeat = 5, **options):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for message in messages:
+            reader.read(source = message, **options)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(messages) / best
+
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    rnd = numpy.random.RandomState(0)
+    writer = qwriter.QWriter(None, 3)
+    messages = [writer.write(trade(rows, rnd), MessageType.ASYNC) for _ in range(count)]
+
+    reader = qreader.QReader(None)
+    uncached = qreader.QReader(None)
+    uncached.MAX_TABLE_PLANS = 0
+
+    print('%-36s %12s %12s' % ('mode', 'uncached', 'plans'))
+    for mode, options in (('recarray', {}), ('columnar', {'columnar_tables': True}), ('selected columns', {'columns': ['sym', 'price']})):
+        print('%-36s %12.0f %12.0f' % (mode + ' [msgs/s]', measure(uncached, messages, **options), measure(reader, messages, **options)))
@@ -0,0 +1,94 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+'''
+Compares the compiled (:mod:`qpython.fastutils`) and the pure Python
+(:mod:`qpython.utils`) implementations of the q IPC decompression.
+
+:func:`qpython.utils.uncompress` is the reference implementation,
+:func:`qpython.utils.uncompress_vectorized` is the fallback used when the
+Cython extension is not available.
+
+Usage::
+
+    python setup.py build_ext --inplace
+    env PYTHONPATH=. python benchmarks/uncompress_benchmark.py [rows]
+'''
+
+import struct
+import sys
+import time
+
+import numpy
+
+from qpython import utils
+
+
+
+def sample_message(rows):
+    '''Builds an uncompressed IPC message resembling a trade table payload.'''
+    rnd = numpy.random.RandomState(0)
+    symbols = numpy.array([b'AAPL', b'MSFT', b'IBM', b'GOOG', b'ORCL', b'CSCO'])
+
+    payload = b''.join([
+        b'\0'.join(symbols[rnd.randint(0, len(symbols), rows)]) + b'\0',
+        numpy.cumsum(rnd.randint(0, 1000, rows)).astype(numpy.int64).tobytes(),
+        (100 + rnd.randint(0, 20, rows) * 0.25).astype(numpy.float64).tobytes(),
+        (rnd.randint(1, 10, rows) * 100).astype(numpy.int32).tobytes(),
+        ])
+
+    return b'\1\2\0\0' + struct.pack('<i', len(payload) + 8) + payload
+
+
+def measure(uncompress, data, uncompressed_size, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = uncompress(data, numpy.int64(uncompressed_size))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    message = sample_message(rows)
+    compressed = utils.compress(message)
+    if compressed is None:
+        raise RuntimeError('Sample message is not compressible')
+
+    data = compressed[12:]
+    uncompressed_size = len(message) - 8
+    print('Message size: %d bytes, compressed: %d bytes (%.1f%%)' % (len(message), len(compressed), 100. * len(compressed) / len(message)))
+
+    expected, elapsed = measure(utils.uncompress, data, uncompressed_size, 1)
+    assert expected.tobytes() == message[8:], 'utils.uncompress: round trip failed'
+    print('%-28s %10.4f s %10.2f MB/s %8.1fx' % ('utils.uncompress', elapsed, uncompressed_size / elapsed / 1e6, 1.0))
+
+    result, vectorized_elapsed = measure(utils.uncompress_vectorized, data, uncompressed_size, 5)
+    assert result.tobytes() == expected.tobytes(), 'utils.uncompress_vectorized: output differs from utils.uncompress'
+    print('%-28s %10.4f s %10.2f MB/s %8.1fx' % ('utils.uncompress_vectorized', vectorized_elapsed, uncompressed_size / vectorized_elapsed / 1e6, elapsed / vectorized_elapsed))
+
+    try:
+        from qpython import fastutils
+    except ImportError:
+        print('qpython.fastutils is not available, build it with: python setup.py build_ext --inplace')
+    else:
+        result, fast_elapsed = measure(fastutils.uncompress, data, uncompressed_size, 5)
+        assert result.tobytes() == expected.tobytes(), 'fastutils.uncompress: output differs from utils.uncompress'
+        print('%-28s %10.4f s %10.2f MB/s %8.1fx' % ('fastutils.uncompress', fast_elapsed, uncompressed_size / fast_elapsed / 1e6, elapsed / fast_elapsed))
@@ -14,7 +14,7 @@
 #  limitations under the License.
 #
 
-__all__ = ["qconnection", "qtype", "qtemporal", "qcollection"]
+__all__ = ["qconnection", "qmultiplex", "qpool", "qtype", "qtemporal", "qcollection"]
 
 
 __version__ = "3.0.2"
@@ -61,4 +61,4 @@ class MetaData(object):
         return dict(list(self.as_dict().items()) + list(kw.items()))
 
 
-CONVERSION_OPTIONS = MetaData(raw=False, numpy_temporals=False, pandas=False, single_char_strings=False)
+CONVERSION_OPTIONS = MetaData(raw=False, numpy_temporals=False, copy_arrays=False, column_threads=0, columns=None, lazy_tables=False, columnar_tables=False, symbol_cache=0, symbol_codes=False, compact_guids=False, pandas=False, pandas_categorical_symbols=False, arrow=False, single_char_strings=False, compress=False, compression_threshold=2000)
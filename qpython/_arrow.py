@@ -0,0 +1,260 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import numpy
+import pyarrow
+from pyarrow import ArrowInvalid, ArrowTypeError
+
+from qpython.qtype import *  # @UnusedWildImport
+from qpython.qtemporal import _MILLIS_PER_DAY, _QEPOCH_MS, _EPOCH_QTIMESTAMP_NS, array_to_raw_qtemporal
+
+_QEPOCH_DAYS = 10957
+_QEPOCH_MONTHS = 360
+
+ARROW_TYPE = {
+    QBOOL:       pyarrow.bool_(),
+    QBYTE:       pyarrow.int8(),
+    QSHORT:      pyarrow.int16(),
+    QINT:        pyarrow.int32(),
+    QLONG:       pyarrow.int64(),
+    QFLOAT:      pyarrow.float32(),
+    QDOUBLE:     pyarrow.float64(),
+    QTIMESTAMP:  pyarrow.timestamp('ns'),
+    QMONTH:      pyarrow.date32(),
+    QDATE:       pyarrow.date32(),
+    QDATETIME:   pyarrow.timestamp('ms'),
+    QTIMESPAN:   pyarrow.duration('ns'),
+    QMINUTE:     pyarrow.duration('s'),
+    QSECOND:     pyarrow.duration('s'),
+    QTIME:       pyarrow.duration('ms'),
+    }
+
+
+# default q types of Arrow columns without the qtype metadata
+Q_TYPE = {
+    pyarrow.bool_():    QBOOL,
+    pyarrow.int8():     QBYTE,
+    pyarrow.uint8():    QBYTE,
+    pyarrow.int16():    QSHORT,
+    pyarrow.int32():    QINT,
+    pyarrow.int64():    QLONG,
+    pyarrow.float32():  QFLOAT,
+    pyarrow.float64():  QDOUBLE,
+    pyarrow.date32():   QDATE,
+    pyarrow.date64():   QDATE,
+    pyarrow.binary(16): QGUID,
+    }
+
+
+# conversions of raw q values to the Arrow representation, types not listed
+# share the memory layout and are wrapped without copying
+_FROM_RAW = {
+    QTIMESTAMP:  lambda raw: raw + numpy.int64(_EPOCH_QTIMESTAMP_NS),
+    QMONTH:      lambda raw: (raw.astype(numpy.int64) + _QEPOCH_MONTHS).astype('datetime64[M]').astype('datetime64[D]').astype(numpy.int32),
+    QDATE:       lambda raw: raw + numpy.int32(_QEPOCH_DAYS),
+    QDATETIME:   lambda raw: numpy.round(raw * _MILLIS_PER_DAY).astype(numpy.int64) + numpy.int64(_QEPOCH_MS),
+    QMINUTE:     lambda raw: raw.astype(numpy.int64) * 60,
+    QSECOND:     lambda raw: raw.astype(numpy.int64),
+    QTIME:       lambda raw: raw.astype(numpy.int64),
+    }
+
+
+
+def _validity(mask):
+    '''Returns Arrow validity bitmap for the `mask` of null values.'''
+    return pyarrow.py_buffer(numpy.packbits(~mask, bitorder = 'little'))
+
+
+def array_from_raw(data, qtype):
+    '''Wraps `numpy` array holding raw q values of type `qtype` as a
+    `pyarrow.Array`. Values equal to q null are marked as nulls.'''
+    qtype = -abs(qtype)
+    arrow_type = ARROW_TYPE[qtype]
+
+    if qtype == QBOOL:
+        return pyarrow.array(data.view(numpy.bool_), type = arrow_type)
+
+    mask = numpy.isnan(data) if data.dtype.kind == 'f' else data == QNULLMAP[qtype][1]
+    null_count = int(numpy.count_nonzero(mask))
+
+    if qtype in _FROM_RAW:
+        data = _FROM_RAW[qtype](numpy.where(mask, 0, data) if null_count else data)
+
+    validity = _validity(mask) if null_count else None
+    return pyarrow.Array.from_buffers(arrow_type, len(data), [validity, pyarrow.py_buffer(data)], null_count = null_count)
+
+
+def array_from_symbols(symbols, encoding):
+    '''Converts list of symbols to a `pyarrow.DictionaryArray`. Empty symbols
+    are marked as nulls.'''
+    index = {}
+    codes = numpy.fromiter((index.setdefault(symbol, len(index)) for symbol in symbols), dtype = numpy.int32, count = len(symbols))
+    dictionary = pyarrow.array([symbol.decode(encoding) for symbol in index], type = pyarrow.string())
+
+    null = index.get(QNULLMAP[QSYMBOL][1])
+    indices = pyarrow.array(codes, mask = codes == null if null is not None else None)
+    return pyarrow.DictionaryArray.from_arrays(indices, dictionary)
+
+
+def array_from_guids(raw):
+    '''Wraps bytes of q guid vector as a `pyarrow.FixedSizeBinaryArray`.
+    Null guids are marked as nulls.'''
+    mask = ~numpy.frombuffer(raw, dtype = numpy.uint8).reshape(-1, 16).any(axis = 1)
+    null_count = int(numpy.count_nonzero(mask))
+    validity = _validity(mask) if null_count else None
+    return pyarrow.Array.from_buffers(pyarrow.binary(16), len(mask), [validity, pyarrow.py_buffer(raw)], null_count = null_count)
+
+
+def array_from_chars(raw, encoding):
+    '''Converts q char vector to a `pyarrow.Array` of single char strings.
+    Spaces are marked as nulls.'''
+    chars = raw.decode(encoding)
+    null = QNULLMAP[QSTRING][1].decode(encoding)
+    return pyarrow.array([None if char == null else char for char in chars], type = pyarrow.string())
+
+
+def array_from_list(data, encoding):
+    '''Converts q general list to a `pyarrow.Array`. List of q strings is
+    represented as an array of strings.'''
+    if all(isinstance(item, bytes) for item in data):
+        return pyarrow.array([item.decode(encoding) for item in data], type = pyarrow.string())
+
+    return pyarrow.array(data)
+
+
+def table(columns, data, encoding):
+    '''Creates a `pyarrow.Table` from column names and pairs of Arrow arrays
+    and q types. Column q types are stored in fields metadata.'''
+    fields = []
+    arrays = []
+    for column, (array, qtype) in zip(columns, data):
+        name = column.decode(encoding) if isinstance(column, bytes) else column
+        fields.append(pyarrow.field(name, array.type, metadata = {'qtype': str(qtype)}))
+        arrays.append(array)
+
+    return pyarrow.Table.from_arrays(arrays, schema = pyarrow.schema(fields))
+
+
+def column_qtype(field):
+    '''Returns q type of a column represented by the Arrow `field`. Type
+    stored in the qtype metadata takes precedence.'''
+    if field.metadata and b'qtype' in field.metadata:
+        return -abs(int(field.metadata[b'qtype']))
+
+    arrow_type = field.type
+    if pyarrow.types.is_dictionary(arrow_type):
+        return QSYMBOL
+    elif pyarrow.types.is_timestamp(arrow_type):
+        return QTIMESTAMP
+    elif pyarrow.types.is_duration(arrow_type) or pyarrow.types.is_time64(arrow_type):
+        return QTIMESPAN
+    elif pyarrow.types.is_time32(arrow_type):
+        return QTIME
+
+    return Q_TYPE.get(arrow_type, QGENERAL_LIST)
+
+
+def _null_mask(array):
+    '''Returns mask of null values of the Arrow `array` or ``None`` if it
+    doesn't contain nulls.'''
+    if not array.null_count:
+        return None
+
+    bitmap = numpy.frombuffer(array.buffers()[0], dtype = numpy.uint8)
+    return numpy.unpackbits(bitmap, count = array.offset + len(array), bitorder = 'little')[array.offset:] == 0
+
+
+def _values(array, dtype):
+    '''Returns view of the values buffer of primitive Arrow `array`.'''
+    return numpy.frombuffer(array.buffers()[1], dtype = dtype)[array.offset : array.offset + len(array)]
+
+
+def _temporal_values(array):
+    '''Returns view of Arrow temporal `array` as ``datetime64`` or
+    ``timedelta64`` array.'''
+    arrow_type = array.type
+    if pyarrow.types.is_date32(arrow_type):
+        return _values(array, numpy.int32).astype('datetime64[D]')
+    elif pyarrow.types.is_date64(arrow_type):
+        return _values(array, numpy.int64).view('datetime64[ms]')
+    elif pyarrow.types.is_timestamp(arrow_type):
+        return _values(array, numpy.int64).view('datetime64[%s]' % arrow_type.unit)
+    elif pyarrow.types.is_duration(arrow_type) or pyarrow.types.is_time64(arrow_type):
+        return _values(array, numpy.int64).view('timedelta64[%s]' % arrow_type.unit)
+    elif pyarrow.types.is_time32(arrow_type):
+        return _values(array, numpy.int32).astype('timedelta64[%s]' % arrow_type.unit)
+
+    raise ValueError('Unable to represent %s as q temporal' % arrow_type)
+
+
+def array_to_raw(array, qtype, encoding):
+    '''Converts the Arrow `array` to raw q representation of a vector of
+    type `qtype`. Nulls are replaced by q null values.
+
+    :returns: bytes-like object with raw vector data
+    '''
+    qtype = -abs(qtype)
+    if qtype == QSYMBOL:
+        return _symbols_to_raw(array, encoding)
+
+    if pyarrow.types.is_dictionary(array.type):
+        array = array.dictionary_decode()
+    mask = _null_mask(array)
+
+    if qtype == QGUID:
+        if array.type != pyarrow.binary(16):
+            raise ValueError('Unable to represent %s as q guid' % array.type)
+        values = numpy.frombuffer(array.buffers()[1], dtype = numpy.uint8).reshape(-1, 16)[array.offset : array.offset + len(array)]
+        return numpy.where(mask[:, None], numpy.uint8(0), values) if mask is not None else values
+    elif qtype == QCHAR:
+        null = QNULLMAP[QSTRING][1].decode(encoding)
+        return ''.join(null if char is None else char for char in array.to_pylist()).encode(encoding)
+    elif qtype == QBOOL:
+        return array.fill_null(False).to_numpy(zero_copy_only = False).astype(numpy.bool_)
+    elif qtype in TEMPORAL_Q_TYPE:
+        values = _temporal_values(array)
+        if mask is not None:
+            values = numpy.where(mask, values.dtype.type('NaT'), values)
+        return array_to_raw_qtemporal(values.astype(TEMPORAL_Q_TYPE[qtype]), qtype)
+
+    dtype = PY_TYPE[qtype]
+    if not pyarrow.types.is_integer(array.type) and not pyarrow.types.is_floating(array.type):
+        raise ValueError('Unable to represent %s as q type: %s' % (array.type, hex(qtype)))
+
+    values = _values(array, array.type.to_pandas_dtype()).astype(dtype, copy = False)
+    return numpy.where(mask, QNULLMAP[qtype][1], values) if mask is not None else values
+
+
+def _symbols_to_raw(array, encoding):
+    if not pyarrow.types.is_dictionary(array.type):
+        array = array.dictionary_encode()
+
+    # each distinct symbol is encoded once, rows are written by the indices
+    symbols = numpy.empty(len(array.dictionary) + 1, dtype = object)
+    symbols[:-1] = [(symbol.encode(encoding) if isinstance(symbol, str) else symbol or b'') + b'\0' for symbol in array.dictionary.to_pylist()]
+    symbols[-1] = b'\0'  # index -1 represents null
+
+    indices = array.indices.fill_null(-1).to_numpy(zero_copy_only = False)
+    return b''.join(symbols[indices])
+
+
+def array_to_strings(array, encoding):
+    '''Converts Arrow array of strings or binaries to list of encoded q
+    strings, nulls are represented as empty strings.'''
+    if pyarrow.types.is_dictionary(array.type):
+        array = array.dictionary_decode()
+
+    return [b'' if value is None else value.encode(encoding) if isinstance(value, str) else value for value in array.to_pylist()]
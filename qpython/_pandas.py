@@ -15,7 +15,6 @@
 #
 
 import pandas
-import struct
 import sys
 if sys.version > '3':
     basestring = (str, bytes)
@@ -24,8 +23,8 @@ from collections import OrderedDict
 
 from qpython import MetaData
 from qpython.qreader import QReader, QReaderException
-from qpython.qcollection import QDictionary, qlist
-from qpython.qwriter import QWriter, QWriterException
+from qpython.qcollection import QDictionary, QSymbolCodes, QGuidList, qlist
+from qpython.qwriter import QWriter, QWriterException, TYPE_INDICATOR, LIST_HEADER, TABLE_HEADER
 from qpython.qtype import *
 
 
@@ -38,8 +37,8 @@ class PandasQReader(QReader):
     @parse(QDICTIONARY)
     def _read_dictionary(self, qtype = QDICTIONARY):
         if self._options.pandas:
-            keys = self._read_object()
-            values = self._read_object()
+            keys = self._read_dictionary_part(keys = True)
+            values = self._read_dictionary_part(keys = False)
 
             if isinstance(keys, pandas.DataFrame):
                 if not isinstance(values, pandas.DataFrame):
@@ -66,14 +65,19 @@ class PandasQReader(QReader):
 
 
     @parse(QTABLE)
-    def _read_table(self, qtype = QTABLE):
-        if self._options.pandas:
+    def _read_table(self, qtype = QTABLE, projection = True, recarray = False):
+        if self._options.pandas and (recarray or not self._options.arrow):
             self._buffer.skip()  # ignore attributes
             self._buffer.skip()  # ignore dict type stamp
 
-            columns = self._read_object()
+            plan = self._read_table_plan()
+            columns = plan.columns
             self._buffer.skip() # ignore generic list type indicator
-            data = QReader._read_general_list(self, qtype)
+            selection = self._select_planned_columns(plan) if projection else None
+            data = self._read_columns(selection, plan = plan)
+
+            if selection is not None:
+                columns = numpy.asarray(columns)[selection]
 
             odict = OrderedDict()
             meta = MetaData(qtype = QTABLE)
@@ -102,16 +106,28 @@ class PandasQReader(QReader):
             df.meta = meta
             return df
         else:
-            return QReader._read_table(self, qtype = qtype)
+            return QReader._read_table(self, qtype = qtype, projection = projection, recarray = recarray)
 
 
     def _read_list(self, qtype):
         if self._options.pandas:
             self._options.numpy_temporals = True
+            if self._options.pandas_categorical_symbols:
+                self._options.symbol_codes = True
 
         qlist = QReader._read_list(self, qtype = qtype)
 
         if self._options.pandas:
+            if isinstance(qlist, QSymbolCodes):
+                if self._options.pandas_categorical_symbols:
+                    ps = pandas.Series(pandas.Categorical.from_codes(qlist.view(numpy.ndarray), categories = qlist.meta.symbols))
+                    ps.meta = MetaData(qtype = qtype)
+                    return ps
+
+                qlist = qlist.decode()
+            elif isinstance(qlist, QGuidList):
+                qlist = qlist.decode()
+
             if -abs(qtype) not in [QBOOL, QMONTH, QDATE, QDATETIME, QMINUTE, QSECOND, QTIME, QTIMESTAMP, QTIMESPAN, QSYMBOL]:
                 null = QNULLMAP[-abs(qtype)][1]
                 ps = pandas.Series(data = qlist).replace(null, numpy.nan)
@@ -148,6 +164,19 @@ class PandasQWriter(QWriter):
         if qtype is None and hasattr(data, 'meta'):
             qtype = -abs(data.meta.qtype)
 
+        if isinstance(data.dtype, pandas.CategoricalDtype):
+            categories = data.cat.categories
+            codes = data.cat.codes.values
+            if (categories.dtype == object or pandas.api.types.is_string_dtype(categories.dtype)) and qtype in (None, QSYMBOL, QSTRING):
+                self._write_symbols_by_codes(codes, categories)
+                return
+
+            # other categoricals are written as plain series, missing values
+            # are filled with q nulls below
+            if qtype is None:
+                qtype = Q_TYPE.get(categories.dtype.type, None)
+            data = pandas.Series(categories.take(codes), index = data.index).mask(codes < 0)
+
         if data.dtype == '|S1':
             qtype = QCHAR
 
@@ -161,9 +190,9 @@ class PandasQWriter(QWriter):
             # determinate type based on first element of the numpy array
             qtype = Q_TYPE.get(type(data.iloc[0]), QGENERAL_LIST)
 
-            if qtype == QSTRING:
-                # assume we have a generic list of strings -> force representation as symbol list
-                qtype = QSYMBOL
+        if qtype == QSTRING:
+            # assume we have a generic list of strings -> force representation as symbol list
+            qtype = QSYMBOL
 
         if qtype is None:
             raise QWriterException('Unable to serialize pandas series %s' % data)
@@ -172,6 +201,9 @@ class PandasQWriter(QWriter):
             self._write_generic_list(data.values)
         elif qtype == QCHAR:
             self._write_string(data.replace(numpy.nan, ' ').values.astype(numpy.string_).tobytes())
+        elif qtype == QSYMBOL and data.dtype.kind not in ('S', 'U'):
+            codes, symbols = pandas.factorize(data)
+            self._write_symbols_by_codes(codes, symbols)
         elif data.dtype.type not in (numpy.datetime64, numpy.timedelta64):
             data = data.fillna(QNULLMAP[-abs(qtype)][1])
             data = data.values
@@ -186,26 +218,36 @@ class PandasQWriter(QWriter):
             self._write_list(data, qtype = qtype)
 
 
+    def _write_symbols_by_codes(self, codes, symbols):
+        # each distinct symbol is encoded once, rows are written by the codes
+        encoded = numpy.empty(len(symbols) + 1, dtype = object)
+        encoded[:-1] = [(symbol if isinstance(symbol, bytes) else str(symbol).encode(self._encoding)) + b'\0' for symbol in symbols]
+        encoded[-1] = b'\0'  # code -1 represents null
+
+        self._buffer.pack(LIST_HEADER, QSYMBOL_LIST, len(codes))
+        self._buffer.write(b''.join(encoded[codes]))
+
+
     @serialize(pandas.DataFrame)
     def _write_pandas_data_frame(self, data, qtype = None):
         data_columns = data.columns.values
 
         if hasattr(data, 'meta') and data.meta.qtype == QKEYED_TABLE:
             # data frame represents keyed table
-            self._buffer.write(struct.pack('=b', QDICTIONARY))
-            self._buffer.write(struct.pack('=bxb', QTABLE, QDICTIONARY))
+            self._buffer.pack(TYPE_INDICATOR, QDICTIONARY)
+            self._buffer.pack(TABLE_HEADER, QTABLE, QDICTIONARY)
             index_columns = data.index.names
             self._write(qlist(numpy.array(index_columns), qtype = QSYMBOL_LIST))
             data.reset_index(inplace = True)
-            self._buffer.write(struct.pack('=bxi', QGENERAL_LIST, len(index_columns)))
+            self._buffer.pack(LIST_HEADER, QGENERAL_LIST, len(index_columns))
             for column in index_columns:
                 self._write_pandas_series(data[column], qtype = data.meta[column] if hasattr(data, 'meta') else None)
 
             data.set_index(index_columns, inplace = True)
 
-        self._buffer.write(struct.pack('=bxb', QTABLE, QDICTIONARY))
+        self._buffer.pack(TABLE_HEADER, QTABLE, QDICTIONARY)
         self._write(qlist(numpy.array(data_columns), qtype = QSYMBOL_LIST))
-        self._buffer.write(struct.pack('=bxi', QGENERAL_LIST, len(data_columns)))
+        self._buffer.pack(LIST_HEADER, QGENERAL_LIST, len(data_columns))
         for column in data_columns:
             self._write_pandas_series(data[column], qtype = data.meta[column] if hasattr(data, 'meta') else None)
 
@@ -213,7 +255,7 @@ class PandasQWriter(QWriter):
     @serialize(tuple, list)
     def _write_generic_list(self, data):
         if self._options.pandas:
-            self._buffer.write(struct.pack('=bxi', QGENERAL_LIST, len(data)))
+            self._buffer.pack(LIST_HEADER, QGENERAL_LIST, len(data))
             for element in data:
                 # assume nan represents a string null
                 self._write(' ' if type(element) in [float, numpy.float32, numpy.float64] and numpy.isnan(element) else element)
@@ -14,6 +14,8 @@
 #  limitations under the License.
 #
 
+# cython: boundscheck=False, wraparound=False, cdivision=True, language_level=3
+
 import numpy
 cimport numpy
 
@@ -23,53 +25,188 @@ ctypedef numpy.uint8_t DTYPE8_t
 
 
 
-def uncompress(numpy.ndarray[DTYPE8_t] data, DTYPE_t uncompressed_size):
-    cdef DTYPE_t n, r, i, d, s, p, pp, f
+def compress(const DTYPE8_t[:] data):
+    '''Compresses a serialized IPC message with the q IPC compression
+    algorithm.
+
+    Mirrors :func:`qpython.utils.compress` and produces identical output.
+
+    :Parameters:
+     - `data` (`numpy.uint8` array) - serialized message including the 8 bytes
+       long message header
+
+    :returns: `numpy.uint8` array with compressed message (including the
+              message and compression headers) or ``None`` if the message
+              cannot be compressed to less than half of its size or exceeds
+              2 GB
+    '''
+    cdef DTYPE_t t = data.shape[0]
+    cdef DTYPE_t e = t // 2
+    cdef DTYPE_t i, f, h, h0, s0, c, d, s, p, q, r, k
+    cdef bint g, failed = False
+    cdef DTYPE_t a[256]
+
+    if e < 12 or t > 0x7fffffff:
+        return None
+
+    compressed_array = numpy.zeros(e, dtype = numpy.uint8)
+    cdef DTYPE8_t[:] dst = compressed_array
+
+    for k in range(256):
+        a[k] = 0
+
+    for k in range(4):
+        dst[k] = data[k]
+    dst[2] = 1
+
+    i, f, h, h0, s0, p = 0, 0, 0, 0, 0, 0
+    c, d, s = 12, 12, 8
+
+    with nogil:
+        while s < t:
+            if i == 0:
+                if d > e - 17:
+                    failed = True
+                    break
+
+                i = 1
+                dst[c] = f
+                c = d
+                d += 1
+                f = 0
+
+            g = s > t - 3
+            if not g:
+                h = data[s] ^ data[s + 1]
+                p = a[h]
+                g = p == 0 or data[s] != data[p]
+
+            if s0 > 0:
+                a[h0] = s0
+                s0 = 0
+
+            if g:
+                h0 = h
+                s0 = s
+                dst[d] = data[s]
+                d += 1
+                s += 1
+            else:
+                a[h] = s
+                f |= i
+                p += 2
+                s += 2
+                r = s
+                q = min(s + 255, t)
+                while data[p] == data[s]:
+                    s += 1
+                    if s >= q:
+                        break
+                    p += 1
+
+                dst[d] = h
+                dst[d + 1] = s - r
+                d += 2
+
+            i = (i << 1) & 0xff
+
+    if failed:
+        return None
+
+    dst[c] = f
+
+    for k in range(4):
+        if data[0] == 1:
+            dst[4 + k] = (d >> (8 * k)) & 0xff
+            dst[8 + k] = (t >> (8 * k)) & 0xff
+        else:
+            dst[7 - k] = (d >> (8 * k)) & 0xff
+            dst[11 - k] = (t >> (8 * k)) & 0xff
+
+    return compressed_array[:d]
+
+
+
+def uncompress(const DTYPE8_t[:] data, DTYPE_t uncompressed_size):
+    '''Decompresses data compressed with the q IPC compression algorithm.
+
+    Mirrors :func:`qpython.utils.uncompress` and produces identical output.
+
+    :Parameters:
+     - `data` (`numpy.uint8` array) - compressed data (without message and
+       compression headers)
+     - `uncompressed_size` (`integer`) - size of the decompressed data
+
+    :returns: `numpy.uint8` array with decompressed data
+    :raises: `ValueError` if compressed data is malformed
+    '''
+    cdef DTYPE_t n, r, i, d, s, p, pp, f, ii
+    cdef DTYPE_t data_size = data.shape[0]
+    cdef DTYPE_t ptrs[256]
     n, r, s, p, pp = 0, 0, 0, 0, 0
     i, d = 1, 1
 
-    cdef numpy.ndarray[DTYPE_t] ptrs = numpy.zeros(256, dtype = DTYPE)
-    cdef numpy.ndarray[DTYPE8_t] uncompressed = numpy.zeros(uncompressed_size, dtype = numpy.uint8)
+    uncompressed_array = numpy.zeros(uncompressed_size, dtype = numpy.uint8)
+    cdef DTYPE8_t[:] uncompressed = uncompressed_array
+
+    for ii in range(256):
+        ptrs[ii] = 0
+
+    if data_size == 0:
+        raise ValueError('Compressed data is empty')
 
     f = 0xff & data[0]
 
-    while s < uncompressed_size:
-        pp = p + 1
+    with nogil:
+        while s < uncompressed_size:
+            pp = p + 1
+
+            if f & i:
+                if d + 1 >= data_size:
+                    break
+
+                r = ptrs[data[d]]
+                n = 2 + data[d + 1]
+                if s + n > uncompressed_size:
+                    break
 
-        if f & i:
-            r = ptrs[data[d]]
-            n = 2 + data[d + 1]
-            if r+n<=s:
-                uncompressed[s:s + n] = uncompressed[r:r + n]
-            else:   #overlapping slices!
+                # byte by byte forward copy handles overlapping ranges
                 for ii in range(n):
-                    uncompressed[s+ii] = uncompressed[r+ii]
+                    uncompressed[s + ii] = uncompressed[r + ii]
 
-            ptrs[uncompressed[p] ^ uncompressed[pp]] = p
-            if s == pp:
-                ptrs[uncompressed[pp] ^ uncompressed[pp + 1]] = pp
+                ptrs[uncompressed[p] ^ uncompressed[pp]] = p
+                if s == pp:
+                    ptrs[uncompressed[pp] ^ uncompressed[pp + 1]] = pp
 
-            d += 2
-            r += 2
-            s = s + n
-            p = s
+                d += 2
+                s = s + n
+                p = s
 
-        else:
-            uncompressed[s] = data[d]
+            else:
+                if d >= data_size:
+                    break
 
-            if pp == s:
-                ptrs[uncompressed[p] ^ uncompressed[pp]] = p
-                p = pp
+                uncompressed[s] = data[d]
 
-            s += 1
-            d += 1
+                if pp == s:
+                    ptrs[uncompressed[p] ^ uncompressed[pp]] = p
+                    p = pp
 
-        if i == 128:
-            if s < uncompressed_size:
-                f = 0xff & data[d]
+                s += 1
                 d += 1
-                i = 1
-        else:
-            i += i
 
-    return uncompressed
+            if i == 128:
+                if s < uncompressed_size:
+                    if d >= data_size:
+                        break
+
+                    f = 0xff & data[d]
+                    d += 1
+                    i = 1
+            else:
+                i += i
+
+    if s < uncompressed_size:
+        raise ValueError('Compressed data is truncated or corrupted')
+
+    return uncompressed_array
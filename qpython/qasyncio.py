@@ -0,0 +1,468 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import asyncio
+from collections import deque
+
+from qpython import MetaData, CONVERSION_OPTIONS
+from qpython.qconnection import MessageType, QConnectionException, QAuthenticationException
+from qpython.qreader import QReader
+from qpython.qwriter import QWriter, QWriterException
+
+
+
+class QProtocol(asyncio.Protocol):
+    '''asyncio protocol performing the IPC handshake and framing of the
+    received data stream into messages.
+
+    Received data is accumulated in a `bytearray` and message boundaries are
+    determined with :func:`.QReader.read_header`. Messages larger than the
+    already received data are received directly into a `bytearray`
+    preallocated with the message size.
+
+    :Parameters:
+     - `credentials` (`bytes`) - handshake to be sent once connected
+     - `message_callback` (`callable`) - invoked with each complete message
+       as `bytearray`
+     - `lost_callback` (`callable`) - invoked with an exception or ``None``
+       when connection is lost after the handshake
+     - `loop` (event loop) - event loop driving the connection
+    '''
+
+    def __init__(self, credentials, message_callback, lost_callback, loop):
+        self._credentials = credentials
+        self._message_callback = message_callback
+        self._lost_callback = lost_callback
+        self._loop = loop
+
+        self.transport = None
+        self.handshake = loop.create_future()
+
+        self._header_reader = QReader(None)
+        self._buffer = bytearray()
+        self._message = None
+        self._message_position = 0
+        self._paused = False
+        self._drain_waiters = []
+
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.write(self._credentials)
+
+
+    def connection_lost(self, exc):
+        if not self.handshake.done():
+            # connection rejected
+            self.handshake.set_result(None)
+        else:
+            self._lost_callback(exc)
+
+        self._wake_drain_waiters()
+
+
+    def pause_writing(self):
+        self._paused = True
+
+
+    def resume_writing(self):
+        self._paused = False
+        self._wake_drain_waiters()
+
+
+    def _wake_drain_waiters(self):
+        waiters, self._drain_waiters = self._drain_waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+
+    async def drain(self):
+        '''Waits until the transport write buffer is flushed below its high
+        water mark.'''
+        if self._paused and not self.transport.is_closing():
+            waiter = self._loop.create_future()
+            self._drain_waiters.append(waiter)
+            await waiter
+
+
+    def data_received(self, data):
+        if not self.handshake.done():
+            self.handshake.set_result(data[0])
+            data = data[1:]
+
+        if self._message is not None:
+            data = self._fill_message(data)
+
+        if data:
+            self._buffer.extend(data)
+            self._split_messages()
+
+
+    def _fill_message(self, data):
+        # receive into the buffer preallocated for the current message
+        end = min(len(self._message), self._message_position + len(data))
+        count = end - self._message_position
+        self._message[self._message_position : end] = memoryview(data)[:count]
+        self._message_position = end
+
+        if end == len(self._message):
+            message, self._message = self._message, None
+            self._message_callback(message)
+
+        return memoryview(data)[count:]
+
+
+    def _split_messages(self):
+        buffer_ = self._buffer
+        while len(buffer_) >= 8:
+            message_size = self._header_reader.read_header(source = buffer_[:8]).size
+            if message_size < 8:
+                self.transport.close()
+                self._buffer = bytearray()
+                return
+
+            if len(buffer_) >= message_size:
+                message = buffer_[:message_size]
+                del buffer_[:message_size]
+                self._message_callback(message)
+            else:
+                self._message = bytearray(message_size)
+                self._message[:len(buffer_)] = buffer_
+                self._message_position = len(buffer_)
+                del buffer_[:]
+                return
+
+
+
+class AsyncQConnection(object):
+    '''asyncio connector class for interfacing with the q service.
+
+    A single event loop can drive many connections without a thread per
+    socket. Responses to synchronous queries are matched with queries in the
+    order they were sent, other messages sent by the q service are available
+    via :func:`.receive` or by asynchronous iteration over the connection.
+
+    The :class:`.AsyncQConnection` class provides an asynchronous context
+    manager API::
+
+        async with qasyncio.AsyncQConnection(host = 'localhost', port = 5000) as q:
+            print(await q.sync('{`int$ til x}', 10))
+
+            q.send_async('.u.sub', numpy.bytes_('trade'), numpy.bytes_(''))
+            async for message in q:
+                print(message.data)
+
+    :Parameters:
+     - `host` (`string`) - q service hostname
+     - `port` (`integer`) - q service port
+     - `username` (`string` or `None`) - username for q authentication/authorization
+     - `password` (`string` or `None`) - password for q authentication/authorization
+     - `timeout` (`nonnegative float` or `None`) - timeout for establishing
+       the connection
+     - `encoding` (`string`) - string encoding for data deserialization
+     - `reader_class` (subclass of `QReader`) - data deserializer
+     - `writer_class` (subclass of `QWriter`) - data serializer
+     - `loop` (event loop or `None`) - event loop to be used, if not
+       specified the running event loop is used
+    :Options:
+     - conversion options as described for :class:`.QConnection`
+    '''
+
+    MAX_PROTOCOL_VERSION = 6
+
+    def __init__(self, host, port, username = None, password = None, timeout = None, encoding = 'latin-1', reader_class = None, writer_class = None, loop = None, **options):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+
+        self._loop = loop
+        self._protocol = None
+        self._protocol_version = None
+        self._pending = deque()
+        self._messages = None
+
+        self._encoding = encoding
+
+        self._options = MetaData(**CONVERSION_OPTIONS.union_dict(**options))
+
+        try:
+            from qpython._pandas import PandasQReader, PandasQWriter
+            self._reader_class = PandasQReader
+            self._writer_class = PandasQWriter
+        except ImportError:
+            self._reader_class = QReader
+            self._writer_class = QWriter
+
+        if reader_class:
+            self._reader_class = reader_class
+
+        if writer_class:
+            self._writer_class = writer_class
+
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+    @property
+    def protocol_version(self):
+        '''Retrieves established version of the IPC protocol.
+
+        :returns: `integer` -- version of the IPC protocol
+        '''
+        return self._protocol_version
+
+
+    async def open(self):
+        '''Initialises connection to q service and performs a handshake.
+
+        :raises: :class:`.QConnectionException`, :class:`.QAuthenticationException`
+        '''
+        if self._protocol:
+            return
+
+        if not self.host:
+            raise QConnectionException('Host cannot be None')
+
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+
+        credentials = (self.username if self.username else '') + ':' + (self.password if self.password else '')
+        credentials = credentials.encode(self._encoding)
+
+        for handshake in (credentials + bytes([self.MAX_PROTOCOL_VERSION, 0]), credentials + b'\0'):
+            _, protocol = await asyncio.wait_for(self._loop.create_connection(lambda: QProtocol(handshake, self._on_message, self._on_connection_lost, self._loop),
+                                                                                   self.host, self.port),
+                                                      self.timeout)
+            try:
+                response = await asyncio.wait_for(protocol.handshake, self.timeout)
+            except BaseException:
+                # handshake timed out or open() was cancelled
+                protocol.transport.close()
+                raise
+            if response is not None:
+                break
+            protocol.transport.close()
+        else:
+            raise QAuthenticationException('Connection denied.')
+
+        self._protocol = protocol
+        self._protocol_version = min(response, self.MAX_PROTOCOL_VERSION)
+        self._pending = deque()
+        self._messages = asyncio.Queue()
+
+        self._writer = self._writer_class(None, protocol_version = self._protocol_version, encoding = self._encoding)
+        self._reader = self._reader_class(None, encoding = self._encoding)
+
+
+    def close(self):
+        '''Closes connection with the q service. Pending queries are failed
+        with :class:`.QConnectionException`.'''
+        if self._protocol:
+            self._protocol.transport.close()
+            self._on_connection_lost(None)
+
+
+    def is_connected(self):
+        '''Checks whether connection with a q service has been established.
+
+        :returns: `boolean` -- ``True`` if connection has been established,
+                  ``False`` otherwise
+        '''
+        return True if self._protocol else False
+
+
+    def __str__(self):
+        return '%s@:%s:%s' % (self.username, self.host, self.port) if self.username else ':%s:%s' % (self.host, self.port)
+
+
+    def query(self, msg_type, query, *parameters, **options):
+        '''Writes a query to the q service without waiting for the response.
+
+        :Parameters:
+         - `msg_type` (one of the constants defined in :class:`.MessageType`) -
+           type of the query to be executed
+         - `query` (`string`) - query to be executed
+         - `parameters` (`list` or `None`) - parameters for the query
+        :Options:
+         - `single_char_strings` (`boolean`) - if ``True`` single char Python
+           strings are encoded as q strings instead of chars,
+           **Default**: ``False``
+         - `compress` (`boolean`) - if ``True`` messages larger than
+           `compression_threshold` are compressed, **Default**: ``False``
+
+        :raises: :class:`.QConnectionException`, :class:`.QWriterException`
+        '''
+        if not self._protocol:
+            raise QConnectionException('Connection is not established.')
+
+        if parameters and len(parameters) > 8:
+            raise QWriterException('Too many parameters.')
+
+        if not parameters or len(parameters) == 0:
+            message = self._writer.write(query, msg_type, **self._options.union_dict(**options))
+        else:
+            message = self._writer.write([query] + list(parameters), msg_type, **self._options.union_dict(**options))
+
+        self._protocol.transport.write(message)
+
+
+    async def sync(self, query, *parameters, **options):
+        '''Performs a synchronous query against a q service and returns parsed
+        data once the response arrives.
+
+            >>> print(await q.sync('{y + til x}', 10, 1))
+            [ 1  2  3  4  5  6  7  8  9 10]
+
+        Cancelling the coroutine doesn't affect the connection, the response
+        is discarded once received.
+
+        :Parameters:
+         - `query` (`string`) - query to be executed
+         - `parameters` (`list` or `None`) - parameters for the query
+        :Options:
+         - conversion options as described for :func:`.QConnection.sendSync`
+
+        :returns: query result parsed to Python data structures
+        :raises: :class:`.QConnectionException`, :class:`.QWriterException`,
+                 :class:`.QReaderException`, :class:`.QException`
+        '''
+        self.query(MessageType.SYNC, query, *parameters, **options)
+
+        future = self._loop.create_future()
+        self._pending.append((future, self._options.union_dict(**options)))
+
+        message = await future
+        return message.data
+
+
+    def send_async(self, query, *parameters, **options):
+        '''Performs an asynchronous query and returns **without** retrieving of
+        the response.
+
+        Data is buffered by the transport, :func:`.drain` can be awaited to
+        apply backpressure when sending many messages.
+
+        :Parameters:
+         - `query` (`string`) - query to be executed
+         - `parameters` (`list` or `None`) - parameters for the query
+        :Options:
+         - `single_char_strings` (`boolean`) - if ``True`` single char Python
+           strings are encoded as q strings instead of chars,
+           **Default**: ``False``
+
+        :raises: :class:`.QConnectionException`, :class:`.QWriterException`
+        '''
+        self.query(MessageType.ASYNC, query, *parameters, **options)
+
+
+    async def drain(self):
+        '''Waits until written data is flushed to the socket.
+
+        :raises: :class:`.QConnectionException`
+        '''
+        if not self._protocol:
+            raise QConnectionException('Connection is not established.')
+
+        await self._protocol.drain()
+
+
+    async def receive(self, data_only = True):
+        '''Waits for a message sent by the q service other than response to
+        a synchronous query, e.g. asynchronous subscription update.
+
+        Messages are parsed with options the connection has been created with.
+
+        :Parameters:
+         - `data_only` (`boolean`) - if ``True`` returns only data part of the
+           message, otherwise returns data and message meta-information
+           encapsulated in :class:`.QMessage` instance
+
+        :returns: depending on parameter flags: :class:`.QMessage` instance,
+                  parsed message
+        :raises: :class:`.QConnectionException` if connection is closed,
+                 :class:`.QReaderException`, :class:`.QException`
+        '''
+        if self._messages is None:
+            raise QConnectionException('Connection is not established.')
+
+        message = await self._messages.get()
+        if message is None:
+            # keep the end marker for other consumers
+            self._messages.put_nowait(None)
+            raise QConnectionException('Connection is closed.')
+        elif isinstance(message, Exception):
+            raise message
+
+        return message.data if data_only else message
+
+
+    def __aiter__(self):
+        return self
+
+
+    async def __anext__(self):
+        '''Retrieves next :class:`.QMessage` sent by the q service, iteration
+        stops when the connection is closed.'''
+        try:
+            message = await self.receive(data_only = False)
+        except QConnectionException:
+            raise StopAsyncIteration
+        return message
+
+
+    def __call__(self, *parameters, **options):
+        return self.sync(parameters[0], *parameters[1:], **options)
+
+
+    def _on_message(self, message):
+        if message[1] == MessageType.RESPONSE and self._pending:
+            future, options = self._pending.popleft()
+            if future.done():
+                # query has been cancelled
+                return
+
+            try:
+                future.set_result(self._reader.read(source = message, **options))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            try:
+                self._messages.put_nowait(self._reader.read(source = message, **self._options.as_dict()))
+            except Exception as e:
+                self._messages.put_nowait(e)
+
+
+    def _on_connection_lost(self, exc):
+        if not self._protocol:
+            return
+
+        self._protocol = None
+
+        while self._pending:
+            future, _ = self._pending.popleft()
+            if not future.done():
+                future.set_exception(QConnectionException('Connection is closed.'))
+
+        self._messages.put_nowait(None)
@@ -76,6 +76,68 @@ class QTemporalList(QList):
         return numpy.array2string(self, separator=', ', formatter={"int": QTemporal.__str__})
 
 
+class QSymbolCodes(QList):
+    '''An array object represents a q symbol vector as integer codes
+    indexing an array of distinct symbols.
+
+    Returned by :class:`.QReader` if the `symbol_codes` option is set. The
+    symbols are available as `meta.symbols`.
+
+        >>> v = q.sync('`a`b`a`c', symbol_codes = True)
+        >>> print('%s %s' % (v, v.meta.symbols))
+        [0 1 0 2] [b'a' b'b' b'c']
+        >>> print(v.decode())
+        [b'a' b'b' b'a' b'c']
+    '''
+
+    def decode(self):
+        '''Returns the symbols vector as :class:`.QList`.'''
+        symbols = numpy.asarray(self.meta.symbols)[self.view(numpy.ndarray)]
+        return qlist(numpy.array(symbols.tolist(), dtype = numpy.bytes_) if len(symbols) else numpy.array([], dtype = numpy.bytes_), qtype = QSYMBOL_LIST)
+
+    def __repr__(self):
+        return 'QSymbolCodes({}, symbols={})'.format(numpy.array2string(self.view(numpy.ndarray), separator=', '), list(self.meta.symbols))
+
+
+
+class QGuidList(QList):
+    '''An array object represents a q guid vector as 16 bytes wide raw
+    values. :class:`uuid.UUID` instances are created only on element access.
+
+    Returned by :class:`.QReader` if the `compact_guids` option is set.
+
+        >>> v = q.sync('2?0Ng', compact_guids = True)
+        >>> print(v.dtype)
+        |V16
+        >>> print(v[0])
+        8c680a01-5a49-5aab-5a65-d4bfddb6a661
+        >>> print(v.decode())
+        [UUID('8c680a01-5a49-5aab-5a65-d4bfddb6a661')
+         UUID('5d7cec3a-9b4c-7c16-20a5-5d6ba2b3ef7c')]
+    '''
+
+    def __getitem__(self, idx):
+        item = numpy.ndarray.__getitem__(self, idx)
+        return uuid.UUID(bytes = item.tobytes()) if isinstance(item, numpy.void) else item
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def tolist(self):
+        return [uuid.UUID(bytes = raw) for raw in self.view(numpy.ndarray).tolist()]
+
+    def decode(self):
+        '''Returns the guid vector as :class:`.QList` of :class:`uuid.UUID`
+        instances.'''
+        guids = numpy.empty(len(self), dtype = object)
+        guids[:] = self.tolist()
+        return qlist(guids, qtype = QGUID_LIST, adjust_dtype = False)
+
+    def __repr__(self):
+        return 'QGuidList({})'.format(self.tolist())
+
+
+
 def get_list_qtype(array):
     '''Finds out a corresponding qtype for a specified `QList`/`numpy.ndarray` 
     instance.
@@ -205,6 +267,61 @@ def qlist(array, adjust_dtype = True, **meta):
 
 
 
+def _query_array(keys_array, keys):
+    '''Converts keys to be looked up to an array comparable with
+    `keys_array` or returns ``None`` if keys have to be looked up one by one.'''
+    if keys_array.dtype.names:
+        # composite keys are given as tuples
+        try:
+            keys = [tuple(key) for key in keys]
+            query = numpy.empty(len(keys), dtype = keys_array.dtype)
+            for i, name in enumerate(keys_array.dtype.names):
+                field = _query_array(keys_array[name], [key[i] for key in keys])
+                if field is None or not numpy.can_cast(field.dtype, keys_array.dtype[name], 'safe'):
+                    return None
+                query[name] = field
+        except (TypeError, IndexError, ValueError):
+            return None
+        return query
+
+    if keys_array.dtype.kind not in 'biufSUmM':
+        return None
+
+    query = numpy.asarray(keys)
+    numeric = 'biuf'
+    if query.ndim == 1 and (query.dtype.kind == keys_array.dtype.kind or (query.dtype.kind in numeric and keys_array.dtype.kind in numeric)):
+        return query
+    return None
+
+
+
+def _sorted_lookup(sorted_index, keys_array, query):
+    '''Locates elements of `query` in `keys_array` via index holding argsort
+    of the keys and the sorted keys. The index is built if it's ``None`` or
+    the number of keys changed. Keys modified in place are not reflected by
+    the index.
+
+    :returns: tuple of the index and positions of the keys
+    :raises: `KeyError` if any of the keys is not present
+    '''
+    if sorted_index is None or len(sorted_index[0]) != len(keys_array):
+        order = numpy.argsort(keys_array, kind = 'mergesort')
+        sorted_index = (order, keys_array[order])
+
+    order, sorted_keys = sorted_index
+    if not len(query):
+        return sorted_index, numpy.array([], dtype = numpy.intp)
+    if not len(order):
+        raise KeyError('Collection doesn`t contain key: %s' % (query[0], ))
+
+    sorted_positions = numpy.minimum(numpy.searchsorted(sorted_keys, query), len(order) - 1)
+    found = sorted_keys[sorted_positions] == query
+    if not found.all():
+        raise KeyError('Collection doesn`t contain key: %s' % (query[~found][0], ))
+    return sorted_index, order[sorted_positions]
+
+
+
 class QDictionary(object):
     '''Represents a q dictionary.
     
@@ -220,10 +337,20 @@ class QDictionary(object):
     ...                    [numpy.string_('one'), qlist(numpy.array([2, 3]), qtype=QLONG_LIST), '456', [numpy.int64(7), qlist(numpy.array([8, 9]), qtype=QLONG_LIST)]]))
     [1, 2, 3.234, '4']!['one', QList([2, 3], dtype=int64), '456', [7, QList([8, 9], dtype=int64)]]
     
+    Keys of dictionaries with at least :attr:`INDEX_MIN_SIZE` entries are
+    looked up via a hash index, which is built on first access. The index is
+    dropped when `keys` are replaced and rebuilt when number of keys changes.
+    Keys modified in place aren't reflected by the index, so `keys` have to be
+    assigned again.
+
     :Parameters:
      - `keys` (`QList`, `tuple` or `list`) - dictionary keys
      - `values` (`QList`, `QTable`, `tuple` or `list`) - dictionary values
     '''
+
+    #: minimal number of keys for which a hash index is used
+    INDEX_MIN_SIZE = 16
+
     def __init__(self, keys, values):
         if not isinstance(keys, (QList, tuple, list, numpy.ndarray)):
             raise ValueError('%s expects keys to be of type: QList, tuple or list. Actual type: %s' % (self.__class__.__name__, type(keys)))
@@ -235,6 +362,18 @@ class QDictionary(object):
         self.keys = keys
         self.values = values
 
+    @property
+    def keys(self):
+        '''Dictionary keys.'''
+        return self._keys
+
+    @keys.setter
+    def keys(self, keys):
+        self._keys = keys
+        self._index = None
+        self._index_size = 0
+        self._sorted_index = None
+
     def __str__(self, *args, **kwargs):
         return '%s!%s' % (self.keys, self.values)
 
@@ -254,6 +393,17 @@ class QDictionary(object):
         return not self.__eq__(other)
 
     def _find_key_(self, key):
+        if len(self._keys) >= self.INDEX_MIN_SIZE and self._index is not False:
+            try:
+                idx = self._index_lookup(key)
+            except TypeError:
+                # unhashable keys are searched linearly
+                pass
+            else:
+                if idx is None:
+                    raise KeyError('QDictionary doesn`t contain key: %s' % key)
+                return idx
+
         idx = 0
         for k in self.keys:
             if key == k:
@@ -262,6 +412,53 @@ class QDictionary(object):
 
         raise KeyError('QDictionary doesn`t contain key: %s' % key)
 
+    def _index_lookup(self, key):
+        if self._index is None or self._index_size != len(self._keys):
+            self._build_index()
+
+        return self._index.get(key)
+
+    def _build_index(self):
+        index = {}
+        try:
+            for idx, k in enumerate(self._keys):
+                index.setdefault(k, idx)
+        except TypeError:
+            # dictionary with unhashable keys is never indexed
+            self._index = False
+            raise
+        self._index = index
+        self._index_size = len(self._keys)
+
+    def _find_keys(self, keys):
+        keys_array = self._keys
+        if isinstance(keys_array, numpy.ndarray) and not isinstance(keys_array, QTemporalList):
+            keys_array = numpy.asarray(keys_array)
+            query = _query_array(keys_array, keys)
+            if query is not None:
+                self._sorted_index, positions = _sorted_lookup(self._sorted_index, keys_array, query)
+                return positions
+
+        return numpy.array([self._find_key_(key) for key in keys], dtype = numpy.intp)
+
+    def get_many(self, keys):
+        '''Returns values for multiple keys.
+
+        If the dictionary keys are a :class:`.QList` of non-temporal type,
+        keys are located at once via a sorted index instead of one by one.
+
+        :Parameters:
+         - `keys` (`QList`, `tuple` or `list`) - keys to be looked up
+
+        :returns: `numpy.ndarray` of values if dictionary values are an array,
+                  `list` of values otherwise
+        :raises: `KeyError` if any of the keys is not present
+        '''
+        positions = self._find_keys(keys)
+        if isinstance(self.values, numpy.ndarray):
+            return self.values[positions]
+        return [self.values[idx] for idx in positions]
+
     def __getitem__(self, key):
         return self.values[self._find_key_(key)]
 
@@ -381,6 +578,9 @@ def qtable(columns, data, **meta):
             data[i] = numpy.array(list(data[i]), dtype = numpy.string_)
         if isinstance(data[i], bytes):
             data[i] = numpy.array(list(data[i].decode()), dtype = numpy.string_)
+        if isinstance(data[i], (QSymbolCodes, QGuidList)):
+            # records cannot reference symbols, the codes are decoded
+            data[i] = data[i].decode()
 
         if column_name in meta:
             data[i] = qlist(data[i], qtype = meta[column_name])
@@ -402,6 +602,197 @@ def qtable(columns, data, **meta):
 
 
 
+class QColumnarTable(object):
+    '''Represents a q table as a list of separate columns.
+
+    Unlike :class:`.QTable`, which interleaves data of all columns into
+    records, :class:`.QColumnarTable` keeps each column as a distinct
+    :class:`.QList`. This matches the internal representation of tables in q,
+    avoids copying columns while creating the table and serializing it, and
+    keeps per column operations cache friendly. Instances are created via
+    :func:`.qcolumnar_table` or by :class:`.QReader` if the `columnar_tables`
+    option is set.
+
+        >>> t = qcolumnar_table(['name', 'iq'],
+        ...                     [qlist(['Dent', 'Beeblebrox', 'Prefect'], qtype = QSYMBOL_LIST),
+        ...                      qlist([98, 42, 126], qtype = QLONG_LIST)])
+        >>> print('%s %s %s' % (len(t), t.columns, t.meta))
+        3 ['name', 'iq'] metadata(qtype=98, name=-11, iq=-7)
+        >>> print(t['iq'])
+        [ 98  42 126]
+
+    :Parameters:
+     - `columns` (list of `strings`) - table column names
+     - `data` (list of `QList`) - table columns
+
+    :Kwargs:
+     - `meta` (`integer`) - qtype for particular column
+    '''
+    def __init__(self, columns, data, **meta):
+        if len(columns) != len(data):
+            raise ValueError('Number of columns doesn`t match the data layout. %s vs %s' % (len(columns), len(data)))
+
+        if not 'qtype' in meta:
+            meta['qtype'] = QTABLE
+
+        self._columns = [column if isinstance(column, str) else column.decode('utf-8') for column in columns]
+        self._data = list(data)
+        self._length = len(data[0]) if data and data[0] is not None else 0
+        self.meta = MetaData(**meta)
+
+    @property
+    def columns(self):
+        '''List of column names.'''
+        return list(self._columns)
+
+    def materialize(self):
+        '''Returns table as :class:`.QTable`, copying columns into records.'''
+        return qtable(self._columns, [self[column] for column in self._columns], qtype = self.meta.qtype)
+
+    def _column(self, idx):
+        return self._data[idx]
+
+    def __getitem__(self, key):
+        if isinstance(key, (str, bytes)):
+            key = key if isinstance(key, str) else key.decode('utf-8')
+            try:
+                return self._column(self._columns.index(key))
+            except ValueError:
+                raise KeyError('%s doesn`t contain column: %s' % (self.__class__.__name__, key))
+
+        return self.materialize()[key]
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        return iter(self.materialize())
+
+    def __eq__(self, other):
+        if isinstance(other, QColumnarTable):
+            return self._columns == other._columns and len(self) == len(other) \
+                   and all(numpy.array_equal(self[column], other[column]) for column in self._columns)
+        return isinstance(other, QTable) and self.materialize() == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return '%s(columns=%s, length=%d)' % (self.__class__.__name__, self._columns, self._length)
+
+
+
+def _table_column(data):
+    '''Converts column data to :class:`.QList` the same way as :func:`.qtable`.'''
+    if isinstance(data, bytes):
+        data = data.decode()
+    if isinstance(data, str):
+        # convert character list (represented as string) to numpy representation
+        return qlist(numpy.array(list(data), dtype = numpy.bytes_))
+    if type(data) in (list, tuple):
+        return qlist(data, qtype = QGENERAL_LIST)
+    return data if isinstance(data, QList) else qlist(data)
+
+
+
+def qcolumnar_table(columns, data, **meta):
+    '''Creates a :class:`.QColumnarTable` out of given column names and data,
+    and initialises the meta data.
+
+    Accepts the same arguments as :func:`.qtable`. Columns passed as
+    :class:`.QList` instances matching the qtype hint are stored as they are,
+    without being copied.
+
+        >>> # q: flip `name`iq!(`Dent`Beeblebrox`Prefect;98 42 126)
+        >>> t = qcolumnar_table(['name', 'iq'],
+        ...                     [['Dent', 'Beeblebrox', 'Prefect'],
+        ...                      [98, 42, 126]],
+        ...                     name = QSYMBOL, iq = QLONG)
+
+    :Parameters:
+     - `columns` (list of `strings`) - table column names
+     - `data` (list of lists) - list of columns containing table data
+
+    :Kwargs:
+     - `meta` (`integer`) - qtype for particular column
+
+    :returns: `QColumnarTable` - columnar representation of q table
+
+    :raises: `ValueError`
+    '''
+    if len(columns) != len(data):
+        raise ValueError('Number of columns doesn`t match the data layout. %s vs %s' % (len(columns), len(data)))
+
+    meta = {} if not meta else meta
+
+    if not 'qtype' in meta:
+        meta['qtype'] = QTABLE
+
+    names, columns_data = [], []
+    for i in range(len(columns)):
+        column_name = columns[i] if isinstance(columns[i], str) else columns[i].decode("utf-8")
+
+        if column_name in meta:
+            column = data[i]
+            if isinstance(column, (str, bytes)):
+                column = numpy.array(list(column.decode() if isinstance(column, bytes) else column), dtype = numpy.bytes_)
+            column = qlist(column, qtype = meta[column_name])
+        else:
+            column = _table_column(data[i])
+
+        if columns_data and len(column) != len(columns_data[0]):
+            raise ValueError('Columns of a table cannot have different length')
+
+        meta[column_name] = column.meta.qtype
+        names.append(column_name)
+        columns_data.append(column)
+
+    return QColumnarTable(names, columns_data, **meta)
+
+
+
+class LazyQTable(QColumnarTable):
+    '''Represents a q table, which columns are decoded on first access.
+
+    :class:`.LazyQTable` is returned by :class:`.QReader` instead of
+    :class:`.QTable` if the `lazy_tables` option is set. Number of rows,
+    column names and meta data are available without decoding any column.
+    Accessing a column by name decodes it from the message buffer and caches
+    the resulting :class:`.QList`. The whole table can be converted to
+    :class:`.QTable` via :func:`.materialize`.
+
+        >>> t = q.sync('([] sym:`a`b`c; price:1.0 2.0 3.0)', lazy_tables = True)
+        >>> print('%s %s %s' % (len(t), t.columns, t.meta))
+        3 ['sym', 'price'] metadata(qtype=98, sym=-11, price=-9)
+        >>> print(t['price'])
+        [ 1.  2.  3.]
+
+    :Parameters:
+     - `columns` (list of `strings`) - table column names
+     - `loaders` (list of `callable`) - functions decoding particular columns
+     - `length` (`integer`) - number of rows
+
+    :Kwargs:
+     - `meta` (`integer`) - qtype for particular column
+    '''
+    def __init__(self, columns, loaders, length, **meta):
+        super(LazyQTable, self).__init__(columns, [None] * len(loaders), **meta)
+
+        self._loaders = list(loaders)
+        self._length = length
+
+    def is_loaded(self, column):
+        '''Indicates whether column has been already decoded.'''
+        return self._data[self._columns.index(column)] is not None
+
+    def _column(self, idx):
+        if self._data[idx] is None:
+            self._data[idx] = _table_column(self._loaders[idx]())
+            self._loaders[idx] = None
+        return self._data[idx]
+
+
+
 class QKeyedTable(object):
     '''Represents a q keyed table.
     
@@ -423,6 +814,17 @@ class QKeyedTable(object):
         <class 'qpython.qcollection.QTable'> dtype: [('eid', '<i8')] meta: metadata(qtype=98, eid=-7)
         <class 'qpython.qcollection.QTable'> dtype: [('pos', 'S2'), ('dates', '<i4')] meta: metadata(dates=-14, qtype=98, pos=-11)
     
+    Value rows can be looked up by key via :func:`.lookup` and
+    :func:`.lookup_many`. Keys are given as values of the key column or, for
+    tables with multiple key columns, as tuples. The index supporting lookups
+    is built on first use and kept until `keys` are replaced. Keys modified in
+    place aren't reflected by the index, so `keys` have to be assigned again.
+
+        >>> print(t.lookup(1002))
+        (b'd2', 121)
+        >>> print(t.lookup_many([1003, 1001]))
+        [(b'd3', -2147483648) (b'd1',         366)]
+
     :Parameters:
      - `keys` (`QTable`) - table keys
      - `values` (`QTable`) - table values
@@ -441,6 +843,76 @@ class QKeyedTable(object):
         self.keys = keys
         self.values = values
 
+    @property
+    def keys(self):
+        '''Table keys.'''
+        return self._keys
+
+    @keys.setter
+    def keys(self, keys):
+        self._keys = keys
+        self._index = None
+        self._index_size = 0
+        self._sorted_index = None
+
+    def _key_array(self):
+        names = self._keys.dtype.names
+        return numpy.asarray(self._keys[names[0]] if len(names) == 1 else self._keys)
+
+    def _row_keys(self, keys_array):
+        names = keys_array.dtype.names
+        return iter(keys_array) if not names else zip(*[keys_array[name] for name in names])
+
+    def _find_row(self, key):
+        keys_array = self._key_array()
+        if self._index is None or self._index_size != len(keys_array):
+            self._build_index(keys_array)
+
+        idx = self._index.get(key)
+        if idx is None:
+            raise KeyError('QKeyedTable doesn`t contain key: %s' % (key, ))
+        return idx
+
+    def _build_index(self, keys_array):
+        index = {}
+        for idx, row_key in enumerate(self._row_keys(keys_array)):
+            index.setdefault(row_key, idx)
+        self._index = index
+        self._index_size = len(keys_array)
+
+    def _find_rows(self, keys):
+        keys_array = self._key_array()
+        query = _query_array(keys_array, keys)
+        if query is None:
+            return numpy.array([self._find_row(key) for key in keys], dtype = numpy.intp)
+
+        self._sorted_index, positions = _sorted_lookup(self._sorted_index, keys_array, query)
+        return positions
+
+    def lookup(self, key):
+        '''Returns value row for a key.
+
+        :Parameters:
+         - `key` - value of the key column or tuple of values of key columns
+
+        :returns: `numpy.record` - value row
+        :raises: `KeyError` if the key is not present
+        '''
+        return self.values[self._find_row(key)]
+
+    def lookup_many(self, keys):
+        '''Returns value rows for multiple keys, located at once via a sorted
+        index.
+
+        :Parameters:
+         - `keys` (`QList`, `list` or `tuple`) - values of the key column or
+           tuples of values of key columns
+
+        :returns: `QTable` - value rows in order of the keys
+        :raises: `KeyError` if any of the keys is not present
+        '''
+        return self.values[self._find_rows(keys)]
+
     def __str__(self, *args, **kwargs):
         return '%s!%s' % (self.keys, self.values)
 
@@ -64,7 +64,9 @@ class QConnection(object):
      - `timeout` (`nonnegative float` or `None`) - set a timeout on blocking socket operations
      - `encoding` (`string`) - string encoding for data deserialization
      - `reader_class` (subclass of `QReader`) - data deserializer
-     - `writer_class` (subclass of `QWriter`) - data serializer
+     - `writer_class` (subclass of `QWriter`) - data serializer, created with
+       `stream`, `protocol_version` and `encoding` arguments, connection
+       options are passed to its `write` method
     :Options: 
      - `raw` (`boolean`) - if ``True`` returns raw data chunk instead of parsed 
        data, **Default**: ``False``
@@ -73,8 +75,33 @@ class QConnection(object):
        :class:`.QTemporal`) instances, otherwise are represented as 
        `numpy datetime64`/`timedelta64` arrays and atoms,
        **Default**: ``False``
+     - `copy_arrays` (`boolean`) - if ``True`` numeric vectors are copied out
+       of the received message buffer instead of being views into it,
+       **Default**: ``False``
+     - `column_threads` (`integer`) - if greater than ``0`` columns of
+       tables are decoded concurrently by the given number of threads,
+       **Default**: ``0``
+     - `columns` (list of `string` or `None`) - if specified only listed
+       columns of tables are decoded, **Default**: ``None``
+     - `lazy_tables` (`boolean`) - if ``True`` tables are represented as
+       :class:`.LazyQTable` instances decoding columns on first access,
+       **Default**: ``False``
+     - `columnar_tables` (`boolean`) - if ``True`` tables are represented as
+       :class:`.QColumnarTable` instances, **Default**: ``False``
+     - `symbol_cache` (`integer`) - maximal number of symbol objects reused
+       across messages received via the connection, **Default**: ``0``
+     - `symbol_codes` (`boolean`) - if ``True`` symbol vectors are
+       represented as :class:`.QSymbolCodes` instances, **Default**: ``False``
+     - `compact_guids` (`boolean`) - if ``True`` guid vectors are
+       represented as :class:`.QGuidList` instances, **Default**: ``False``
+     - `arrow` (`boolean`) - if ``True`` tables are represented as
+       `pyarrow.Table` instances, **Default**: ``False``
      - `single_char_strings` (`boolean`) - if ``True`` single char Python 
        strings are encoded as q strings instead of chars, **Default**: ``False``
+     - `compress` (`boolean`) - if ``True`` outgoing messages larger than
+       `compression_threshold` are compressed, **Default**: ``False``
+     - `compression_threshold` (`integer`) - minimal size in bytes of an
+       outgoing message to be compressed, **Default**: ``2000``
     '''
 
     MAX_PROTOCOL_VERSION = 6
@@ -86,7 +113,6 @@ class QConnection(object):
         self.password = password
 
         self._connection = None
-        self._connection_file = None
         self._protocol_version = None
 
         self.timeout = timeout
@@ -145,7 +171,7 @@ class QConnection(object):
             self._initialize()
 
             self._writer = self._writer_class(self._connection, protocol_version = self._protocol_version, encoding = self._encoding)
-            self._reader = self._reader_class(self._connection_file, encoding = self._encoding)
+            self._reader = self._reader_class(self._connection, encoding = self._encoding)
 
 
     def _init_socket(self):
@@ -154,18 +180,14 @@ class QConnection(object):
             self._connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self._connection.connect((self.host, self.port))
             self._connection.settimeout(self.timeout)
-            self._connection_file = self._connection.makefile('b')
         except:
             self._connection = None
-            self._connection_file = None
             raise
 
 
     def close(self):
         '''Closes connection with the q service.'''
         if self._connection:
-            self._connection_file.close()
-            self._connection_file = None
             self._connection.close()
             self._connection = None
 
@@ -231,6 +253,8 @@ class QConnection(object):
          - `single_char_strings` (`boolean`) - if ``True`` single char Python 
            strings are encoded as q strings instead of chars, 
            **Default**: ``False``
+         - `compress` (`boolean`) - if ``True`` messages larger than
+           `compression_threshold` are compressed, **Default**: ``False``
         
         :raises: :class:`.QConnectionException`, :class:`.QWriterException`
         '''
@@ -301,6 +325,102 @@ class QConnection(object):
                  :class:`.QReaderException`
         '''
         self.query(MessageType.SYNC, query, *parameters, **options)
+        return self._receive_response(**options)
+
+
+    def sendSyncMany(self, queries, window = 64, return_exceptions = False, **options):
+        '''Performs multiple synchronous queries against a q service and
+        returns list of parsed results.
+
+        Queries are pipelined: they are written back to back without waiting
+        for responses, which q sends in order of the queries. A batch of
+        queries costs a single network round trip instead of one per query.
+
+        Each query is either a q expression or a `tuple` of a query and a
+        `list` of its parameters:
+
+            >>> print(q.sendSyncMany(['til 3', ('{x + y}', [1, 2]), ('{til x}', [2])]))
+            [array([0, 1, 2]), 3, array([0, 1])]
+
+        At most `window` queries are awaiting response at any time, so
+        neither side blocks on a full socket buffer while the other one is
+        still writing.
+
+        :Parameters:
+         - `queries` (`list`) - queries to be executed
+         - `window` (`integer`) - maximum number of queries awaiting response
+         - `return_exceptions` (`boolean`) - if ``True`` errors reported by q
+           are returned in place of the corresponding results, otherwise the
+           first error is raised once all responses are read, other errors,
+           e.g. failure to parse a response, close the connection
+        :Options:
+         - `raw` (`boolean`) - if ``True`` returns raw data chunk instead of
+           parsed data, **Default**: ``False``
+         - `numpy_temporals` (`boolean`) - if ``False`` temporal vectors are
+           backed by raw q representation (:class:`.QTemporalList`,
+           :class:`.QTemporal`) instances, otherwise are represented as
+           `numpy datetime64`/`timedelta64` arrays and atoms,
+           **Default**: ``False``
+         - `single_char_strings` (`boolean`) - if ``True`` single char Python
+           strings are encoded as q strings instead of chars,
+           **Default**: ``False``
+
+        :returns: `list` of query results parsed to Python data structures
+
+        :raises: :class:`.QConnectionException`, :class:`.QWriterException`,
+                 :class:`.QReaderException`, :class:`.QException`
+        '''
+        if not self._connection:
+            raise QConnectionException('Connection is not established.')
+
+        if window < 1:
+            raise ValueError('window has to be positive')
+
+        # serialize all queries up front, so invalid query doesn't leave
+        # connection with part of the batch sent
+        writer = self._writer_class(None, protocol_version = self._protocol_version, encoding = self._encoding)
+        write_options = self._options.union_dict(**options)
+        messages = []
+        for query in queries:
+            if isinstance(query, tuple) and len(query) == 2 and isinstance(query[1], (list, tuple)):
+                query, parameters = query
+            else:
+                parameters = ()
+
+            if len(parameters) > 8:
+                raise QWriterException('Too many parameters.')
+
+            messages.append(writer.write([query] + list(parameters) if parameters else query, MessageType.SYNC, **write_options))
+
+        results = []
+        error = None
+        sent = 0
+        try:
+            while len(results) < len(messages):
+                # refill the window once half of it has been answered
+                if sent < len(messages) and sent - len(results) <= window // 2:
+                    end = min(len(messages), len(results) + window)
+                    self._connection.sendall(b''.join(messages[sent : end]))
+                    sent = end
+
+                try:
+                    results.append(self._receive_response(**options))
+                except QException as e:
+                    if error is None:
+                        error = e
+                    results.append(e)
+        except Exception:
+            # responses still pending can't be matched with later queries
+            self.close()
+            raise
+
+        if error is not None and not return_exceptions:
+            raise error
+
+        return results
+
+
+    def _receive_response(self, **options):
         response = self.receive(data_only = False, **options)
 
         if response.type == MessageType.RESPONSE:
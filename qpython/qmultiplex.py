@@ -0,0 +1,343 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import socket
+import threading
+from collections import deque
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from qpython.qconnection import QConnection, QConnectionException, MessageType
+from qpython.qtype import QException
+from qpython.qwriter import QWriterException
+
+
+
+class QResponseTimeoutException(QConnectionException):
+    '''Raised when a response to synchronous query doesn't arrive in time.'''
+    pass
+
+
+
+class _PendingResponse(object):
+    '''Synchronous query awaiting response.'''
+
+    def __init__(self, options):
+        self.options = options
+        self.message = None
+        self.error = None
+        self._event = threading.Event()
+
+
+    def set_result(self, message = None, error = None):
+        self.message = message
+        self.error = error
+        self._event.set()
+
+
+    def wait(self, timeout):
+        if not self._event.wait(timeout):
+            raise QResponseTimeoutException('Response not received within %s seconds.' % timeout)
+
+        if self.error is not None:
+            raise self.error
+        return self.message
+
+
+
+class MultiplexedQConnection(QConnection):
+    '''Connector class for interfacing with the q service, which can be
+    safely shared between threads.
+
+    A background thread reads all messages sent by the q service. Responses
+    are passed to threads waiting in :func:`.sendSync` in order in which the
+    queries have been written, while other messages (e.g. subscription
+    updates) are passed to callbacks registered with :func:`.subscribe` or,
+    if there is none, made available via :func:`.receive`. Threads block only
+    for the time needed to write a query, not for the whole round trip.
+
+        with qmultiplex.MultiplexedQConnection(host = 'localhost', port = 5000) as q:
+            updates = queue.Queue()
+            q.subscribe(updates.put)
+            q.sendSync('.u.sub', numpy.bytes_('trade'), numpy.bytes_(''))
+            print(updates.get().data)
+
+    The `timeout` limits time of establishing the connection and of waiting
+    for a response to synchronous query. Response which arrives after the
+    timeout is discarded.
+
+    :Parameters:
+     - as described for :class:`.QConnection`
+    :Options:
+     - as described for :class:`.QConnection`
+    '''
+
+    def __init__(self, host, port, username = None, password = None, timeout = None, encoding = 'latin-1', reader_class = None, writer_class = None, **options):
+        super(MultiplexedQConnection, self).__init__(host, port, username, password, timeout, encoding, reader_class, writer_class, **options)
+
+        self._write_lock = threading.Lock()
+        self._pending = deque()
+        self._listeners = []
+        self._messages = queue.Queue()
+        self._reader_thread = None
+
+
+    def open(self):
+        '''Initialises connection to q service and starts the reader thread.
+
+        :raises: :class:`.QConnectionException`, :class:`.QAuthenticationException`
+        '''
+        if not self._connection:
+            super(MultiplexedQConnection, self).open()
+
+            # reader thread blocks until a message arrives
+            self._connection.settimeout(None)
+            self._pending = deque()
+            self._messages = queue.Queue()
+            self._reader_thread = threading.Thread(target = self._read_messages, args = (self._connection, ))
+            self._reader_thread.daemon = True
+            self._reader_thread.start()
+
+
+    def close(self):
+        '''Closes connection with the q service. Threads waiting for responses
+        are failed with :class:`.QConnectionException`.'''
+        connection, thread = self._connection, self._reader_thread
+        if connection:
+            try:
+                # wake up the reader thread
+                connection.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            super(MultiplexedQConnection, self).close()
+
+            if thread and thread is not threading.current_thread():
+                thread.join()
+
+
+    def subscribe(self, callback):
+        '''Registers a callback invoked for each message sent by the q
+        service, other than response to a synchronous query.
+
+        The callback is called from the reader thread with a
+        :class:`.QMessage` instance and should return quickly, e.g. by
+        passing the message to a queue (``q.subscribe(queue.put)``). Message
+        holding an error reported by q has a :class:`.QException` instance as
+        data. Exceptions raised by the callback are ignored.
+
+        :Parameters:
+         - `callback` (`callable`) - function accepting a :class:`.QMessage`
+        '''
+        with self._write_lock:
+            self._listeners = self._listeners + [callback]
+
+
+    def unsubscribe(self, callback):
+        '''Removes a callback registered with :func:`.subscribe`.
+
+        :Parameters:
+         - `callback` (`callable`) - callback to be removed
+        '''
+        with self._write_lock:
+            self._listeners = [listener for listener in self._listeners if listener != callback]
+
+
+    def query(self, msg_type, query, *parameters, **options):
+        '''Performs a query against a q service.
+
+        Refer to :func:`.QConnection.query` for details. Synchronous queries
+        written with this method have to be awaited by :func:`.sendSync`, use
+        it instead.
+
+        :raises: :class:`.QConnectionException`, :class:`.QWriterException`
+        '''
+        if msg_type == MessageType.SYNC:
+            raise QConnectionException('Synchronous queries have to be executed via sendSync.')
+
+        with self._write_lock:
+            super(MultiplexedQConnection, self).query(msg_type, query, *parameters, **options)
+
+
+    def sendSync(self, query, *parameters, **options):
+        '''Performs a synchronous query against a q service and returns parsed
+        data. Can be called from multiple threads concurrently.
+
+        Refer to :func:`.QConnection.sendSync` for details.
+
+        :raises: :class:`.QConnectionException`,
+                 :class:`.QResponseTimeoutException`,
+                 :class:`.QWriterException`, :class:`.QReaderException`,
+                 :class:`.QException`
+        '''
+        response = self._send_sync([(query, parameters)], options)[0]
+        return response.wait(self.timeout).data
+
+
+    def sendSyncMany(self, queries, window = 64, return_exceptions = False, **options):
+        '''Performs multiple synchronous queries against a q service and
+        returns list of parsed results. Can be called from multiple threads
+        concurrently.
+
+        Refer to :func:`.QConnection.sendSyncMany` for details. Responses are
+        consumed by the reader thread, so the `window` is ignored.
+
+        :raises: :class:`.QConnectionException`,
+                 :class:`.QResponseTimeoutException`,
+                 :class:`.QWriterException`, :class:`.QReaderException`,
+                 :class:`.QException`
+        '''
+        batch = []
+        for query in queries:
+            if isinstance(query, tuple) and len(query) == 2 and isinstance(query[1], (list, tuple)):
+                batch.append(query)
+            else:
+                batch.append((query, ()))
+
+        results = []
+        error = None
+        for response in self._send_sync(batch, options):
+            try:
+                results.append(response.wait(self.timeout).data)
+            except QException as e:
+                if error is None:
+                    error = e
+                results.append(e)
+
+        if error is not None and not return_exceptions:
+            raise error
+
+        return results
+
+
+    def receive(self, data_only = True, timeout = None, **options):
+        '''Retrieves a message sent by the q service, other than response to
+        a synchronous query, if no callback is registered with
+        :func:`.subscribe`.
+
+        Messages are parsed with options the connection has been created with.
+
+        :Parameters:
+         - `data_only` (`boolean`) - if ``True`` returns only data part of the
+           message, otherwise returns data and message meta-information
+           encapsulated in :class:`.QMessage` instance
+         - `timeout` (`nonnegative float` or `None`) - time in seconds to wait
+           for a message, ``None`` waits indefinitely
+
+        :returns: depending on parameter flags: :class:`.QMessage` instance,
+                  parsed message
+        :raises: :class:`.QConnectionException` if connection is closed or no
+                 message arrived within the `timeout`, :class:`.QException`
+        '''
+        try:
+            message = self._messages.get(timeout = timeout)
+        except queue.Empty:
+            raise QResponseTimeoutException('Message not received within %s seconds.' % timeout)
+
+        if message is None:
+            # keep the end marker for other consumers
+            self._messages.put(None)
+            raise QConnectionException('Connection is closed.')
+        elif isinstance(message.data, QException):
+            raise message.data
+
+        return message.data if data_only else message
+
+
+    def _send_sync(self, batch, options):
+        # serialize up front, so invalid query doesn't leave connection with
+        # part of the batch sent
+        if not self._connection:
+            raise QConnectionException('Connection is not established.')
+
+        writer = self._writer_class(None, protocol_version = self._protocol_version, encoding = self._encoding)
+        write_options = self._options.union_dict(**options)
+        messages = []
+        for query, parameters in batch:
+            if len(parameters) > 8:
+                raise QWriterException('Too many parameters.')
+            messages.append(writer.write([query] + list(parameters) if parameters else query, MessageType.SYNC, **write_options))
+
+        responses = [_PendingResponse(self._options.union_dict(**options)) for _ in messages]
+        with self._write_lock:
+            if not self._connection:
+                raise QConnectionException('Connection is not established.')
+
+            # responses are matched with queries in order of writes
+            self._pending.extend(responses)
+            try:
+                self._connection.sendall(b''.join(messages))
+            except:
+                for response in responses:
+                    if response in self._pending:
+                        self._pending.remove(response)
+                raise
+
+        return responses
+
+
+    def _read_messages(self, connection):
+        reader = self._reader
+        try:
+            while True:
+                message = reader.read_header()
+
+                if message.type == MessageType.RESPONSE and self._pending:
+                    response = self._pending.popleft()
+                    try:
+                        message.data = reader.read_data(message.size, message.compression_mode, **response.options)
+                    except QException as e:
+                        response.set_result(error = e)
+                    else:
+                        response.set_result(message)
+                else:
+                    try:
+                        message.data = reader.read_data(message.size, message.compression_mode, **self._options.as_dict())
+                    except QException as e:
+                        message.data = e
+                    self._dispatch(message)
+        except Exception as e:
+            self._on_connection_lost(connection, e)
+
+
+    def _dispatch(self, message):
+        listeners = self._listeners
+        if not listeners:
+            self._messages.put(message)
+
+        for listener in listeners:
+            try:
+                listener(message)
+            except Exception:
+                pass
+
+
+    def _on_connection_lost(self, connection, error):
+        with self._write_lock:
+            if self._connection is connection:
+                try:
+                    self._connection.close()
+                except socket.error:
+                    pass
+                self._connection = None
+
+            pending, self._pending = self._pending, deque()
+
+        for response in pending:
+            response.set_result(error = QConnectionException('Connection is closed: %s' % error))
+        self._messages.put(None)
@@ -0,0 +1,440 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import select
+import socket
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from qpython.qconnection import QConnection, QConnectionException
+from qpython.qtype import QException
+
+try:
+    import selectors
+except ImportError:
+    # Python 2
+    selectors = None
+
+try:
+    from time import monotonic
+except ImportError:
+    # Python 2, idle and wait times follow the wall clock
+    from time import time as monotonic
+
+
+
+class QConnectionPoolException(QConnectionException):
+    '''Raised when a connection cannot be checked out from the pool.'''
+    pass
+
+
+
+class QConnectionPool(object):
+    '''Thread-safe pool of connections to the q service.
+
+    A single :class:`.QConnection` cannot be shared between threads. The pool
+    keeps a set of opened connections which are checked out for exclusive use
+    and returned afterwards, so the IPC handshake is performed only when a new
+    connection is needed.
+
+    The :func:`.connection` context manager checks out a connection and
+    returns it to the pool when the block exits::
+
+        pool = qpool.QConnectionPool(host = 'localhost', port = 5000, max_size = 4)
+        with pool.connection() as q:
+            print(q('{`int$ til x}', 10))
+
+    Connections are validated with a cheap liveness probe before being handed
+    out: an idle connection which is closed by the remote side or has
+    unexpected data pending is discarded and replaced. Connections idle for
+    longer than `max_idle_time` are closed as long as the pool holds at least
+    `min_size` connections.
+
+    New connections reuse the IPC protocol version negotiated by the first one
+    and its reader and writer classes.
+
+    The :class:`.QConnectionPool` class provides a context manager API which
+    opens and closes the pool.
+
+    :Parameters:
+     - `host` (`string`) - q service hostname
+     - `port` (`integer`) - q service port
+     - `username` (`string` or `None`) - username for q authentication/authorization
+     - `password` (`string` or `None`) - password for q authentication/authorization
+     - `timeout` (`nonnegative float` or `None`) - set a timeout on blocking socket operations
+     - `encoding` (`string`) - string encoding for data deserialization
+     - `reader_class` (subclass of `QReader`) - data deserializer
+     - `writer_class` (subclass of `QWriter`) - data serializer
+     - `min_size` (`integer`) - number of connections opened with the pool
+       and kept open regardless of idle time
+     - `max_size` (`integer`) - maximum number of connections
+     - `max_idle_time` (`nonnegative float` or `None`) - time in seconds after
+       which an idle connection is closed, ``None`` disables eviction
+     - `checkout_timeout` (`nonnegative float` or `None`) - default time in
+       seconds to wait for a connection when the pool is exhausted, ``None``
+       waits indefinitely
+    :Options:
+     - conversion options passed to each :class:`.QConnection`
+    '''
+
+    def __init__(self, host, port, username = None, password = None, timeout = None, encoding = 'latin-1', reader_class = None, writer_class = None,
+                 min_size = 1, max_size = 8, max_idle_time = 300.0, checkout_timeout = None, **options):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError('Invalid pool size: min_size = %s, max_size = %s' % (min_size, max_size))
+
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle_time = max_idle_time
+        self.checkout_timeout = checkout_timeout
+
+        self._encoding = encoding
+        self._reader_class = reader_class
+        self._writer_class = writer_class
+        self._options = options
+        self._protocol_version = None
+
+        self._lock = threading.Condition()
+        # idle connections along with time of the last checkin, most recently
+        # used at the end
+        self._idle = deque()
+        self._size = 0
+        self._closed = True
+
+        self._checkouts = 0
+        self._exhausted = 0
+        self._timeouts = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._created = 0
+        self._discarded = 0
+
+
+    def __enter__(self):
+        self.open()
+        return self
+
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+    @property
+    def protocol_version(self):
+        '''Retrieves version of the IPC protocol negotiated by the pool
+        connections.
+
+        :returns: `integer` -- version of the IPC protocol or ``None`` if no
+                  connection has been established yet
+        '''
+        return self._protocol_version
+
+
+    @property
+    def size(self):
+        '''Retrieves number of connections held by the pool, both idle and
+        checked out.
+
+        :returns: `integer` -- number of connections
+        '''
+        return self._size
+
+
+    @property
+    def idle(self):
+        '''Retrieves number of idle connections.
+
+        :returns: `integer` -- number of idle connections
+        '''
+        return len(self._idle)
+
+
+    @property
+    def metrics(self):
+        '''Retrieves pool usage statistics.
+
+        :returns: `dict` with the following keys:
+         - `size` - number of connections held by the pool
+         - `idle` - number of idle connections
+         - `checkouts` - number of successful checkouts
+         - `exhausted` - number of checkouts which found the pool exhausted
+           and had to wait
+         - `timeouts` - number of checkouts which timed out
+         - `wait_time` - total time in seconds spent waiting for a connection
+         - `max_wait_time` - longest time in seconds spent waiting for a
+           connection
+         - `created` - number of opened connections
+         - `discarded` - number of connections closed due to failed liveness
+           probe, idle eviction or an error
+        '''
+        with self._lock:
+            return dict(size = self._size,
+                        idle = len(self._idle),
+                        checkouts = self._checkouts,
+                        exhausted = self._exhausted,
+                        timeouts = self._timeouts,
+                        wait_time = self._wait_time,
+                        max_wait_time = self._max_wait_time,
+                        created = self._created,
+                        discarded = self._discarded)
+
+
+    def open(self):
+        '''Opens the pool and initialises `min_size` connections.
+
+        :raises: :class:`.QConnectionException`, :class:`.QAuthenticationException`
+        '''
+        with self._lock:
+            if not self._closed:
+                return
+            self._closed = False
+
+        try:
+            for _ in range(self.min_size):
+                with self._lock:
+                    self._size += 1
+                try:
+                    connection = self._create()
+                except:
+                    with self._lock:
+                        self._size -= 1
+                    raise
+                self.checkin(connection)
+        except:
+            self.close()
+            raise
+
+
+    def close(self):
+        '''Closes the pool and all idle connections. Connections checked out
+        at the moment are closed when returned to the pool.'''
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                connection, _ = self._idle.pop()
+                self._size -= 1
+                connection.close()
+            self._lock.notify_all()
+
+
+    def is_closed(self):
+        '''Checks whether the pool has been closed or hasn't been opened yet.
+
+        :returns: `boolean` -- ``True`` if pool is closed, ``False`` otherwise
+        '''
+        return self._closed
+
+
+    def checkout(self, timeout = None):
+        '''Checks out a connection for exclusive use.
+
+        Returns an idle connection if available, opens a new one if the pool
+        holds less than `max_size` connections, otherwise waits until a
+        connection is returned to the pool.
+
+        The connection has to be returned to the pool with :func:`.checkin`.
+
+        :Parameters:
+         - `timeout` (`nonnegative float` or `None`) - time in seconds to wait
+           for a connection, if not specified `checkout_timeout` is used
+
+        :returns: :class:`.QConnection` -- opened connection
+        :raises: :class:`.QConnectionPoolException`,
+                 :class:`.QConnectionException`,
+                 :class:`.QAuthenticationException`
+        '''
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = monotonic()
+        waited = False
+
+        while True:
+            connection = None
+            with self._lock:
+                self._evict()
+
+                while True:
+                    if self._closed:
+                        raise QConnectionPoolException('Connection pool is closed.')
+
+                    if self._idle:
+                        connection, _ = self._idle.pop()
+                        break
+
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+
+                    if not waited:
+                        waited = True
+                        self._exhausted += 1
+
+                    remaining = None if timeout is None else timeout - (monotonic() - start)
+                    if remaining is not None and remaining <= 0:
+                        self._timeouts += 1
+                        self._record_wait(monotonic() - start)
+                        raise QConnectionPoolException('Connection pool exhausted.')
+
+                    self._lock.wait(remaining)
+
+            if connection is None:
+                try:
+                    connection = self._create()
+                except:
+                    with self._lock:
+                        self._size -= 1
+                        self._lock.notify()
+                    raise
+            elif not self._is_alive(connection):
+                self._discard(connection)
+                continue
+
+            with self._lock:
+                self._checkouts += 1
+                if waited:
+                    self._record_wait(monotonic() - start)
+
+            return connection
+
+
+    def checkin(self, connection, discard = False):
+        '''Returns a connection checked out with :func:`.checkout` to the pool.
+
+        :Parameters:
+         - `connection` (:class:`.QConnection`) - connection to be returned
+         - `discard` (`boolean`) - if ``True`` the connection is closed instead
+           of being reused, e.g. when its state is unknown due to an error
+        '''
+        if discard or not connection.is_connected():
+            self._discard(connection)
+            return
+
+        with self._lock:
+            if self._closed:
+                self._size -= 1
+                connection.close()
+            else:
+                self._idle.append((connection, monotonic()))
+            self._lock.notify()
+
+
+    @contextmanager
+    def connection(self, timeout = None):
+        '''Checks out a connection for the duration of a ``with`` block.
+
+        The connection is discarded if the block raises an exception other
+        than :class:`.QException` (an error reported by the q service), as the
+        connection may be left in an undefined state.
+
+        :Parameters:
+         - `timeout` (`nonnegative float` or `None`) - time in seconds to wait
+           for a connection, if not specified `checkout_timeout` is used
+
+        :returns: :class:`.QConnection` -- opened connection
+        :raises: :class:`.QConnectionPoolException`,
+                 :class:`.QConnectionException`,
+                 :class:`.QAuthenticationException`
+        '''
+        connection = self.checkout(timeout)
+        try:
+            yield connection
+        except QException:
+            self.checkin(connection)
+            raise
+        except:
+            self.checkin(connection, discard = True)
+            raise
+        else:
+            self.checkin(connection)
+
+
+    def _create(self):
+        connection = QConnection(self.host, self.port, self.username, self.password, self.timeout, self._encoding,
+                                 self._reader_class, self._writer_class, **self._options)
+        if self._protocol_version:
+            # skip the protocol version fallback, version has been negotiated
+            # by the first connection
+            connection.MAX_PROTOCOL_VERSION = self._protocol_version
+
+        connection.open()
+
+        with self._lock:
+            if self._protocol_version is None:
+                self._protocol_version = connection.protocol_version
+                self._reader_class = connection._reader_class
+                self._writer_class = connection._writer_class
+            self._created += 1
+
+        return connection
+
+
+    def _discard(self, connection):
+        connection.close()
+        with self._lock:
+            self._size -= 1
+            self._discarded += 1
+            self._lock.notify()
+
+
+    def _evict(self):
+        if self.max_idle_time is None:
+            return
+
+        deadline = monotonic() - self.max_idle_time
+        # least recently used connections are at the beginning
+        while self._idle and self._size > self.min_size and self._idle[0][1] < deadline:
+            connection, _ = self._idle.popleft()
+            connection.close()
+            self._size -= 1
+            self._discarded += 1
+
+
+    def _record_wait(self, wait_time):
+        self._wait_time += wait_time
+        self._max_wait_time = max(self._max_wait_time, wait_time)
+
+
+    @staticmethod
+    def _is_alive(connection):
+        '''Checks without a round trip whether an idle connection is usable.
+
+        No data is expected on an idle connection, so a readable socket
+        indicates either closed connection or unexpected message.
+        '''
+        if not connection.is_connected():
+            return False
+
+        try:
+            # unlike select.select, selectors and poll aren't limited to FD_SETSIZE
+            if selectors:
+                with selectors.DefaultSelector() as selector:
+                    selector.register(connection._connection, selectors.EVENT_READ)
+                    readable = selector.select(0)
+            elif hasattr(select, 'poll'):
+                poll = select.poll()
+                poll.register(connection._connection, select.POLLIN)
+                readable = poll.poll(0)
+            else:
+                readable = select.select([connection._connection], [], [], 0)[0]
+        except (ValueError, KeyError, socket.error):
+            return False
+
+        return not readable
@@ -14,21 +14,34 @@
 #  limitations under the License.
 #
 
+import copy
+import functools
+import operator
 import struct
 import sys
+import threading
+from collections import OrderedDict
 if sys.version > '3':
     from sys import intern
     unicode = str
 
+# numpy wraps memoryview only on Python 3, buffer is used on Python 2
+_NUMPY_MEMORYVIEW = sys.version > '3'
+
 from qpython import MetaData, CONVERSION_OPTIONS
 from qpython.qtype import *  # @UnusedWildImport
-from qpython.qcollection import qlist, QDictionary, qtable, QTable, QKeyedTable
+from qpython.qcollection import qlist, QList, QTemporalList, QSymbolCodes, QGuidList, QDictionary, qtable, QTable, QKeyedTable, qcolumnar_table, LazyQTable
 from qpython.qtemporal import qtemporal, from_raw_qtemporal, array_from_raw_qtemporal
 
 try:
     from qpython.fastutils import uncompress
 except:
-    from qpython.utils import uncompress
+    from qpython.utils import uncompress_vectorized as uncompress
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
 
 class QReaderException(Exception):
     '''
@@ -91,12 +104,35 @@ class QMessage(object):
 
 
 
+class _TablePlan(object):
+    '''Decode plan compiled for a table schema: decoded column names, cached
+    column selection and decoders of columns by their position. Plan which
+    is not cached doesn't compile the decoders.'''
+
+    def __init__(self, columns, cached = True):
+        self.columns = columns
+        self.decoders = [None] * len(columns) if cached else None
+        self.selection = None
+
+
+
 class QReader(object):
     '''
     Provides deserialization from q IPC protocol.
 
+    Messages read from the `stream` are received directly into a
+    preallocated `bytearray` via ``recv_into`` (sockets) or ``readinto``
+    (file objects). Messages which cannot be referenced after parsing, i.e.
+    compressed payloads and messages read with the `copy_arrays` option, are
+    received into a reusable buffer of at most :attr:`.MAX_ARENA_SIZE` bytes.
+
+    Tables with the same column names, e.g. subscription updates, are decoded
+    with plans compiled for the first of them and cached for at most
+    :attr:`.MAX_TABLE_PLANS` schemas. Column names are then not decoded again
+    and columns are decoded without looking up the reader for their type.
+
     :Parameters:
-     - `stream` (`file object` or `None`) - data input stream
+     - `stream` (`socket`, `file object` or `None`) - data input stream
      - `encoding` (`string`) - encoding for characters parsing
 
     :Attrbutes:
@@ -107,12 +143,25 @@ class QReader(object):
     _reader_map = {}
     parse = Mapper(_reader_map)
 
+    MAX_ARENA_SIZE = 1048576
+    MAX_TABLE_PLANS = 256
+
 
     def __init__(self, stream, encoding = 'latin-1'):
         self._stream = stream
         self._buffer = QReader.BytesBuffer()
         self._encoding = encoding
 
+        self._header = bytearray(8)
+        self._arena = bytearray()
+        self._executor = None
+        self._executor_threads = 0
+        self._symbols = OrderedDict()
+        self._symbols_lock = threading.Lock()
+        self._table_plans = {}
+        if stream is not None:
+            self._read_into = getattr(stream, 'recv_into', None) or getattr(stream, 'readinto', None)
+
 
     def read(self, source = None, **options):
         '''
@@ -129,6 +178,34 @@ class QReader(object):
            :class:`.QTemporal`) instances, otherwise are represented as
            `numpy datetime64`/`timedelta64` arrays and atoms,
            **Default**: ``False``
+         - `copy_arrays` (`boolean`) - if ``False`` native byte order numeric
+           vectors are views into the received message buffer, which stays
+           alive as long as any of the views does, if ``True`` vectors are
+           copied so the buffer can be released, **Default**: ``False``
+         - `column_threads` (`integer`) - if greater than ``0`` columns of
+           tables are located first and then decoded concurrently by the
+           given number of threads, **Default**: ``0``
+         - `columns` (list of `string` or `None`) - if specified only listed
+           columns of tables are decoded, other columns are skipped; key
+           columns of keyed tables are always decoded, **Default**: ``None``
+         - `lazy_tables` (`boolean`) - if ``True`` tables are represented as
+           :class:`.LazyQTable` instances decoding columns on first access,
+           keyed tables are always decoded, **Default**: ``False``
+         - `columnar_tables` (`boolean`) - if ``True`` tables are represented
+           as :class:`.QColumnarTable` instances keeping decoded columns
+           separately, keyed tables are always represented as
+           :class:`.QTable`, **Default**: ``False``
+         - `symbol_cache` (`integer`) - maximal number of symbol objects
+           cached by the reader and reused across messages, ``0`` disables
+           the cache, **Default**: ``0``
+         - `symbol_codes` (`boolean`) - if ``True`` symbol vectors are
+           represented as :class:`.QSymbolCodes` instances holding integer
+           codes of distinct symbols, **Default**: ``False``
+         - `compact_guids` (`boolean`) - if ``True`` guid vectors are
+           represented as :class:`.QGuidList` instances holding raw 16 bytes
+           wide values, **Default**: ``False``
+         - `arrow` (`boolean`) - if ``True`` tables are represented as
+           `pyarrow.Table` instances, **Default**: ``False``
 
         :returns: :class:`.QMessage` - read data (parsed or raw byte form) along
                   with meta information
@@ -153,8 +230,7 @@ class QReader(object):
         :returns: :class:`.QMessage` - read meta information
         '''
         if self._stream:
-            header = self._read_bytes(8)
-            self._buffer.wrap(header)
+            self._buffer.wrap(self._read_bytes(8, self._header))
         else:
             self._buffer.wrap(source)
 
@@ -187,6 +263,34 @@ class QReader(object):
            :class:`.QTemporal`) instances, otherwise are represented as
            `numpy datetime64`/`timedelta64` arrays and atoms,
            **Default**: ``False``
+         - `copy_arrays` (`boolean`) - if ``False`` native byte order numeric
+           vectors are views into the received message buffer, which stays
+           alive as long as any of the views does, if ``True`` vectors are
+           copied so the buffer can be released, **Default**: ``False``
+         - `column_threads` (`integer`) - if greater than ``0`` columns of
+           tables are located first and then decoded concurrently by the
+           given number of threads, **Default**: ``0``
+         - `columns` (list of `string` or `None`) - if specified only listed
+           columns of tables are decoded, other columns are skipped; key
+           columns of keyed tables are always decoded, **Default**: ``None``
+         - `lazy_tables` (`boolean`) - if ``True`` tables are represented as
+           :class:`.LazyQTable` instances decoding columns on first access,
+           keyed tables are always decoded, **Default**: ``False``
+         - `columnar_tables` (`boolean`) - if ``True`` tables are represented
+           as :class:`.QColumnarTable` instances keeping decoded columns
+           separately, keyed tables are always represented as
+           :class:`.QTable`, **Default**: ``False``
+         - `symbol_cache` (`integer`) - maximal number of symbol objects
+           cached by the reader and reused across messages, ``0`` disables
+           the cache, **Default**: ``0``
+         - `symbol_codes` (`boolean`) - if ``True`` symbol vectors are
+           represented as :class:`.QSymbolCodes` instances holding integer
+           codes of distinct symbols, **Default**: ``False``
+         - `compact_guids` (`boolean`) - if ``True`` guid vectors are
+           represented as :class:`.QGuidList` instances holding raw 16 bytes
+           wide values, **Default**: ``False``
+         - `arrow` (`boolean`) - if ``True`` tables are represented as
+           `pyarrow.Table` instances, **Default**: ``False``
 
         :returns: read data (parsed or raw byte form)
         '''
@@ -195,20 +299,30 @@ class QReader(object):
         if compression_mode > 0:
             comprHeaderLen = 4 if compression_mode == 1 else 8
             if self._stream:
-                self._buffer.wrap(self._read_bytes(comprHeaderLen))
+                self._buffer.wrap(self._read_bytes(comprHeaderLen, self._header))
             uncompressed_size = -8 + (self._buffer.get_uint() if compression_mode == 1 else self._buffer.get_long())
-            compressed_data = self._read_bytes(message_size - (8+comprHeaderLen)) if self._stream else self._buffer.raw(message_size - (8+comprHeaderLen))
+            compressed_size = message_size - (8+comprHeaderLen)
+            # compressed payload is not referenced after decompression
+            compressed_data = self._read_bytes(compressed_size, self._get_arena(compressed_size)) if self._stream else self._buffer.view(compressed_size)
 
-            raw_data = numpy.frombuffer(compressed_data, dtype = numpy.uint8)
+            raw_data = numpy.frombuffer(compressed_data, dtype = numpy.uint8, count = compressed_size)
             if  uncompressed_size <= 0:
                 raise QReaderException('Error while data decompression.')
 
-            raw_data = uncompress(raw_data, numpy.int64(uncompressed_size))
+            try:
+                raw_data = uncompress(raw_data, numpy.int64(uncompressed_size))
+            except (ValueError, IndexError):
+                raise QReaderException('Error while data decompression.')
             raw_data = numpy.ndarray.tobytes(raw_data)
             self._buffer.wrap(raw_data)
         elif self._stream:
-            raw_data = self._read_bytes(message_size - 8)
-            self._buffer.wrap(raw_data)
+            data_size = message_size - 8
+            # parsed data doesn't reference the received buffer if arrays
+            # are copied or raw data is requested, lazy tables always do
+            reusable = (self._options.copy_arrays and not self._options.lazy_tables) or self._options.raw
+            self._buffer.wrap(self._read_bytes(data_size, self._get_arena(data_size) if reusable else None), data_size)
+            if self._options.raw:
+                raw_data = self._buffer.raw(data_size)
         if not self._stream and self._options.raw:
             raw_data = self._buffer.raw(message_size - 8)
 
@@ -248,7 +362,24 @@ class QReader(object):
 
     @parse(QSYMBOL)
     def _read_symbol(self, qtype = QSYMBOL):
-        return numpy.bytes_(self._buffer.get_symbol())
+        return self._intern_symbol(self._buffer.get_symbol())
+
+
+    def _intern_symbol(self, symbol):
+        '''Returns symbol object cached by this reader, if the `symbol_cache`
+        option is set, least recently used symbols are evicted.'''
+        size = self._options.symbol_cache
+        if not size:
+            return numpy.bytes_(symbol)
+
+        with self._symbols_lock:
+            interned = self._symbols.pop(symbol, None)
+            if interned is None:
+                interned = numpy.bytes_(symbol)
+                while len(self._symbols) >= size:
+                    self._symbols.popitem(last = False)
+            self._symbols[symbol] = interned
+        return interned
 
 
     @parse(QCHAR)
@@ -289,16 +420,25 @@ class QReader(object):
 
         if qtype == QSYMBOL_LIST:
             symbols = self._buffer.get_symbols(length)
+            if self._options.symbol_codes:
+                return self._read_symbol_codes(symbols)
             data = numpy.array(symbols, dtype = numpy.bytes_)
             return qlist(data, qtype = qtype, adjust_dtype = False)
         elif qtype == QGUID_LIST:
-            data = numpy.array([self._read_guid() for x in range(length)])
+            if self._options.compact_guids:
+                data = numpy.frombuffer(self._buffer.view(length * 16), dtype = 'V16')
+                if self._options.copy_arrays:
+                    data = data.copy()
+                vector = data.view(QGuidList)
+                vector._meta_init(qtype = qtype)
+                return vector
+
+            raw = self._buffer.raw(length * 16)
+            data = numpy.empty(length, dtype = object)
+            data[:] = [uuid.UUID(bytes = raw[i : i + 16]) for i in range(0, len(raw), 16)]
             return qlist(data, qtype = qtype, adjust_dtype = False)
         elif conversion:
-            raw = self._buffer.raw(length * ATOM_SIZE[qtype])
-            data = numpy.frombuffer(raw, dtype = conversion)
-            if not self._is_native:
-                data.byteswap(True)
+            data = self._read_array(length, numpy.dtype(conversion), ATOM_SIZE[qtype])
 
             if qtype >= QTIMESTAMP_LIST and qtype <= QTIME_LIST and self._options.numpy_temporals:
                 data = array_from_raw_qtemporal(data, qtype)
@@ -308,10 +448,35 @@ class QReader(object):
             raise QReaderException('Unable to deserialize q type: %s' % hex(qtype))
 
 
+    def _read_array(self, length, dtype, size):
+        '''Reads `length` items of `dtype` of `size` bytes as a `numpy` array
+        in native byte order. Array references the wrapped data, unless the
+        `copy_arrays` option is set.'''
+        raw = self._buffer.view(length * size)
+        if self._is_native:
+            data = numpy.frombuffer(raw, dtype = dtype)
+            return data.copy() if self._options.copy_arrays else data
+
+        # single copy converting to native byte order
+        return numpy.frombuffer(raw, dtype = dtype.newbyteorder(self._buffer.endianness)).astype(dtype)
+
+
+    def _read_symbol_codes(self, symbols):
+        index = {}
+        codes = numpy.fromiter((index.setdefault(symbol, len(index)) for symbol in symbols), dtype = numpy.int32, count = len(symbols))
+        distinct = numpy.empty(len(index), dtype = object)
+        # placed by codes, dict doesn't keep insertion order before Python 3.7
+        distinct[list(index.values())] = [self._intern_symbol(symbol) for symbol in index]
+
+        vector = codes.view(QSymbolCodes)
+        vector._meta_init(qtype = QSYMBOL, symbols = distinct)
+        return vector
+
+
     @parse(QDICTIONARY)
     def _read_dictionary(self, qtype = QDICTIONARY):
-        keys = self._read_object()
-        values = self._read_object()
+        keys = self._read_dictionary_part(keys = True)
+        values = self._read_dictionary_part(keys = False)
 
         if isinstance(keys, QTable):
             return QKeyedTable(keys, values)
@@ -319,17 +484,331 @@ class QReader(object):
             return QDictionary(keys, values)
 
 
+    def _read_dictionary_part(self, keys):
+        '''Reads keys or values of a dictionary. Tables forming a keyed table
+        are always represented as :class:`.QTable` and key columns are read
+        regardless of the `columns` option. Symbol keys are never represented
+        as codes.'''
+        qtype = self._buffer.get_byte()
+        if qtype == QTABLE:
+            return self._read_table(qtype, projection = not keys, recarray = True)
+
+        self._buffer.skip(-1)  # let the type indicator be read again
+        data = self._read_object()
+        # keys are looked up by symbols and guids
+        return data.decode() if keys and isinstance(data, (QSymbolCodes, QGuidList)) else data
+
+
     @parse(QTABLE)
-    def _read_table(self, qtype = QTABLE):
+    def _read_table(self, qtype = QTABLE, projection = True, recarray = False):
         self._buffer.skip()  # ignore attributes
         self._buffer.skip()  # ignore dict type stamp
 
-        columns = self._read_object()
-        data = self._read_object()
+        plan = self._read_table_plan()
+        columns = plan.columns
+        self._buffer.skip()  # ignore generic list type indicator
+        selection = self._select_planned_columns(plan) if projection else None
+
+        if not recarray and self._options.arrow:
+            return self._read_arrow_table(columns, selection)
+
+        if not recarray and self._options.lazy_tables:
+            return self._read_lazy_table(columns, selection)
+
+        data = self._read_columns(selection, plan = plan)
+
+        if selection is not None:
+            columns = qlist(columns[selection], qtype = QSYMBOL_LIST, adjust_dtype = False)
+
+        if not recarray and self._options.columnar_tables:
+            return qcolumnar_table(columns, data, qtype = QTABLE)
 
         return qtable(columns, data, qtype = QTABLE)
 
 
+    def _read_table_plan(self):
+        '''Reads column names of a table and returns decode plan for them.
+        Plans are cached by serialized column names, so names of tables with
+        a known schema are only skipped.'''
+        start = self._buffer.position
+        if not self.MAX_TABLE_PLANS or self._buffer.get_byte() != QSYMBOL_LIST:
+            self._buffer.skip(start - self._buffer.position)
+            return _TablePlan(self._read_column_names(), cached = False)
+
+        attr = self._buffer.get_byte()
+        length = self._buffer.get_long() if attr & 0x80 != 0 else self._buffer.get_uint()
+        self._buffer.skip_symbols(length)
+
+        size = self._buffer.position - start
+        self._buffer.skip(-size)
+        key = self._buffer.raw(size)
+
+        plan = self._table_plans.get(key)
+        if plan is None:
+            self._buffer.skip(-size)
+            plan = _TablePlan(self._read_column_names())
+            if len(self._table_plans) >= self.MAX_TABLE_PLANS:
+                self._table_plans.clear()
+            self._table_plans[key] = plan
+        return plan
+
+
+    def _read_column_names(self):
+        '''Reads column names of a table. Symbol vector of names is read
+        regardless of the reader options, as it's shared by cached plans.'''
+        qtype = self._buffer.get_byte()
+        if qtype != QSYMBOL_LIST:
+            self._buffer.skip(-1)  # let the type indicator be read again
+            return self._read_object()
+
+        attr = self._buffer.get_byte()
+        length = self._buffer.get_long() if attr & 0x80 != 0 else self._buffer.get_uint()
+        return qlist(numpy.array(self._buffer.get_symbols(length), dtype = numpy.bytes_), qtype = qtype, adjust_dtype = False)
+
+
+    def _select_planned_columns(self, plan):
+        '''Returns mask of columns selected by the `columns` option, cached
+        in the `plan` while the option doesn't change.'''
+        selected = self._options.columns
+        if selected is not None and not isinstance(selected, (str, bytes)):
+            selected = tuple(selected)
+
+        if plan.selection is None or plan.selection[0] != selected:
+            plan.selection = (selected, self._select_columns(plan.columns))
+        return plan.selection[1]
+
+
+    def _select_columns(self, columns):
+        '''Returns mask of table columns selected by the `columns` option or
+        ``None`` if all columns are to be read.'''
+        selected = self._options.columns
+        if selected is None:
+            return None
+
+        if isinstance(selected, (str, bytes)):
+            selected = [selected]
+        selected = set(column.encode(self._encoding) if isinstance(column, str) else column for column in selected)
+        selection = numpy.array([column in selected for column in columns], dtype = bool)
+        if not selection.any():
+            raise QReaderException('None of the selected columns found in table')
+
+        return selection
+
+
+    def _read_columns(self, selection = None, read = '_read_object', plan = None):
+        '''Reads data of table columns stored as a general list with the
+        `read` method or with decoders of the table `plan`. Columns not
+        marked in the `selection` mask are skipped.'''
+        self._buffer.skip()  # ignore attributes
+        length = self._buffer.get_int()
+        selection = [True] * length if selection is None else selection
+        if plan is not None and (plan.decoders is None or len(plan.decoders) != length):
+            plan = None
+
+        threads = self._options.column_threads
+        if not threads or length < 2 or not ThreadPoolExecutor:
+            data = []
+            for index, selected in enumerate(selection):
+                if selected:
+                    data.append(self._read_column(plan, index) if plan else getattr(self, read)())
+                else:
+                    self._skip_object()
+            return data
+
+        # locate columns first, so they can be decoded independently
+        readers, indices = [], []
+        for index, selected in enumerate(selection):
+            if selected:
+                readers.append(self._fork())
+                indices.append(index)
+            self._skip_object()
+
+        if not self._executor or self._executor_threads != threads:
+            if self._executor:
+                self._executor.shutdown(wait = False)
+            self._executor = ThreadPoolExecutor(max_workers = threads)
+            self._executor_threads = threads
+
+        if plan:
+            return list(self._executor.map(lambda reader, index: reader._read_column(plan, index), readers, indices))
+        return list(self._executor.map(operator.methodcaller(read), readers))
+
+
+    def _read_column(self, plan, index):
+        '''Reads a table column with the decoder compiled in the `plan` for
+        its position. Decoder is compiled again if type of the column
+        changes.'''
+        qtype = self._buffer.get_byte()
+        decoder = plan.decoders[index]
+        if decoder is None or decoder[0] != qtype:
+            decoder = plan.decoders[index] = (qtype, self._compile_column_decoder(qtype))
+
+        if decoder[1] is None:
+            self._buffer.skip(-1)  # let the type indicator be read again
+            return self._read_object()
+        return decoder[1](self, qtype)
+
+
+    def _compile_column_decoder(self, qtype):
+        '''Returns function decoding a table column of type `qtype` or
+        ``None`` if the column has to be read via :func:`._read_object`.'''
+        reader = self._get_reader(qtype)
+        if reader:
+            return reader
+        elif qtype < QBOOL_LIST or qtype > QTIME_LIST:
+            return None
+
+        conversion = PY_TYPE.get(-qtype, None)
+        if not conversion or qtype == QSYMBOL_LIST or qtype == QGUID_LIST or type(self)._read_list is not QReader._read_list:
+            return type(self)._read_list
+
+        return functools.partial(QReader._read_vector, dtype = numpy.dtype(conversion), size = ATOM_SIZE[qtype])
+
+
+    def _read_vector(self, qtype, dtype, size):
+        '''Reads numeric or temporal q vector, which items are `dtype` of
+        `size` bytes, the same way as :func:`._read_list`.'''
+        attr = self._buffer.get_byte()
+        length = self._buffer.get_long() if attr & 0x80 != 0 else self._buffer.get_uint()
+        data = self._read_array(length, dtype, size)
+
+        if qtype < QTIMESTAMP_LIST or qtype > QTIME_LIST:
+            vector = data.view(QList)
+        elif self._options.numpy_temporals:
+            vector = array_from_raw_qtemporal(data, qtype).view(QList)
+        else:
+            vector = data.view(QTemporalList)
+
+        vector._meta_init(qtype = -qtype)
+        return vector
+
+
+    def _read_arrow_table(self, columns, selection = None):
+        '''Reads table columns directly into a `pyarrow.Table`.'''
+        try:
+            from qpython import _arrow
+        except ImportError:
+            raise QReaderException('pyarrow is required to represent tables as pyarrow.Table')
+
+        data = self._read_columns(selection, read = '_read_arrow_column')
+        if selection is not None:
+            columns = columns[selection]
+
+        for index, (array, qtype) in enumerate(data):
+            if qtype == QGENERAL_LIST:
+                try:
+                    data[index] = (_arrow.array_from_list(array, self._encoding), qtype)
+                except (_arrow.ArrowInvalid, _arrow.ArrowTypeError) as e:
+                    column = columns[index].decode(self._encoding) if isinstance(columns[index], bytes) else columns[index]
+                    raise QReaderException('Unable to represent column %s as pyarrow.Array: %s' % (column, e))
+
+        return _arrow.table(columns, data, self._encoding)
+
+
+    def _read_arrow_column(self):
+        '''Reads a table column as a `pyarrow.Array`. Numeric vectors in
+        native byte order are wrapped without copying.
+
+        :returns: pair of `pyarrow.Array` and q type of the column, general
+                  lists are returned as read, to be converted by the caller
+        '''
+        from qpython import _arrow
+
+        qtype = self._buffer.get_byte()
+        if qtype == QGENERAL_LIST:
+            return self._read_general_list(qtype), qtype
+        elif -qtype not in _arrow.ARROW_TYPE and qtype not in (QGUID_LIST, QSYMBOL_LIST, QSTRING):
+            raise QReaderException('Unable to represent q type %s as pyarrow.Array' % hex(qtype))
+
+        attr = self._buffer.get_byte()
+        length = self._buffer.get_long() if attr & 0x80 != 0 else self._buffer.get_uint()
+
+        if qtype == QSYMBOL_LIST:
+            return _arrow.array_from_symbols(self._buffer.get_symbols(length), self._encoding), -qtype
+        elif qtype == QSTRING:
+            return _arrow.array_from_chars(self._buffer.raw(length), self._encoding), -qtype
+        elif qtype == QGUID_LIST:
+            raw = self._buffer.view(length * 16)
+            return _arrow.array_from_guids(bytes(raw) if self._options.copy_arrays else raw), -qtype
+
+        data = self._read_array(length, numpy.dtype(PY_TYPE[-qtype]), ATOM_SIZE[qtype])
+        return _arrow.array_from_raw(data, qtype), -qtype
+
+
+    def _read_lazy_table(self, columns, selection = None):
+        '''Locates table columns and returns :class:`.LazyQTable` decoding them
+        on first access.'''
+        self._buffer.skip()  # ignore attributes
+        length = self._buffer.get_int()
+        selection = [True] * length if selection is None else selection
+
+        names, loaders, meta = [], [], {}
+        rows = 0
+        for column, selected in zip(columns, selection):
+            if selected:
+                reader = self._fork()
+                names.append(column)
+                loaders.append(reader._read_object)
+
+                # number of rows and type are stored in column header
+                header = self._buffer.fork()
+                qtype = header.get_byte()
+                attr = header.get_byte()
+                rows = header.get_long() if attr & 0x80 != 0 else header.get_uint()
+                meta[column if isinstance(column, str) else column.decode('utf-8')] = -abs(qtype)
+            self._skip_object()
+
+        return LazyQTable(names, loaders, rows, qtype = QTABLE, **meta)
+
+
+    def _fork(self):
+        '''Creates a reader sharing options and wrapped data, positioned at
+        the current position of this reader.'''
+        reader = copy.copy(self)
+        reader._buffer = self._buffer.fork()
+        return reader
+
+
+    def _skip_object(self):
+        '''Moves past a serialized object without decoding it.'''
+        qtype = self._buffer.get_byte()
+
+        if qtype == QGENERAL_LIST:
+            self._buffer.skip()  # ignore attributes
+            for x in range(self._buffer.get_int()):
+                self._skip_object()
+        elif qtype >= QBOOL_LIST and qtype <= QTIME_LIST:
+            attr = self._buffer.get_byte()
+            length = self._buffer.get_long() if attr & 0x80 != 0 else self._buffer.get_uint()
+            if qtype == QSYMBOL_LIST:
+                self._buffer.skip_symbols(length)
+            else:
+                self._buffer.skip(length * ATOM_SIZE[qtype])
+        elif qtype == QSYMBOL or qtype == QERROR:
+            self._buffer.skip_symbols(1)
+        elif qtype <= QBOOL and qtype >= QTIME:
+            self._buffer.skip(ATOM_SIZE[-qtype])
+        elif qtype == QTABLE:
+            self._buffer.skip(2)  # ignore attributes and dict type stamp
+            self._skip_object()
+            self._skip_object()
+        elif qtype == QDICTIONARY:
+            self._skip_object()
+            self._skip_object()
+        elif qtype == QLAMBDA:
+            self._buffer.skip_symbols(1)
+            self._skip_object()
+        elif qtype >= QNULL and qtype <= QTERNARY_FUNC:
+            self._buffer.skip()
+        elif qtype == QPROJECTION or qtype == QCOMPOSITION_FUNC:
+            for x in range(self._buffer.get_int()):
+                self._skip_object()
+        elif qtype >= QADVERB_FUNC_106 and qtype <= QADVERB_FUNC_111:
+            self._skip_object()
+        else:
+            raise QReaderException('Unable to deserialize q type: %s' % hex(qtype))
+
+
     @parse(QGENERAL_LIST)
     def _read_general_list(self, qtype = QGENERAL_LIST):
         self._buffer.skip()  # ignore attributes
@@ -378,18 +857,54 @@ class QReader(object):
         return QProjection(parameters)
 
 
-    def _read_bytes(self, length):
+    def _get_arena(self, length):
+        if length > self.MAX_ARENA_SIZE:
+            return None
+
+        if len(self._arena) < length:
+            self._arena = bytearray(max(length, 2 * len(self._arena)))
+        return self._arena
+
+
+    def _read_bytes(self, length, buffer_ = None):
+        '''
+        Reads exactly `length` bytes from the stream.
+
+        :Parameters:
+         - `length` (`integer`) - number of bytes to be read
+         - `buffer_` (`bytearray` or `None`) - buffer to be filled, a new
+           `bytearray` is allocated if not specified
+
+        :returns: `bytearray` holding read data at its beginning
+        '''
         if not self._stream:
             raise QReaderException('There is no input data. QReader requires either stream or data chunk')
 
-        if length == 0:
-            return b''
-        else:
+        if buffer_ is None:
+            buffer_ = bytearray(length)
+
+        if not self._read_into:
             data = self._stream.read(length)
+            if len(data) != length:
+                raise QReaderException('Error while reading data')
+            buffer_[:length] = data
+            return buffer_
+
+        view = memoryview(buffer_)
+        position = 0
+        try:
+            while position < length:
+                count = self._read_into(view[position : length])
+                if not count:
+                    raise QReaderException('Error while reading data')
+                position += count
+        finally:
+            # memoryview can't be released on Python 2
+            release = getattr(view, 'release', None)
+            if release:
+                release()
 
-        if len(data) == 0:
-            raise QReaderException('Error while reading data')
-        return data
+        return buffer_
 
 
 
@@ -398,8 +913,11 @@ class QReader(object):
         Utility class for reading bytes from wrapped buffer.
         '''
 
+        # compiled struct layouts, by endianness and format
+        _structs = {}
+
         def __init__(self):
-            self._endianness = '@'
+            self.endianness = '@'
 
 
         @property
@@ -419,18 +937,58 @@ class QReader(object):
              - `endianness` (``<`` or ``>``) - byte order indicator
             '''
             self._endianness = endianness
+            self._layouts = QReader.BytesBuffer._structs.setdefault(endianness, {})
+            self._unpack_byte = self._layout('b').unpack_from
+            self._unpack_int = self._layout('i').unpack_from
+            self._unpack_uint = self._layout('I').unpack_from
+            self._unpack_long = self._layout('q').unpack_from
+
+
+        def _layout(self, fmt):
+            layout = self._layouts.get(fmt)
+            if layout is None:
+                layout = self._layouts[fmt] = struct.Struct(self._endianness + fmt)
+            return layout
 
 
-        def wrap(self, data):
+        def wrap(self, data, size = None):
             '''
             Wraps the data in the buffer.
 
             :Parameters:
              - `data` - data to be wrapped
+             - `size` (`integer` or `None`) - number of leading bytes of
+               `data` to be wrapped, if not specified the whole `data` is
+               wrapped
             '''
             self._data = data
+            self._view = memoryview(data)
             self._position = 0
-            self._size = len(data)
+            self._size = len(data) if size is None else size
+
+
+        @property
+        def position(self):
+            '''
+            Gets the current reading position.
+            '''
+            return self._position
+
+
+        def fork(self):
+            '''
+            Creates a buffer wrapping the same data, positioned at the current
+            position of this buffer.
+
+            :returns: :class:`.QReader.BytesBuffer` with independent position
+            '''
+            buffer_ = QReader.BytesBuffer()
+            buffer_.endianness = self._endianness
+            buffer_._data = self._data
+            buffer_._view = self._view
+            buffer_._size = self._size
+            buffer_._position = self._position
+            return buffer_
 
 
         def skip(self, offset = 1):
@@ -462,11 +1020,31 @@ class QReader(object):
             if new_position > self._size:
                 raise QReaderException('Attempt to read data out of buffer bounds')
 
-            raw = self._data[self._position : new_position]
+            raw = self._view[self._position : new_position].tobytes()
             self._position = new_position
             return raw
 
 
+        def view(self, offset):
+            '''
+            Gets a view of `offset` number of raw bytes without copying them.
+
+            :Parameters:
+             - `offset` (`integer`) - number of bytes to be retrieved
+
+            :returns: `memoryview` (`buffer` on Python 2) referencing the
+                      wrapped data
+            '''
+            new_position = self._position + offset
+
+            if new_position > self._size:
+                raise QReaderException('Attempt to read data out of buffer bounds')
+
+            view = self._view[self._position : new_position] if _NUMPY_MEMORYVIEW else buffer(self._data, self._position, offset)
+            self._position = new_position
+            return view
+
+
         def get(self, fmt, offset = None):
             '''
             Gets bytes from the buffer according to specified format or `offset`.
@@ -477,9 +1055,27 @@ class QReader(object):
 
             :returns: unpacked bytes
             '''
-            fmt = self.endianness + fmt
-            offset = offset if offset else struct.calcsize(fmt)
-            return struct.unpack(fmt, self.raw(offset))[0]
+            layout = self._layouts.get(fmt) or self._layout(fmt)
+            position = self._position
+            new_position = position + (offset if offset else layout.size)
+
+            if new_position > self._size:
+                raise QReaderException('Attempt to read data out of buffer bounds')
+
+            self._position = new_position
+            return layout.unpack_from(self._data, position)[0]
+
+
+        def _unpack(self, unpack, size):
+            # values are unpacked in place, without slicing the data
+            position = self._position
+            new_position = position + size
+
+            if new_position > self._size:
+                raise QReaderException('Attempt to read data out of buffer bounds')
+
+            self._position = new_position
+            return unpack(self._data, position)[0]
 
 
         def get_byte(self):
@@ -488,7 +1084,14 @@ class QReader(object):
 
             :returns: single byte
             '''
-            return self.get('b')
+            # inlined, type indicator of every object is read via this method
+            position = self._position
+
+            if position >= self._size:
+                raise QReaderException('Attempt to read data out of buffer bounds')
+
+            self._position = position + 1
+            return self._unpack_byte(self._data, position)[0]
 
 
         def get_int(self):
@@ -497,7 +1100,7 @@ class QReader(object):
 
             :returns: single integer
             '''
-            return self.get('i')
+            return self._unpack(self._unpack_int, 4)
 
 
         def get_uint(self):
@@ -506,7 +1109,7 @@ class QReader(object):
 
             :returns: single integer
             '''
-            return self.get('I')
+            return self._unpack(self._unpack_uint, 4)
 
 
         def get_long(self):
@@ -515,7 +1118,7 @@ class QReader(object):
 
             :returns: single integer
             '''
-            return self.get('q')
+            return self._unpack(self._unpack_long, 8)
 
 
         def get_symbol(self):
@@ -524,16 +1127,36 @@ class QReader(object):
 
             :returns: ``\\x00`` terminated string
             '''
-            new_position = self._data.find(b'\x00', self._position)
+            new_position = self._data.find(b'\x00', self._position, self._size)
 
             if new_position < 0:
                 raise QReaderException('Failed to read symbol from stream')
 
-            raw = self._data[self._position : new_position]
+            raw = self._view[self._position : new_position].tobytes()
             self._position = new_position + 1
             return raw
 
 
+        def skip_symbols(self, count):
+            '''
+            Skips ``count`` ``\\x00`` terminated strings.
+
+            :Parameters:
+             - `count` (`integer`) - number of strings to be skipped
+            '''
+            new_position = self._position
+
+            for x in range(count):
+                new_position = self._data.find(b'\x00', new_position, self._size)
+
+                if new_position < 0:
+                    raise QReaderException('Failed to read symbol from stream')
+
+                new_position += 1
+
+            self._position = new_position
+
+
         def get_symbols(self, count):
             '''
             Gets ``count`` ``\\x00`` terminated strings from the buffer.
@@ -550,7 +1173,7 @@ class QReader(object):
                 return []
 
             while c < count:
-                new_position = self._data.find(b'\x00', new_position)
+                new_position = self._data.find(b'\x00', new_position, self._size)
 
                 if new_position < 0:
                     raise QReaderException('Failed to read symbol from stream')
@@ -558,7 +1181,7 @@ class QReader(object):
                 c += 1
                 new_position += 1
 
-            raw = self._data[self._position : new_position - 1]
+            raw = self._view[self._position : new_position - 1].tobytes()
             self._position = new_position
 
             return raw.split(b'\x00')
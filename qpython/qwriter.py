@@ -15,16 +15,18 @@
 #
 
 import struct
-try:
-    from cStringIO import BytesIO
-except ImportError:
-    from io import BytesIO
 
 from qpython import MetaData, CONVERSION_OPTIONS
 from qpython.qtype import *  # @UnusedWildImport
-from qpython.qcollection import qlist, QList, QTemporalList, QDictionary, QTable, QKeyedTable, get_list_qtype
+from qpython.qcollection import qlist, QList, QTemporalList, QSymbolCodes, QGuidList, QDictionary, QTable, QKeyedTable, QColumnarTable, LazyQTable, get_list_qtype
 from qpython.qtemporal import QTemporal, to_raw_qtemporal, array_to_raw_qtemporal
 
+try:
+    from qpython.fastutils import compress
+except:
+    from qpython.utils import compress
+
+
 
 class QWriterException(Exception):
     '''
@@ -36,6 +38,137 @@ class QWriterException(Exception):
 
 ENDIANNESS = '\1' if sys.byteorder == 'little' else '\0'
 
+# buffers of at least this size are referenced instead of being copied
+ZERO_COPY_THRESHOLD = 64 * 1024
+
+# maximal number of buffers passed to a single sendmsg call
+_IOV_MAX = 1024
+
+# memoryview on Python 2 has neither nbytes nor cast and cannot be joined,
+# written data is always copied there
+_MEMORYVIEW_CAST = hasattr(memoryview, 'cast')
+
+# precompiled layouts of message parts
+MESSAGE_HEADER = struct.Struct('=bbxxi')
+MESSAGE_SIZE = struct.Struct('=i')
+TYPE_INDICATOR = struct.Struct('=b')
+NULL_HEADER = struct.Struct('=bx')
+LIST_HEADER = struct.Struct('=bxi')
+TABLE_HEADER = struct.Struct('=bxb')
+PROJECTION_HEADER = struct.Struct('=bi')
+ATOM_STRUCTS = dict((qtype, struct.Struct('=b' + fmt)) for qtype, fmt in STRUCT_MAP.items() if fmt not in ('s', 'S'))
+
+
+
+class MessageBuffer(object):
+    '''
+    Collects a serialized message as a list of buffers. Small writes are
+    accumulated in a preallocated `bytearray` reused across messages, while
+    buffers of at least `ZERO_COPY_THRESHOLD` bytes, e.g. contiguous `numpy`
+    arrays, are referenced without copying. Referenced buffers must not be
+    modified until the message is sent.
+
+    :Parameters:
+     - `capacity` (`integer`) - initial size of the `bytearray`, memory
+       exceeding it is released by :func:`.reset` once grown over
+       `max_capacity`
+     - `max_capacity` (`integer`) - maximal size of the `bytearray` retained
+       between messages
+    '''
+
+    def __init__(self, capacity = 4096, max_capacity = 1024 * 1024):
+        self._capacity = capacity
+        self._max_capacity = max_capacity
+        self._data = bytearray(capacity)
+        self.reset()
+
+
+    def reset(self):
+        '''Discards the collected message and references to written
+        buffers.'''
+        if len(self._data) > self._max_capacity:
+            self._data = bytearray(self._capacity)
+
+        self._position = 0
+        self._start = 0
+        self._segments = []
+        self._size = 0
+
+
+    def _reserve(self, size):
+        extension = bytearray(max(self._position + size, 2 * len(self._data)) - len(self._data))
+        try:
+            self._data += extension
+        except BufferError:
+            # previous message is still referenced, e.g. by a traceback
+            self._data = self._data + extension
+
+
+    def write(self, data):
+        '''Appends `data` supporting the buffer protocol to the message.'''
+        if _MEMORYVIEW_CAST:
+            view = memoryview(data)
+            size = view.nbytes
+            if size >= ZERO_COPY_THRESHOLD and view.c_contiguous:
+                self._flush()
+                self._segments.append(view.cast('B'))
+                self._size += size
+                return
+        else:
+            view = memoryview(data).tobytes()
+            size = len(view)
+
+        if self._position + size > len(self._data):
+            self._reserve(size)
+        self._data[self._position : self._position + size] = view
+        self._position += size
+        self._size += size
+
+
+    def pack(self, layout, *values):
+        '''Appends `values` packed according to the precompiled `layout`
+        (:class:`struct.Struct`) to the message.'''
+        size = layout.size
+        if self._position + size > len(self._data):
+            self._reserve(size)
+        layout.pack_into(self._data, self._position, *values)
+        self._position += size
+        self._size += size
+
+
+    def patch(self, layout, offset, *values):
+        '''Overwrites bytes of the message at the `offset` with `values`
+        packed according to the `layout`. The `offset` cannot point past the
+        first referenced buffer.'''
+        layout.pack_into(self._data, offset, *values)
+
+
+    def tell(self):
+        '''Returns size of the message.'''
+        return self._size
+
+
+    def _flush(self):
+        if self._position > self._start:
+            self._segments.append((self._start, self._position))
+            self._start = self._position
+
+
+    def getbuffers(self):
+        '''Returns list of buffers forming the message.'''
+        self._flush()
+        if not _MEMORYVIEW_CAST:
+            return [bytes(self._data[start : end]) for start, end in self._segments]
+
+        data = memoryview(self._data)
+        return [data[segment[0] : segment[1]] if isinstance(segment, tuple) else segment for segment in self._segments]
+
+
+    def getvalue(self):
+        '''Returns the message as `bytes`.'''
+        return b''.join(self.getbuffers())
+
+
 
 class QWriter(object):
     '''
@@ -45,6 +178,8 @@ class QWriter(object):
      - `stream` (`socket` or `None`) - stream for data serialization
      - `protocol_version` (`integer`) - version IPC protocol
      - `encoding` (`string`) - encoding for characters serialization
+    :Options:
+     - default serialization options, as described for :func:`.write`
     
     :Attrbutes:
      - `_writer_map` - stores mapping between Python types and functions 
@@ -55,10 +190,13 @@ class QWriter(object):
     serialize = Mapper(_writer_map)
 
 
-    def __init__(self, stream, protocol_version, encoding = 'latin-1'):
+    def __init__(self, stream, protocol_version, encoding = 'latin-1', **options):
         self._stream = stream
         self._protocol_version = protocol_version
         self._encoding = encoding
+        self._default_options = MetaData(**CONVERSION_OPTIONS.union_dict(**options))
+        self._write_options = ({}, self._default_options)
+        self._buffer = MessageBuffer()
 
 
     def write(self, data, msg_type, **options):
@@ -72,44 +210,85 @@ class QWriter(object):
          - `single_char_strings` (`boolean`) - if ``True`` single char Python 
            strings are encoded as q strings instead of chars, 
            **Default**: ``False``
+         - `compress` (`boolean`) - if ``True`` messages larger than
+           `compression_threshold` are sent compressed, messages which cannot
+           be compressed to less than half of their size are sent as is,
+           **Default**: ``False``
+         - `compression_threshold` (`integer`) - minimal size in bytes of a
+           message to be compressed, **Default**: ``2000``
         
         :returns: if wraped stream is ``None`` serialized data, 
                   otherwise ``None`` 
         '''
-        self._buffer = BytesIO()
+        # options repeated by subsequent calls, e.g. connection options, are
+        # resolved only once
+        if options != self._write_options[0]:
+            self._write_options = (options, MetaData(**self._default_options.union_dict(**options)))
+        self._options = self._write_options[1]
 
-        self._options = MetaData(**CONVERSION_OPTIONS.union_dict(**options))
+        self._buffer.reset()
+        try:
+            # header and placeholder for message size
+            self._buffer.pack(MESSAGE_HEADER, ord(ENDIANNESS), msg_type, 0)
 
-        # header and placeholder for message size
-        self._buffer.write(('%s%s\0\0\0\0\0\0' % (ENDIANNESS, chr(msg_type))).encode(self._encoding))
+            self._write(data)
 
-        self._write(data)
+            # update message size
+            data_size = self._buffer.tell()
+            self._buffer.patch(MESSAGE_SIZE, 4, data_size)
 
-        # update message size
-        data_size = self._buffer.tell()
-        self._buffer.seek(4)
-        self._buffer.write(struct.pack('i', data_size))
+            buffers = self._buffer.getbuffers()
 
-        # write data to socket
-        if self._stream:
-            self._stream.sendall(self._buffer.getvalue())
-        else:
-            return self._buffer.getvalue()
+            if self._options.compress and self._protocol_version >= 1 and data_size > self._options.compression_threshold:
+                compressed = compress(numpy.frombuffer(b''.join(buffers), dtype = numpy.uint8))
+                if compressed is not None:
+                    buffers = [compressed if _MEMORYVIEW_CAST else compressed.tobytes()]
+
+            # write data to socket
+            if self._stream:
+                self._send(buffers)
+            else:
+                return b''.join(buffers)
+        finally:
+            # release references to serialized data
+            self._buffer.reset()
+
+
+    def _send(self, buffers):
+        '''Sends the message buffers to the wrapped stream, via scatter-gather
+        writes if supported.'''
+        if not _MEMORYVIEW_CAST or not hasattr(self._stream, 'sendmsg'):
+            self._stream.sendall(b''.join(buffers))
+            return
+
+        buffers = [memoryview(buffer).cast('B') for buffer in buffers]
+        index = 0
+        while index < len(buffers):
+            sent = self._stream.sendmsg(buffers[index : index + _IOV_MAX])
+            # skip buffers sent completely, remainder of the partially sent one
+            # is sent with the next call
+            while sent and sent >= len(buffers[index]):
+                sent -= len(buffers[index])
+                index += 1
+            if sent:
+                buffers[index] = buffers[index][sent:]
 
 
     def _write(self, data):
         if data is None:
             self._write_null()
         else:
-            if isinstance(data, Exception) or (type(data) == type and issubclass(data, Exception)):
-                data_type = Exception
-            else:
-                data_type = type(data)
-
+            data_type = type(data)
             writer = self._get_writer(data_type)
 
+            if not writer and (isinstance(data, Exception) or (data_type == type and issubclass(data, Exception))):
+                writer = self._get_writer(Exception)
+
             if writer:
                 writer(self, data)
+            elif data_type.__module__.startswith('pyarrow'):
+                # resolved lazily, so pyarrow is imported only when used
+                self._write_arrow_table(data)
             else:
                 qtype = Q_TYPE.get(type(data), None)
 
@@ -124,12 +303,12 @@ class QWriter(object):
 
 
     def _write_null(self):
-        self._buffer.write(struct.pack('=bx', QNULL))
+        self._buffer.pack(NULL_HEADER, QNULL)
 
 
     @serialize(Exception)
     def _write_error(self, data):
-        self._buffer.write(struct.pack('b', QERROR))
+        self._buffer.pack(TYPE_INDICATOR, QERROR)
         if isinstance(data, Exception):
             msg = data.__class__.__name__
             if data.args:
@@ -143,19 +322,18 @@ class QWriter(object):
 
     def _write_atom(self, data, qtype):
         try:
-            self._buffer.write(struct.pack('b', qtype))
-            fmt = STRUCT_MAP[qtype]
+            layout = ATOM_STRUCTS[qtype]
             if type(data) == numpy.bool_:
-                self._buffer.write(struct.pack(fmt, int(data)))
+                self._buffer.pack(layout, qtype, int(data))
             else:
-                self._buffer.write(struct.pack(fmt, data))
+                self._buffer.pack(layout, qtype, data)
         except KeyError:
             raise QWriterException('Unable to serialize type: %s' % data.__class__ if isinstance(data, object) else type(data))
 
 
     @serialize(tuple, list)
     def _write_generic_list(self, data):
-        self._buffer.write(struct.pack('=bxi', QGENERAL_LIST, len(data)))
+        self._buffer.pack(LIST_HEADER, QGENERAL_LIST, len(data))
         for element in data:
             self._write(element)
 
@@ -165,7 +343,7 @@ class QWriter(object):
         if not self._options.single_char_strings and len(data) == 1:
             self._write_atom(ord(data), QCHAR)
         else:
-            self._buffer.write(struct.pack('=bxi', QSTRING, len(data)))
+            self._buffer.pack(LIST_HEADER, QSTRING, len(data))
             if isinstance(data, str):
                 self._buffer.write(data.encode(self._encoding))
             else:
@@ -174,7 +352,7 @@ class QWriter(object):
 
     @serialize(numpy.bytes_)
     def _write_symbol(self, data):
-        self._buffer.write(struct.pack('=b', QSYMBOL))
+        self._buffer.pack(TYPE_INDICATOR, QSYMBOL)
         if data:
             self._buffer.write(data)
         self._buffer.write(b'\0')
@@ -185,7 +363,7 @@ class QWriter(object):
         if self._protocol_version < 3:
             raise QWriterException('kdb+ protocol version violation: Guid not supported pre kdb+ v3.0')
 
-        self._buffer.write(struct.pack('=b', QGUID))
+        self._buffer.pack(TYPE_INDICATOR, QGUID)
         self._buffer.write(data.bytes)
 
 
@@ -195,9 +373,7 @@ class QWriter(object):
             if self._protocol_version < 1 and (data.meta.qtype == QTIMESPAN or data.meta.qtype == QTIMESTAMP):
                 raise QWriterException('kdb+ protocol version violation: data type %s not supported pre kdb+ v2.6' % hex(data.meta.qtype))
 
-            self._buffer.write(struct.pack('=b', data.meta.qtype))
-            fmt = STRUCT_MAP[data.meta.qtype]
-            self._buffer.write(struct.pack(fmt, to_raw_qtemporal(data.raw, data.meta.qtype)))
+            self._buffer.pack(ATOM_STRUCTS[data.meta.qtype], data.meta.qtype, to_raw_qtemporal(data.raw, data.meta.qtype))
         except KeyError:
             raise QWriterException('Unable to serialize type: %s' % type(data))
 
@@ -210,45 +386,118 @@ class QWriter(object):
             if self._protocol_version < 1 and (qtype == QTIMESPAN or qtype == QTIMESTAMP):
                 raise QWriterException('kdb+ protocol version violation: data type %s not supported pre kdb+ v2.6' % hex(qtype))
 
-            self._buffer.write(struct.pack('=b', qtype))
-            fmt = STRUCT_MAP[qtype]
-            self._buffer.write(struct.pack(fmt, to_raw_qtemporal(data, qtype)))
+            self._buffer.pack(ATOM_STRUCTS[qtype], qtype, to_raw_qtemporal(data, qtype))
         except KeyError:
             raise QWriterException('Unable to serialize type: %s' % data.dtype)
 
 
     @serialize(QLambda)
     def _write_lambda(self, data):
-        self._buffer.write(struct.pack('=b', QLAMBDA))
+        self._buffer.pack(TYPE_INDICATOR, QLAMBDA)
         self._buffer.write(b'\0')
         self._write_string(data.expression)
 
 
     @serialize(QProjection)
     def _write_projection(self, data):
-        self._buffer.write(struct.pack('=bi', QPROJECTION, len(data.parameters)))
+        self._buffer.pack(PROJECTION_HEADER, QPROJECTION, len(data.parameters))
         for parameter in data.parameters:
             self._write(parameter)
 
 
     @serialize(QDictionary, QKeyedTable)
     def _write_dictionary(self, data):
-        self._buffer.write(struct.pack('=b', QDICTIONARY))
+        self._buffer.pack(TYPE_INDICATOR, QDICTIONARY)
         self._write(data.keys)
         self._write(data.values)
 
 
     @serialize(QTable)
     def _write_table(self, data):
-        self._buffer.write(struct.pack('=bxb', QTABLE, QDICTIONARY))
+        self._buffer.pack(TABLE_HEADER, QTABLE, QDICTIONARY)
         self._write(qlist(numpy.array(data.dtype.names), qtype = QSYMBOL_LIST))
-        self._buffer.write(struct.pack('=bxi', QGENERAL_LIST, len(data.dtype)))
+        self._buffer.pack(LIST_HEADER, QGENERAL_LIST, len(data.dtype))
         for column in data.dtype.names:
             self._write_list(data[column], data.meta[column])
 
 
-    @serialize(numpy.ndarray, QList, QTemporalList)
+    @serialize(QColumnarTable, LazyQTable)
+    def _write_columnar_table(self, data):
+        self._buffer.pack(TABLE_HEADER, QTABLE, QDICTIONARY)
+        self._write(qlist(numpy.array(data.columns), qtype = QSYMBOL_LIST))
+        self._buffer.pack(LIST_HEADER, QGENERAL_LIST, len(data.columns))
+        for column in data.columns:
+            self._write_list(data[column], data.meta[column])
+
+
+    def _write_symbols(self, data):
+        if data.dtype.kind == 'U':
+            data = numpy.char.encode(data, self._encoding)
+
+        if data.dtype.kind == 'S':
+            # symbols cannot contain \0, so padding of fixed width bytes is
+            # dropped and each row is terminated with \0 in a single pass
+            width = data.dtype.itemsize
+            chars = numpy.zeros((len(data), width + 1), dtype = numpy.uint8)
+            chars[:, :width] = numpy.ascontiguousarray(data).view(numpy.uint8).reshape(-1, width)
+            mask = chars != 0
+            mask[:, width] = True
+            self._buffer.write(chars[mask])
+        else:
+            symbols = [symbol.encode(self._encoding) if isinstance(symbol, str) else symbol or b'' for symbol in data]
+            symbols.append(b'')
+            self._buffer.write(b'\0'.join(symbols))
+
+
+    def _write_arrow_table(self, data):
+        from qpython import _arrow
+
+        if not isinstance(data, (_arrow.pyarrow.Table, _arrow.pyarrow.RecordBatch)):
+            raise QWriterException('Unable to serialize type: %s' % data.__class__)
+
+        self._buffer.pack(TABLE_HEADER, QTABLE, QDICTIONARY)
+        self._write(qlist(numpy.array(data.schema.names), qtype = QSYMBOL_LIST))
+        self._buffer.pack(LIST_HEADER, QGENERAL_LIST, data.num_columns)
+        for field, column in zip(data.schema, data.columns):
+            self._write_arrow_column(column, _arrow.column_qtype(field))
+
+
+    def _write_arrow_column(self, data, qtype):
+        from qpython import _arrow
+
+        chunks = data.chunks if isinstance(data, _arrow.pyarrow.ChunkedArray) else [data]
+
+        if qtype == QGENERAL_LIST:
+            if not all(_arrow.pyarrow.types.is_string(chunk.type) or _arrow.pyarrow.types.is_binary(chunk.type) for chunk in chunks):
+                self._write_generic_list(data.to_pylist())
+                return
+
+            # strings are written as q strings regardless of their length
+            self._buffer.pack(LIST_HEADER, QGENERAL_LIST, len(data))
+            for chunk in chunks:
+                for string in _arrow.array_to_strings(chunk, self._encoding):
+                    self._buffer.pack(LIST_HEADER, QSTRING, len(string))
+                    self._buffer.write(string)
+            return
+
+        if self._protocol_version < 1 and (qtype == QTIMESPAN or qtype == QTIMESTAMP):
+            raise QWriterException('kdb+ protocol version violation: data type %s not supported pre kdb+ v2.6' % hex(qtype))
+        if self._protocol_version < 3 and qtype == QGUID:
+            raise QWriterException('kdb+ protocol version violation: Guid not supported pre kdb+ v3.0')
+
+        self._buffer.pack(LIST_HEADER, -qtype, len(data))
+        for chunk in chunks:
+            try:
+                self._buffer.write(_arrow.array_to_raw(chunk, qtype, self._encoding))
+            except (KeyError, ValueError) as e:
+                raise QWriterException('Unable to serialize Arrow column of type %s: %s' % (chunk.type, e))
+
+
+    @serialize(numpy.ndarray, QList, QTemporalList, QSymbolCodes, QGuidList)
     def _write_list(self, data, qtype = None):
+        if isinstance(data, QSymbolCodes):
+            data = data.decode()
+
         if qtype is not None:
             qtype = -abs(qtype)
 
@@ -263,22 +512,21 @@ class QWriter(object):
         elif qtype == QCHAR:
             self._write_string(data.tobytes())
         else:
-            self._buffer.write(struct.pack('=bxi', -qtype, len(data)))
+            self._buffer.pack(LIST_HEADER, -qtype, len(data))
             if data.dtype.type in (numpy.datetime64, numpy.timedelta64):
                 # convert numpy temporal to raw q temporal
                 data = array_to_raw_qtemporal(data, qtype = qtype)
 
             if qtype == QSYMBOL:
-                for symbol in data:
-                    if symbol:
-                        self._buffer.write(symbol)
-                    self._buffer.write(b'\0')
+                self._write_symbols(data)
             elif qtype == QGUID:
                 if self._protocol_version < 3:
                     raise QWriterException('kdb+ protocol version violation: Guid not supported pre kdb+ v3.0')
 
-                for guid in data:
-                    self._buffer.write(guid.bytes)
+                if isinstance(data, QGuidList):
+                    self._buffer.write(numpy.ascontiguousarray(data))
+                else:
+                    self._buffer.write(b''.join([guid.bytes for guid in data]))
             else:
-                self._buffer.write(data.tobytes())
+                self._buffer.write(numpy.ascontiguousarray(data))
 
@@ -13,10 +13,99 @@
 #  limitations under the License.
 #
 
+import struct
+
 import numpy
 
 
 
+def compress(data):
+    '''Compresses a serialized IPC message with the q IPC compression
+    algorithm.
+
+    Reference implementation used to produce compressed messages which can be
+    consumed by :func:`.uncompress` and by the q process.
+
+    :Parameters:
+     - `data` (`numpy.uint8` array or `bytes`) - serialized message including
+       the 8 bytes long message header
+
+    :returns: `numpy.uint8` array with compressed message (including the
+              message and compression headers) or ``None`` if the message
+              cannot be compressed to less than half of its size or exceeds
+              2 GB
+    '''
+    # bytearray is indexed by integers on Python 2 as well
+    src = bytearray(data.tobytes() if isinstance(data, numpy.ndarray) else data)
+    t = len(src)
+    e = t // 2
+
+    if e < 12 or t > 0x7fffffff:
+        return None
+
+    dst = bytearray(e)
+    dst[0:4] = src[0:4]
+    dst[2] = 1
+
+    a = [0] * 256
+    i, f, h, h0, s0 = 0, 0, 0, 0, 0
+    c, d, s = 12, 12, 8
+
+    while s < t:
+        if i == 0:
+            if d > e - 17:
+                return None
+
+            i = 1
+            dst[c] = f
+            c = d
+            d += 1
+            f = 0
+
+        g = s > t - 3
+        if not g:
+            h = src[s] ^ src[s + 1]
+            p = a[h]
+            g = p == 0 or src[s] != src[p]
+
+        if s0 > 0:
+            a[h0] = s0
+            s0 = 0
+
+        if g:
+            h0 = h
+            s0 = s
+            dst[d] = src[s]
+            d += 1
+            s += 1
+        else:
+            a[h] = s
+            f |= i
+            p += 2
+            s += 2
+            r = s
+            q = min(s + 255, t)
+            while src[p] == src[s]:
+                s += 1
+                if s >= q:
+                    break
+                p += 1
+
+            dst[d] = h
+            dst[d + 1] = s - r
+            d += 2
+
+        i = (i << 1) & 0xff
+
+    dst[c] = f
+
+    endianness = '<' if src[0] == 1 else '>'
+    struct.pack_into(endianness + 'I', dst, 4, d)
+    struct.pack_into(endianness + 'I', dst, 8, t)
+    return numpy.frombuffer(bytes(dst[:d]), dtype = numpy.uint8)
+
+
+
 def uncompress(data, uncompressed_size):
     _0 = numpy.int64(0)
     _1 = numpy.int64(1)
@@ -71,3 +160,124 @@ def uncompress(data, uncompressed_size):
             i += i
 
     return uncompressed
+
+
+
+_GROUP_SIZE = [9 + bin(f).count('1') for f in range(256)]
+
+
+
+def uncompress_vectorized(data, uncompressed_size):
+    '''Decompresses data compressed with the q IPC compression algorithm.
+
+    Produces output identical to :func:`.uncompress` and is used when the
+    :mod:`qpython.fastutils` extension is not available.
+
+    Token boundaries depend on the flag bytes only, so the token stream is
+    parsed group by group and all literals are copied into place with a single
+    numpy operation. Only back-references, which depend on the hash table
+    state, are resolved sequentially and copied as slices.
+
+    The function is about 4 times faster than :func:`.uncompress` on the
+    benchmark messages (``benchmarks/uncompress_benchmark.py``), which falls
+    short of the targeted order of magnitude, as the sequential resolution of
+    back-references dominates. Only the compiled extension reaches it.
+
+    :Parameters:
+     - `data` (`numpy.uint8` array or `bytes`) - compressed data (without
+       message and compression headers)
+     - `uncompressed_size` (`integer`) - size of the decompressed data
+
+    :returns: `numpy.uint8` array with decompressed data
+    :raises: `ValueError` if compressed data is malformed
+    '''
+    # bytearray is indexed by integers on Python 2 as well
+    src = bytearray(data.tobytes() if isinstance(data, numpy.ndarray) else data)
+    src_array = numpy.frombuffer(src, dtype = numpy.uint8)
+    size = int(uncompressed_size)
+    src_size = len(src)
+
+    if src_size == 0:
+        raise ValueError('Compressed data is empty')
+
+    # locate flag bytes, each group holds 8 tokens: 1 byte literals and
+    # 2 bytes back-references
+    group_starts = []
+    d = 0
+    while d < src_size:
+        group_starts.append(d)
+        d += _GROUP_SIZE[src[d]]
+
+    group_starts = numpy.array(group_starts, dtype = numpy.int64)
+    is_match = ((src_array[group_starts][:, None] >> numpy.arange(8, dtype = numpy.uint8)) & 1) == 1
+    token_size = is_match + 1
+    offsets = group_starts[:, None] + numpy.cumsum(token_size, axis = 1) - token_size + 1
+
+    is_match = is_match.ravel()
+    offsets = offsets.ravel()
+    valid = offsets + is_match < src_size
+    is_match, offsets = is_match[valid], offsets[valid]
+
+    lengths = numpy.ones(len(offsets), dtype = numpy.int64)
+    lengths[is_match] = 2 + src_array[offsets[is_match] + 1].astype(numpy.int64)
+    positions = numpy.cumsum(lengths) - lengths
+
+    count = int(numpy.searchsorted(positions, size))
+    if count == 0 or positions[count - 1] + lengths[count - 1] != size:
+        raise ValueError('Compressed data is truncated or corrupted')
+
+    is_match, offsets, lengths, positions = is_match[:count], offsets[:count], lengths[:count], positions[:count]
+
+    uncompressed = bytearray(size)
+    uncompressed_array = numpy.frombuffer(uncompressed, dtype = numpy.uint8)
+    is_literal = ~is_match
+    uncompressed_array[positions[is_literal]] = src_array[offsets[is_literal]]
+
+    # a literal following another literal registers the hash of the preceding
+    # pair of bytes, the first literal following a back-reference does not
+    follows_literal = numpy.zeros(count, dtype = bool)
+    follows_literal[1:] = is_literal[:-1]
+    updates = is_literal & follows_literal
+    update_positions = positions[updates] - 1
+    update_hashes = uncompressed_array[update_positions] ^ uncompressed_array[update_positions + 1]
+
+    match_tokens = numpy.flatnonzero(is_match)
+    # number of literal hash updates preceding each back-reference
+    update_bounds = numpy.searchsorted(numpy.flatnonzero(updates), match_tokens).tolist()
+    update_hashes = update_hashes.tolist()
+    update_positions = update_positions.tolist()
+
+    view = memoryview(uncompressed)
+    ptrs = [0] * 256
+    u = 0
+
+    for h, s, n, literal, bound in zip(src_array[offsets[match_tokens]].tolist(),
+                                       positions[match_tokens].tolist(),
+                                       lengths[match_tokens].tolist(),
+                                       follows_literal[match_tokens].tolist(),
+                                       update_bounds):
+        while u < bound:
+            ptrs[update_hashes[u]] = update_positions[u]
+            u += 1
+
+        r = ptrs[h]
+        if r + n <= s:
+            view[s : s + n] = view[r : r + n]
+        elif r < s:
+            # overlapping back-reference repeats with period s - r
+            period = uncompressed[r : s]
+            view[s : s + n] = (period * (n // len(period) + 1))[:n]
+        else:
+            raise ValueError('Compressed data is corrupted')
+
+        if literal:
+            ptrs[uncompressed[s - 1] ^ uncompressed[s]] = s - 1
+        # for valid input the copied pair hashes to h by construction of the
+        # hash table
+        ptrs[h] = s
+
+    # memoryview can't be released on Python 2
+    release = getattr(view, 'release', None)
+    if release:
+        release()
+    return uncompressed_array
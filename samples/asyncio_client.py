@@ -0,0 +1,52 @@
+# 
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+# 
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+# 
+#    http://www.apache.org/licenses/LICENSE-2.0
+# 
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+# 
+
+import asyncio
+
+import numpy
+
+from qpython.qasyncio import AsyncQConnection
+from qpython.qcollection import QDictionary
+
+
+async def main():
+    async with AsyncQConnection(host = 'localhost', port = 5000) as q:
+        print(q)
+        print('IPC version: %s. Is connected: %s' % (q.protocol_version, q.is_connected()))
+
+        # definition of asynchronous multiply function
+        # queryid - unique identifier of function call - used to identify
+        # the result
+        # a, b - parameters to the query
+        await q.sync('asynchMult:{[queryid;a;b] res:a*b; (neg .z.w)(`queryid`result!(queryid;res)) }')
+
+        for x in range(10):
+            a = numpy.random.randint(1, 100)
+            b = numpy.random.randint(1, 100)
+            print('Asynchronous call with queryid=%s with arguments: %s, %s' % (x, a, b))
+            q.send_async('asynchMult', numpy.int64(x), numpy.int64(a), numpy.int64(b))
+        await q.drain()
+
+        # messages sent by q are retrieved by iterating over the connection
+        async for message in q:
+            print(message.data)
+
+            if isinstance(message.data, QDictionary) and message.data[b'queryid'] == 9:
+                break
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
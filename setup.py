@@ -83,5 +83,6 @@ setup(name = 'qpython',
           ],
       packages = ['qpython'],
       package_data = {'qpython': ['fastutils.pyx']},
+      extras_require = {'arrow': ['pyarrow>=1.0.0']},
       data_files = [('', ['LICENSE', 'CHANGELOG.txt', 'README.rst', 'requirements.txt'])]
      )
@@ -0,0 +1,225 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import subprocess
+import sys
+import uuid
+
+import numpy as np
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+
+from qpython import qreader, qwriter
+from qpython.qtype import *  # @UnusedWildImport
+from qpython.qcollection import qlist, qtable, QKeyedTable, QTable
+
+
+
+def serialize(data):
+    return qwriter.QWriter(None, 3).write(data, 2)
+
+
+def read(message, **options):
+    return qreader.QReader(None).read(source = message, **options).data
+
+
+def sample_table():
+    columns = [
+        ('b', qlist(np.array([True, False, True]), qtype = QBOOL_LIST)),
+        ('x', qlist(np.array([1, -2**7, 3], dtype = np.int8), qtype = QBYTE_LIST)),
+        ('h', qlist(np.array([1, -2**15, 3], dtype = np.int16), qtype = QSHORT_LIST)),
+        ('i', qlist(np.array([1, 2, -2**31], dtype = np.int32), qtype = QINT_LIST)),
+        ('j', qlist(np.array([-2**63, 2, 3], dtype = np.int64), qtype = QLONG_LIST)),
+        ('e', qlist(np.array([1.5, np.nan, 3], dtype = np.float32), qtype = QFLOAT_LIST)),
+        ('f', qlist(np.array([1.5, 2.5, np.nan]), qtype = QDOUBLE_LIST)),
+        ('s', qlist(np.array([b'AAPL', b'', b'AAPL']), qtype = QSYMBOL_LIST)),
+        ('str', qlist([b'abc', b'', b'de'], qtype = QGENERAL_LIST)),
+        ('g', qlist(np.array([uuid.UUID(int = 1), uuid.UUID(int = 0), uuid.UUID(int = 3)]), qtype = QGUID_LIST)),
+        ('p', qlist(np.array([0, -2**63, 10 ** 18], dtype = np.int64), qtype = QTIMESTAMP_LIST)),
+        ('m', qlist(np.array([0, 13, -2**31], dtype = np.int32), qtype = QMONTH_LIST)),
+        ('d', qlist(np.array([-2**31, 1, -10957], dtype = np.int32), qtype = QDATE_LIST)),
+        ('z', qlist(np.array([0.5, np.nan, -1.25]), qtype = QDATETIME_LIST)),
+        ('n', qlist(np.array([1, 2, -2**63], dtype = np.int64), qtype = QTIMESPAN_LIST)),
+        ('u', qlist(np.array([-2**31, 61, 2], dtype = np.int32), qtype = QMINUTE_LIST)),
+        ('v', qlist(np.array([1, -2**31, 3], dtype = np.int32), qtype = QSECOND_LIST)),
+        ('t', qlist(np.array([1000, 2, -2**31], dtype = np.int32), qtype = QTIME_LIST)),
+    ]
+
+    return qtable(qlist(np.array([name for name, _ in columns]), qtype = QSYMBOL_LIST), [data for _, data in columns])
+
+
+def test_arrow_table():
+    table = read(serialize(sample_table()), arrow = True)
+
+    assert isinstance(table, pa.Table)
+    assert table.num_rows == 3
+    assert table.column_names == ['b', 'x', 'h', 'i', 'j', 'e', 'f', 's', 'str', 'g', 'p', 'm', 'd', 'z', 'n', 'u', 'v', 't']
+    assert table.schema.field('s').metadata == {b'qtype': str(QSYMBOL).encode()}
+
+    expected = {
+        'b': [True, False, True],
+        'x': [1, None, 3],
+        'h': [1, None, 3],
+        'i': [1, 2, None],
+        'j': [None, 2, 3],
+        'e': [1.5, None, 3],
+        'f': [1.5, 2.5, None],
+        's': ['AAPL', None, 'AAPL'],
+        'str': ['abc', '', 'de'],
+        'g': [uuid.UUID(int = 1).bytes, None, uuid.UUID(int = 3).bytes],
+    }
+    for column, values in expected.items():
+        assert table.column(column).to_pylist() == values, column
+
+    temporals = {
+        'p': [np.datetime64('2000-01-01T00:00:00', 'ns'), None, np.datetime64('2031-09-09T01:46:40', 'ns')],
+        'm': [np.datetime64('2000-01-01', 'D'), np.datetime64('2001-02-01', 'D'), None],
+        'd': [None, np.datetime64('2000-01-02', 'D'), np.datetime64('1970-01-01', 'D')],
+        'z': [np.datetime64('2000-01-01T12:00:00', 'ms'), None, np.datetime64('1999-12-30T18:00:00', 'ms')],
+        'n': [np.timedelta64(1, 'ns'), np.timedelta64(2, 'ns'), None],
+        'u': [None, np.timedelta64(61, 'm'), np.timedelta64(2, 'm')],
+        'v': [np.timedelta64(1, 's'), None, np.timedelta64(3, 's')],
+        't': [np.timedelta64(1000, 'ms'), np.timedelta64(2, 'ms'), None],
+    }
+    for column, values in temporals.items():
+        array = table.column(column).chunk(0)
+        assert array.null_count == 1, column
+        mask = np.array([value is None for value in values])
+        actual = array.to_numpy(zero_copy_only = False)
+        assert np.array_equal(np.isnat(actual), mask), column
+        assert (actual[~mask] == np.array([value for value in values if value is not None])).all(), column
+
+    assert pa.types.is_dictionary(table.schema.field('s').type)
+    assert table.schema.field('p').type == pa.timestamp('ns')
+    assert table.schema.field('d').type == pa.date32()
+    assert table.schema.field('n').type == pa.duration('ns')
+
+
+def test_arrow_zero_copy():
+    data = np.arange(1000, dtype = np.int64)
+    message = serialize(qtable(qlist(np.array(['a', 'b']), qtype = QSYMBOL_LIST),
+                               [qlist(data, qtype = QLONG_LIST), qlist(data.astype(np.float64), qtype = QDOUBLE_LIST)]))
+    source = np.frombuffer(message, dtype = np.uint8)
+    start, end = source.ctypes.data, source.ctypes.data + len(message)
+
+    table = read(message, arrow = True)
+    for column in table.columns:
+        assert start <= column.chunk(0).buffers()[1].address < end
+        assert column.null_count == 0
+    assert table.column('a').to_pylist() == list(range(1000))
+
+    table = read(message, arrow = True, copy_arrays = True)
+    assert not start <= table.column('a').chunk(0).buffers()[1].address < end
+    assert table.column('b').to_pylist() == list(range(1000))
+
+
+def test_arrow_options():
+    message = serialize(sample_table())
+
+    table = read(message, arrow = True, columns = ['j', 's', 'p'])
+    assert table.column_names == ['j', 's', 'p']
+
+    expected = read(message, arrow = True)
+    assert read(message, arrow = True, column_threads = 4).equals(expected)
+
+    data = read(message)
+    assert isinstance(data, QTable)
+
+
+def test_arrow_general_list_error():
+    table = qtable(qlist(np.array(['j', 'mixed']), qtype = QSYMBOL_LIST),
+                   [qlist(np.array([1, 2]), qtype = QLONG_LIST), qlist([1, b'abc'], qtype = QGENERAL_LIST)])
+
+    for threads in (0, 2):
+        with pytest.raises(qreader.QReaderException, match = 'column mixed'):
+            read(serialize(table), arrow = True, column_threads = threads)
+    assert read(serialize(table), arrow = True, columns = ['j']).column_names == ['j']
+
+
+def test_arrow_keyed_table():
+    keys = qtable(qlist(np.array(['k']), qtype = QSYMBOL_LIST), [qlist(np.array([1, 2]), qtype = QLONG_LIST)])
+    values = qtable(qlist(np.array(['v']), qtype = QSYMBOL_LIST), [qlist(np.array([1.5, 2.5]), qtype = QDOUBLE_LIST)])
+
+    table = read(serialize(QKeyedTable(keys, values)), arrow = True)
+    assert isinstance(table, QKeyedTable)
+    assert table.values['v'].tolist() == [1.5, 2.5]
+
+
+def test_arrow_pandas_reader():
+    _pandas = pytest.importorskip('qpython._pandas')
+    message = serialize(sample_table())
+
+    table = _pandas.PandasQReader(None).read(source = message, pandas = True, arrow = True).data
+    assert table.equals(read(message, arrow = True))
+    assert _pandas.PandasQWriter(None, 3).write(table, 2) == message
+
+
+def test_arrow_write_roundtrip():
+    message = serialize(sample_table())
+    table = read(message, arrow = True)
+
+    assert serialize(table) == message
+    assert serialize(table.to_batches()[0]) == message
+
+    # chunks and slices are written as single vectors
+    chunked = pa.concat_tables([table.slice(0, 1), table.slice(1)])
+    assert chunked.column('j').num_chunks == 2
+    assert serialize(chunked) == message
+
+
+def test_arrow_write():
+    table = pa.table({
+        'sym': pa.array(['a', None, 'b', 'a']).dictionary_encode(),
+        'name': pa.array(['x', 'yz', None, '']),
+        'size': pa.array([1, None, 3, 4], type = pa.int64()),
+        'price': pa.array([1.5, 2.5, None, 4.0]),
+        'flag': pa.array([True, None, False, True]),
+        'time': pa.array([0, 10 ** 9, None, 86400 * 10 ** 9], type = pa.timestamp('ns')),
+        'date': pa.array([10957, None, 0, 1], type = pa.date32()),
+        'span': pa.array([1, 2, None, 3], type = pa.duration('ms')),
+        'id': pa.array([uuid.UUID(int = 1).bytes, None, uuid.UUID(int = 3).bytes, uuid.UUID(int = 4).bytes], type = pa.binary(16)),
+    })
+
+    data = read(serialize(table))
+    assert isinstance(data, QTable)
+    assert data.meta.sym == QSYMBOL
+    assert data.meta.size == QLONG
+    assert data.meta.time == QTIMESTAMP
+    assert data.meta.date == QDATE
+    assert data.meta.span == QTIMESPAN
+    assert data.meta.id == QGUID
+
+    assert data['sym'].tolist() == [b'a', b'', b'b', b'a']
+    assert data['name'].tolist() == [b'x', b'yz', b'', b'']
+    assert data['size'].tolist() == [1, -2**63, 3, 4]
+    assert np.isnan(data['price'][2]) and data['price'][3] == 4.0
+    assert data['flag'].tolist() == [True, False, False, True]
+    assert data['time'].tolist() == [-946684800 * 10 ** 9, -946684799 * 10 ** 9, -2**63, -946598400 * 10 ** 9]
+    assert data['date'].tolist() == [0, -2**31, -10957, -10956]
+    assert data['span'].tolist() == [10 ** 6, 2 * 10 ** 6, -2**63, 3 * 10 ** 6]
+    assert data['id'].tolist() == [uuid.UUID(int = 1), uuid.UUID(int = 0), uuid.UUID(int = 3), uuid.UUID(int = 4)]
+
+    with pytest.raises(qwriter.QWriterException):
+        qwriter.QWriter(None, 2).write(table, 2)
+
+    with pytest.raises(qwriter.QWriterException):
+        serialize(pa.array([1, 2]))
+
+
+def test_arrow_lazy_import():
+    script = 'import sys; import qpython.qreader, qpython.qwriter; print("pyarrow" in sys.modules)'
+    assert subprocess.check_output([sys.executable, '-c', script]).strip() == b'False'
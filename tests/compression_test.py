@@ -0,0 +1,87 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+from io import BytesIO
+
+import numpy as np
+import pytest
+
+from qpython import qreader, qwriter, utils
+from qpython.qtype import *  # @UnusedWildImport
+from qpython.qcollection import qlist, qtable, QKeyedTable
+
+
+
+def sample_table(rows):
+    rnd = np.random.RandomState(1)
+    return qtable(qlist(np.array(['sym', 'time', 'price', 'size']), qtype = QSYMBOL_LIST),
+                  [qlist(np.array([b'AAPL', b'MSFT', b'IBM'])[rnd.randint(0, 3, rows)], qtype = QSYMBOL_LIST),
+                   qlist(np.cumsum(rnd.randint(0, 1000, rows)).astype(np.int64), qtype = QTIMESPAN_LIST),
+                   qlist(100 + rnd.randint(0, 20, rows) * 0.25, qtype = QDOUBLE_LIST),
+                   qlist(rnd.randint(1, 10, rows) * 100, qtype = QINT_LIST)])
+
+
+@pytest.fixture(params = ['compiled', 'python'])
+def writer_compress(request, monkeypatch):
+    if request.param == 'compiled':
+        fastutils = pytest.importorskip('qpython.fastutils')
+        monkeypatch.setattr(qwriter, 'compress', fastutils.compress)
+    else:
+        monkeypatch.setattr(qwriter, 'compress', utils.compress)
+
+
+def test_write_compressed(writer_compress):
+    writer = qwriter.QWriter(None, 3)
+
+    for data in [sample_table(1000),
+                 QKeyedTable(qtable(['id'], [qlist(np.arange(500), qtype = QLONG_LIST)]), qtable(['v'], [qlist(np.zeros(500), qtype = QDOUBLE_LIST)])),
+                 qlist(np.arange(10000), qtype = QLONG_LIST),
+                 [np.bytes_('upd'), np.bytes_('trade'), sample_table(300)]]:
+        uncompressed = writer.write(data, 1)
+        compressed = writer.write(data, 1, compress = True)
+
+        assert uncompressed[2] == 0
+        assert compressed[2] == 1
+        assert compressed[1] == uncompressed[1]
+        assert len(compressed) < len(uncompressed) // 2
+
+        message = qreader.QReader(None).read(source = compressed)
+        assert message.compression_mode == 1
+        assert message.size == len(compressed)
+        assert qreader.QReader(None).read(source = uncompressed).data == message.data
+
+        message = qreader.QReader(BytesIO(compressed)).read(raw = True)
+        assert message.data == uncompressed[8:]
+
+
+def test_write_compressed_threshold(writer_compress):
+    writer = qwriter.QWriter(None, 3)
+    data = qlist(np.arange(1000), qtype = QLONG_LIST)
+    size = len(writer.write(data, 1))
+
+    assert writer.write(data, 1, compress = True, compression_threshold = size)[2] == 0
+    assert writer.write(data, 1, compress = True, compression_threshold = size - 1)[2] == 1
+    assert writer.write(qlist(np.arange(10), qtype = QLONG_LIST), 1, compress = True)[2] == 0
+
+
+def test_write_compressed_fallback(writer_compress):
+    rnd = np.random.RandomState(5)
+    data = qlist(rnd.randint(0, 2 ** 62, 10000), qtype = QLONG_LIST)
+
+    assert qwriter.QWriter(None, 3).write(data, 1, compress = True) == qwriter.QWriter(None, 3).write(data, 1)
+
+    data = qlist(np.zeros(10000), qtype = QLONG_LIST)
+    assert qwriter.QWriter(None, 0).write(data, 1, compress = True)[2] == 0
@@ -0,0 +1,96 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import struct
+import threading
+import time
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+import numpy as np
+import pytest
+
+from qpython import qreader, qwriter
+from qpython.qconnection import MessageType
+from qpython.qcollection import qlist
+from qpython.qtype import QException, QLONG_LIST
+
+
+
+class QServerHandler(socketserver.BaseRequestHandler):
+    '''Minimal q service used by connection tests.
+
+    Responds to synchronous queries with the query itself, except for:
+     - ``close`` - drops the connection
+     - ``error`` - responds with an error
+     - ``publish`` - sends three asynchronous messages before the response
+     - ``sleep`` - responds after 0.2 seconds
+
+    Connections with username ``denied`` are rejected.
+    '''
+
+    def handle(self):
+        credentials = b''
+        while not credentials.endswith(b'\0'):
+            chunk = self.request.recv(1)
+            if not chunk:
+                return
+            credentials += chunk
+
+        self.server.handshakes.append(credentials)
+        if credentials.startswith(b'denied'):
+            return
+        self.request.sendall(struct.pack('B', 3))
+
+        reader = qreader.QReader(self.request)
+        writer = qwriter.QWriter(self.request, 3)
+        while True:
+            try:
+                message = reader.read()
+            except Exception:
+                return
+
+            query = message.data if isinstance(message.data, bytes) else None
+            if query == b'close':
+                return
+            elif query == b'error':
+                writer.write(QException('type'), MessageType.RESPONSE)
+            elif query == b'publish':
+                for i in range(3):
+                    writer.write(qlist(np.arange(i + 1), qtype = QLONG_LIST), MessageType.ASYNC)
+                if message.type == MessageType.SYNC:
+                    writer.write(query, MessageType.RESPONSE)
+            elif message.type == MessageType.SYNC:
+                if query == b'sleep':
+                    time.sleep(0.2)
+                writer.write(message.data, MessageType.RESPONSE)
+
+
+
+@pytest.fixture
+def server():
+    server_ = socketserver.ThreadingTCPServer(('localhost', 0), QServerHandler)
+    server_.daemon_threads = True
+    server_.handshakes = []
+    thread = threading.Thread(target = server_.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server_
+    server_.shutdown()
+    server_.server_close()
@@ -0,0 +1,95 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import numpy as np
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+from qpython import MetaData, qwriter
+from qpython._pandas import PandasQReader, PandasQWriter
+from qpython.qtype import *  # @UnusedWildImport
+from qpython.qcollection import qlist, qtable
+
+
+
+SYMBOLS = qlist(np.array([b'AAPL', b'', b'MSFT', b'AAPL', b'IBM', b'MSFT']), qtype = QSYMBOL_LIST)
+
+
+def serialize(data):
+    return qwriter.QWriter(None, 3).write(data, 2)
+
+
+def test_read_categorical_symbols():
+    table = qtable(qlist(np.array(['sym', 'size']), qtype = QSYMBOL_LIST), [SYMBOLS, qlist(np.arange(6), qtype = QLONG_LIST)])
+    message = serialize([SYMBOLS, table])
+
+    plain = PandasQReader(None).read(source = message, pandas = True).data
+    result = PandasQReader(None).read(source = message, pandas = True, pandas_categorical_symbols = True).data
+
+    series = result[0]
+    assert isinstance(series.dtype, pd.CategoricalDtype)
+    assert series.meta.qtype == QSYMBOL_LIST
+    assert list(series.cat.categories) == [b'AAPL', b'', b'MSFT', b'IBM']
+    assert list(series) == list(plain[0])
+
+    frame = result[1]
+    assert list(frame.columns) == ['sym', 'size']
+    assert isinstance(frame['sym'].dtype, pd.CategoricalDtype)
+    assert frame.meta.as_dict() == plain[1].meta.as_dict()
+    assert list(frame['sym']) == list(plain[1]['sym'])
+    assert frame.groupby('sym', observed = True)['size'].sum()[b'AAPL'] == 3
+
+
+def test_write_categorical_symbols():
+    expected = serialize(SYMBOLS)
+    writer = PandasQWriter(None, 3)
+
+    series = pd.Series(pd.Categorical([b'AAPL', b'', b'MSFT', b'AAPL', b'IBM', b'MSFT']))
+    assert writer.write(series, 2) == expected
+
+    series = pd.Series(pd.Categorical(['AAPL', None, 'MSFT', 'AAPL', 'IBM', 'MSFT'], categories = ['IBM', 'MSFT', 'AAPL', 'unused']))
+    assert writer.write(series, 2) == expected
+
+    # round trip of a data frame
+    table = qtable(qlist(np.array(['sym', 'size']), qtype = QSYMBOL_LIST), [SYMBOLS, qlist(np.arange(6), qtype = QLONG_LIST)])
+    message = serialize(table)
+    frame = PandasQReader(None).read(source = message, pandas = True, pandas_categorical_symbols = True).data
+    assert writer.write(frame, 2) == message
+
+    # non-string categories are written as values
+    series = pd.Series(pd.Categorical([1, 2, 1]))
+    series.meta = MetaData(qtype = QLONG_LIST)
+    assert writer.write(series, 2) == serialize(qlist(np.array([1, 2, 1]), qtype = QLONG_LIST))
+
+    expected = serialize(qlist(np.array([1, 2, qnull(QLONG), 1]), qtype = QLONG_LIST))
+    series = pd.Series(pd.Categorical([1, 2, None, 1]))
+    assert writer.write(series, 2) == expected
+    series.meta = MetaData(qtype = QLONG_LIST)
+    assert writer.write(series, 2) == expected
+
+    series = pd.Series(pd.Categorical([1.5, None, 1.5]))
+    series.meta = MetaData(qtype = QDOUBLE_LIST)
+    assert writer.write(series, 2) == serialize(qlist(np.array([1.5, np.nan, 1.5]), qtype = QDOUBLE_LIST))
+
+
+def test_write_mixed_symbols():
+    expected = serialize(qlist(np.array([b'a', b'5', b'b', b'3', b'1.5', b'a']), qtype = QSYMBOL_LIST))
+    writer = PandasQWriter(None, 3)
+
+    values = ['a', 5, b'b', np.int64(3), 1.5, 'a']
+    assert writer.write(pd.Series(values, dtype = object), 2) == expected
+    assert writer.write(pd.Series(pd.Categorical(values)), 2) == expected
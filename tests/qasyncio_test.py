@@ -0,0 +1,174 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import asyncio
+import socket
+
+import numpy as np
+import pytest
+
+from qpython import qasyncio, qreader, qwriter
+from qpython.qconnection import MessageType, QConnectionException, QAuthenticationException
+from qpython.qcollection import qlist
+from qpython.qtype import QException, QLONG_LIST
+
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def connect(server, **kwargs):
+    return qasyncio.AsyncQConnection('localhost', server.server_address[1], timeout = 5, **kwargs)
+
+
+def test_sync(server):
+    async def test():
+        async with connect(server) as q:
+            assert q.is_connected()
+            assert q.protocol_version == 3
+
+            assert await q.sync('abc') == b'abc'
+            assert await q('{x+y}', 1, 2) == [b'{x+y}', 1, 2]
+
+            data = qlist(np.arange(10 ** 6), qtype = QLONG_LIST)
+            result = await q.sync(data)
+            assert np.array_equal(result, data)
+
+            assert await q.sync(data, raw = True) == qwriter.QWriter(None, 3).write(data, MessageType.RESPONSE)[8:]
+
+            with pytest.raises(QException):
+                await q.sync('error')
+
+            # responses are matched with queries in order
+            results = await asyncio.gather(*[q.sync(qlist(np.arange(i), qtype = QLONG_LIST)) for i in range(100)])
+            for i, result in enumerate(results):
+                assert np.array_equal(result, np.arange(i))
+
+        assert not q.is_connected()
+
+    run(test())
+
+
+def test_receive(server):
+    async def test():
+        async with connect(server) as q:
+            q.send_async('publish')
+            await q.drain()
+
+            assert np.array_equal(await q.receive(), [0])
+
+            messages = []
+            async for message in q:
+                assert message.type == MessageType.ASYNC
+                messages.append(message.data)
+                if len(messages) == 2:
+                    break
+
+            assert np.array_equal(messages[0], [0, 1])
+            assert np.array_equal(messages[1], [0, 1, 2])
+
+            assert await q.sync('publish') == b'publish'
+            for i in range(3):
+                assert np.array_equal((await q.receive(data_only = False)).data, np.arange(i + 1))
+
+    run(test())
+
+
+def test_connection_closed(server):
+    async def test():
+        q = connect(server)
+        await q.open()
+
+        pending = asyncio.ensure_future(q.sync('abc'))
+        with pytest.raises(QConnectionException):
+            await q.sync('close')
+        with pytest.raises(QConnectionException):
+            await pending
+        assert not q.is_connected()
+
+        assert [message async for message in q] == []
+
+        with pytest.raises(QConnectionException):
+            q.send_async('abc')
+
+    async def cancelled():
+        async with connect(server) as q:
+            first = asyncio.ensure_future(q.sync('abc'))
+            second = asyncio.ensure_future(q.sync('def'))
+            await asyncio.sleep(0)
+            first.cancel()
+            assert await second == b'def'
+
+    run(test())
+    run(cancelled())
+
+
+def test_authentication(server):
+    with pytest.raises(QAuthenticationException):
+        run(connect(server, username = 'denied').open())
+
+
+def test_handshake_timeout():
+    listener = socket.socket()
+    listener.bind(('localhost', 0))
+    listener.listen(1)
+    try:
+        q = qasyncio.AsyncQConnection('localhost', listener.getsockname()[1], timeout = 0.2)
+        with pytest.raises(asyncio.TimeoutError):
+            run(q.open())
+
+        # connection is closed once the handshake times out
+        connection, _ = listener.accept()
+        connection.settimeout(5)
+        try:
+            while connection.recv(1024):
+                pass
+        finally:
+            connection.close()
+    finally:
+        listener.close()
+
+
+def test_framing():
+    writer = qwriter.QWriter(None, 3)
+    data = [qlist(np.arange(i * 1000), qtype = QLONG_LIST) for i in range(10)]
+    stream = b''.join(writer.write(x, MessageType.ASYNC) for x in data)
+
+    class Transport(object):
+        def write(self, data):
+            pass
+
+    loop = asyncio.new_event_loop()
+    for chunk_size in (1, 7, 8, 100, 4096, 65536, len(stream)):
+        messages = []
+        protocol = qasyncio.QProtocol(b':\3\0', messages.append, None, loop)
+        protocol.connection_made(Transport())
+        protocol.data_received(b'\3')
+
+        for i in range(0, len(stream), chunk_size):
+            protocol.data_received(stream[i : i + chunk_size])
+
+        assert protocol.handshake.result() == 3
+        assert len(messages) == len(data)
+        for message, x in zip(messages, data):
+            assert isinstance(message, bytearray)
+            assert np.array_equal(qreader.QReader(None).read(source = message).data, x)
+    loop.close()
@@ -0,0 +1,164 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import numpy as np
+import pytest
+
+from qpython.qtype import *  # @UnusedWildImport
+from qpython.qcollection import *  # @UnusedWildImport
+
+
+
+def symbols(count):
+    return qlist(np.array([('s%d' % i).encode() for i in range(count)]), qtype = QSYMBOL_LIST)
+
+
+def test_dictionary_index():
+    keys = symbols(1000)
+    values = qlist(np.arange(1000) * 10, qtype = QLONG_LIST)
+    d = QDictionary(keys, values)
+
+    assert d[b's0'] == 0
+    assert d[np.bytes_('s999')] == 9990
+    assert d._index is not None
+    with pytest.raises(KeyError):
+        d[b'missing']
+    with pytest.raises(KeyError):
+        d['s1']
+
+    d[b's5'] = -1
+    assert values[5] == -1
+
+    # misses and unhashable keys don't rebuild or disable the index
+    index = d._index
+    with pytest.raises(KeyError):
+        d[b'missing']
+    with pytest.raises(KeyError):
+        d[[1, 2]]
+    assert d._index is index
+
+    # keys modified in place are indexed once keys are assigned
+    keys[1] = b'new'
+    d.keys = keys
+    assert d[b'new'] == 10
+    with pytest.raises(KeyError):
+        d[b's1']
+
+    d.keys = symbols(1000)[::-1]
+    assert d[b's0'] == 9990
+
+    # duplicates resolve to the first occurrence, as in linear scan
+    d = QDictionary([1, 2, 1] * 10, list(range(30)))
+    assert d[1] == 0 and d[2] == 1
+
+    # unhashable keys
+    d = QDictionary([[i] for i in range(20)], list(range(20)))
+    assert d[[7]] == 7
+
+
+def test_dictionary_get_many():
+    keys = symbols(1000)
+    d = QDictionary(keys, qlist(np.arange(1000) * 10, qtype = QLONG_LIST))
+
+    result = d.get_many([b's3', b's999', b's3', b's0'])
+    assert isinstance(result, QList)
+    assert result.meta.qtype == QLONG
+    assert list(result) == [30, 9990, 30, 0]
+    assert list(d.get_many(qlist(np.array([b's7']), qtype = QSYMBOL_LIST))) == [70]
+    assert len(d.get_many([])) == 0
+
+    with pytest.raises(KeyError):
+        d.get_many([b's3', b'missing'])
+
+    # keys modified in place are indexed once keys are assigned
+    keys[3] = b'new'
+    d.keys = keys
+    assert list(d.get_many([b'new', b's4'])) == [30, 40]
+    with pytest.raises(KeyError):
+        d.get_many([b's3'])
+
+    d = QDictionary(qlist(np.array([5, 3, 9, 3]), qtype = QLONG_LIST), [b'a', b'b', b'c', b'd'])
+    assert d.get_many([3, 9, 5.0]) == [b'b', b'c', b'a']
+    assert d.get_many(np.array([3], dtype = np.int16)) == [b'b']
+
+    d = QDictionary([1, 'a', 2.5], ['x', 'y', 'z'])
+    assert d.get_many(['a', 2.5]) == ['y', 'z']
+    with pytest.raises(KeyError):
+        d.get_many(['b'])
+
+
+def test_keyed_table_lookup():
+    count = 1000
+    keys = qtable(['sym'], [symbols(count)])
+    values = qtable(['price', 'size'], [qlist(np.arange(count) * 0.5, qtype = QDOUBLE_LIST), qlist(np.arange(count), qtype = QINT_LIST)])
+    t = QKeyedTable(keys, values)
+
+    assert t.lookup(b's10') == values[10]
+    assert t.lookup(np.bytes_('s999'))['size'] == 999
+    with pytest.raises(KeyError):
+        t.lookup(b'missing')
+
+    rows = t.lookup_many([b's3', b's1', b's3'])
+    assert isinstance(rows, QTable)
+    assert rows.meta.as_dict() == values.meta.as_dict()
+    assert list(rows['size']) == [3, 1, 3]
+    assert len(t.lookup_many([])) == 0
+    with pytest.raises(KeyError):
+        t.lookup_many([b's3', b'missing'])
+
+    # misses don't rebuild the index
+    index = t._index
+    with pytest.raises(KeyError):
+        t.lookup(b'missing')
+    assert t._index is index
+
+    # keys modified in place are indexed once keys are assigned
+    keys['sym'][2] = b'new'
+    t.keys = keys
+    assert t.lookup(b'new')['size'] == 2
+    assert list(t.lookup_many([b'new'])['size']) == [2]
+    with pytest.raises(KeyError):
+        t.lookup(b's2')
+    with pytest.raises(KeyError):
+        t.lookup_many([b's2'])
+
+    t.keys = qtable(['sym'], [symbols(count)[::-1]])
+    assert t.lookup(b's0')['size'] == count - 1
+    assert list(t.lookup_many([b's0'])['size']) == [count - 1]
+
+
+def test_keyed_table_composite_lookup():
+    keys = qtable(['sym', 'ex'], [qlist(np.array([b'a', b'b', b'a', b'b']), qtype = QSYMBOL_LIST),
+                                  qlist(np.array([1, 1, 2, 2]), qtype = QLONG_LIST)])
+    values = qtable(['size'], [qlist(np.array([10, 20, 30, 40]), qtype = QLONG_LIST)])
+    t = QKeyedTable(keys, values)
+
+    assert t.lookup((b'a', 2))['size'] == 30
+    assert t.lookup((np.bytes_('b'), np.int64(1)))['size'] == 20
+    with pytest.raises(KeyError):
+        t.lookup((b'c', 1))
+    with pytest.raises(KeyError):
+        t.lookup(b'a')
+
+    assert list(t.lookup_many([(b'b', 2), (b'a', 1)])['size']) == [40, 10]
+    with pytest.raises(KeyError):
+        t.lookup_many([(b'b', 2), (b'b', 3)])
+    # keys which don't fit the key columns are looked up one by one
+    with pytest.raises(KeyError):
+        t.lookup_many([(b'abc', 1)])
+    with pytest.raises(KeyError):
+        t.lookup_many([(b'a', 1.5)])
+    assert list(t.lookup_many([(b'a', 1.0)])['size']) == [10]
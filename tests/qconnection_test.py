@@ -0,0 +1,106 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import numpy as np
+import pytest
+
+from qpython import qconnection, qreader, qwriter
+from qpython.qcollection import qlist
+from qpython.qtype import QException, QLONG_LIST
+from qpython.qwriter import QWriterException
+
+
+
+def connect(server, **kwargs):
+    return qconnection.QConnection('localhost', server.server_address[1], timeout = 5, **kwargs)
+
+
+def test_sync_many(server):
+    with connect(server) as q:
+        assert q.sendSyncMany([]) == []
+
+        results = q.sendSyncMany(['abc', ('{x+y}', [1, 2]), ('{til x}', (qlist(np.arange(3), qtype = QLONG_LIST), ))])
+        assert results[0] == b'abc'
+        assert results[1] == [b'{x+y}', 1, 2]
+        assert results[2][0] == b'{til x}'
+        assert np.array_equal(results[2][1], np.arange(3))
+
+        queries = [qlist(np.arange(i), qtype = QLONG_LIST) for i in range(100)]
+        for window in (1, 2, 3, 64, 1000):
+            results = q.sendSyncMany(queries, window = window)
+            assert len(results) == len(queries)
+            for result, query in zip(results, queries):
+                assert np.array_equal(result, query)
+
+        # responses larger than socket buffers
+        queries = [qlist(np.arange(10 ** 6), qtype = QLONG_LIST)] * 10
+        for result in q.sendSyncMany(queries, window = 4):
+            assert np.array_equal(result, queries[0])
+
+        assert q.sendSync('abc') == b'abc'
+
+
+def test_sync_many_errors(server):
+    with connect(server) as q:
+        with pytest.raises(QException):
+            q.sendSyncMany(['abc', 'error', 'def', 'error'])
+
+        results = q.sendSyncMany(['abc', 'error', 'def'], return_exceptions = True)
+        assert results[0] == b'abc'
+        assert isinstance(results[1], QException)
+        assert results[2] == b'def'
+
+        with pytest.raises(ValueError):
+            q.sendSyncMany(['abc'], window = 0)
+
+        # nothing is sent when serialization fails
+        with pytest.raises(QWriterException):
+            q.sendSyncMany(['abc', ('f', list(range(9)))])
+        with pytest.raises(QWriterException):
+            q.sendSyncMany(['abc', object()])
+
+        assert q.sendSync('def') == b'def'
+
+
+class FailingReader(qreader.QReader):
+
+    def read_data(self, message_size, compression_mode = 0, **options):
+        data = super(FailingReader, self).read_data(message_size, compression_mode, **options)
+        if data == b'fail':
+            raise qreader.QReaderException('Unable to parse response')
+        return data
+
+
+def test_sync_many_read_error(server):
+    with connect(server, reader_class = FailingReader) as q:
+        with pytest.raises(qreader.QReaderException):
+            q.sendSyncMany(['abc', 'fail', 'def', 'ghi'], window = 4)
+        assert not q.is_connected()
+
+        q.open()
+        assert q.sendSync('xyz') == b'xyz'
+
+
+class LegacyWriter(qwriter.QWriter):
+
+    def __init__(self, stream, protocol_version, encoding = 'latin-1'):
+        super(LegacyWriter, self).__init__(stream, protocol_version, encoding)
+
+
+def test_legacy_writer_class(server):
+    with connect(server, writer_class = LegacyWriter, single_char_strings = True) as q:
+        assert q.sendSync('a') == b'a'
+        assert q.sendSyncMany(['abc', ('{x}', [1])]) == [b'abc', [b'{x}', 1]]
@@ -0,0 +1,124 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import numpy as np
+import pytest
+
+from qpython import qmultiplex
+from qpython.qconnection import MessageType, QConnectionException
+from qpython.qcollection import qlist
+from qpython.qtype import QException, QLONG_LIST
+
+
+
+def connect(server, **kwargs):
+    return qmultiplex.MultiplexedQConnection('localhost', server.server_address[1], timeout = 5, **kwargs)
+
+
+def test_concurrent_sync(server):
+    with connect(server) as q:
+        errors = []
+
+        def run(thread_id):
+            try:
+                for i in range(50):
+                    data = qlist(np.arange(thread_id * 1000 + i), qtype = QLONG_LIST)
+                    assert np.array_equal(q.sendSync(data), data)
+                    assert q('{x}', thread_id) == [b'{x}', thread_id]
+                    with pytest.raises(QException):
+                        q.sendSync('error')
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target = run, args = (i, )) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+
+        results = q.sendSyncMany(['abc', 'error', ('{x}', [1])], return_exceptions = True)
+        assert results[0] == b'abc'
+        assert isinstance(results[1], QException)
+        assert results[2] == [b'{x}', 1]
+
+        with pytest.raises(QConnectionException):
+            q.query(MessageType.SYNC, 'abc')
+
+
+def test_subscribe(server):
+    with connect(server) as q:
+        q.sendAsync('publish')
+        for i in range(3):
+            message = q.receive(data_only = False, timeout = 5)
+            assert message.type == MessageType.ASYNC
+            assert np.array_equal(message.data, np.arange(i + 1))
+
+        with pytest.raises(qmultiplex.QResponseTimeoutException):
+            q.receive(timeout = 0.05)
+
+        updates = queue.Queue()
+        q.subscribe(updates.put)
+
+        assert q.sendSync('publish') == b'publish'
+        for i in range(3):
+            assert np.array_equal(updates.get(timeout = 5).data, np.arange(i + 1))
+
+        q.unsubscribe(updates.put)
+        q.sendAsync('publish')
+        assert np.array_equal(q.receive(timeout = 5), [0])
+        assert updates.empty()
+
+
+def test_timeout(server):
+    with connect(server) as q:
+        q.timeout = 0.05
+        with pytest.raises(qmultiplex.QResponseTimeoutException):
+            q.sendSync('sleep')
+
+        # late response is discarded
+        q.timeout = 5
+        assert q.sendSync('abc') == b'abc'
+
+
+def test_connection_lost(server):
+    q = connect(server)
+    q.open()
+    assert q.is_connected()
+
+    with pytest.raises(QConnectionException):
+        q.sendSync('close')
+
+    with pytest.raises(QConnectionException):
+        q.receive(timeout = 5)
+
+    assert not q.is_connected()
+    with pytest.raises(QConnectionException):
+        q.sendSync('abc')
+
+    q.open()
+    assert q.sendSync('abc') == b'abc'
+    q.close()
+    assert not q.is_connected()
+    assert not q._reader_thread.is_alive()
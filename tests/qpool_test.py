@@ -0,0 +1,189 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import os
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from qpython import qpool, qreader, qwriter
+from qpython.qtype import QException
+
+
+
+def create_pool(server, **kwargs):
+    return qpool.QConnectionPool('localhost', server.server_address[1], reader_class = qreader.QReader, writer_class = qwriter.QWriter, timeout = 5, **kwargs)
+
+
+def test_checkout_checkin(server):
+    with create_pool(server, min_size = 2, max_size = 3) as pool:
+        assert pool.size == 2
+        assert pool.idle == 2
+        assert pool.protocol_version == 3
+
+        with pool.connection() as q:
+            assert q.is_connected()
+            assert pool.idle == 1
+            assert q('abc') == b'abc'
+            assert np.array_equal(q(np.arange(10)), np.arange(10))
+
+        assert pool.idle == 2
+
+        first = pool.checkout()
+        second = pool.checkout()
+        third = pool.checkout()
+        assert len(set([first, second, third])) == 3
+        assert pool.size == 3
+
+        for q in (first, second, third):
+            pool.checkin(q)
+
+        with pool.connection() as q:
+            assert q is third
+
+        metrics = pool.metrics
+        assert metrics['checkouts'] == 5
+        assert metrics['created'] == 3
+        assert metrics['exhausted'] == 0
+
+    assert pool.is_closed()
+    assert pool.size == 0
+    assert not third.is_connected()
+
+    with pytest.raises(qpool.QConnectionPoolException):
+        pool.checkout()
+
+
+def test_protocol_version_reuse(server):
+    with create_pool(server, min_size = 2, max_size = 2, username = 'user', password = 'pwd') as pool:
+        assert pool.size == 2
+
+    assert server.handshakes == [b'user:pwd\x06\x00', b'user:pwd\x03\x00']
+
+
+def test_exhausted(server):
+    with create_pool(server, min_size = 0, max_size = 1) as pool:
+        q = pool.checkout()
+
+        with pytest.raises(qpool.QConnectionPoolException):
+            pool.checkout(timeout = 0.05)
+
+        timer = threading.Timer(0.1, pool.checkin, args = (q, ))
+        timer.start()
+        assert pool.checkout(timeout = 5) is q
+        timer.join()
+        pool.checkin(q)
+
+        metrics = pool.metrics
+        assert metrics['exhausted'] == 2
+        assert metrics['timeouts'] == 1
+        assert metrics['checkouts'] == 2
+        assert metrics['max_wait_time'] >= 0.05
+        assert metrics['wait_time'] >= metrics['max_wait_time'] + 0.04
+
+
+def test_liveness_probe(server):
+    with create_pool(server, min_size = 1, max_size = 2) as pool:
+        with pool.connection() as q:
+            first = q
+            q.sendAsync('close')
+
+        time.sleep(0.1)
+
+        with pool.connection() as q:
+            assert q is not first
+            assert q('abc') == b'abc'
+
+        assert not first.is_connected()
+        assert pool.metrics['discarded'] == 1
+        assert pool.size == 1
+
+
+def test_liveness_probe_high_fd():
+    resource = pytest.importorskip('resource')
+    if resource.getrlimit(resource.RLIMIT_NOFILE)[0] <= 1500:
+        pytest.skip('file descriptor limit too low')
+
+    class Connection(object):
+        def __init__(self, connection):
+            self._connection = connection
+
+        def is_connected(self):
+            return True
+
+    left, right = socket.socketpair()
+    # socket with descriptor above FD_SETSIZE
+    high = socket.socket(fileno = os.dup2(left.fileno(), 1500))
+    left.close()
+    try:
+        assert qpool.QConnectionPool._is_alive(Connection(high))
+        right.close()
+        assert not qpool.QConnectionPool._is_alive(Connection(high))
+    finally:
+        high.close()
+        right.close()
+
+
+def test_discard_on_error(server):
+    with create_pool(server, min_size = 1, max_size = 2) as pool:
+        with pytest.raises(QException):
+            with pool.connection() as q:
+                first = q
+                q('error')
+
+        with pytest.raises(ValueError):
+            with pool.connection() as q:
+                assert q is first
+                raise ValueError()
+
+        assert not first.is_connected()
+        assert pool.size == 0
+        assert pool.metrics['discarded'] == 1
+
+
+def test_idle_eviction(server):
+    with create_pool(server, min_size = 1, max_size = 3, max_idle_time = 0.05) as pool:
+        connections = [pool.checkout() for _ in range(3)]
+        for q in connections:
+            pool.checkin(q)
+        assert pool.idle == 3
+
+        time.sleep(0.1)
+
+        with pool.connection() as q:
+            assert q is connections[-1]
+            assert pool.size == 1
+
+        assert [q.is_connected() for q in connections] == [False, False, True]
+        assert pool.metrics['discarded'] == 2
+
+
+def test_idle_eviction_clock_jump(server, monkeypatch):
+    with create_pool(server, min_size = 1, max_size = 2, max_idle_time = 60) as pool:
+        connections = [pool.checkout() for _ in range(2)]
+        for q in connections:
+            pool.checkin(q)
+
+        # wall clock adjustments don't evict idle connections
+        wall_clock = time.time() + 3600
+        monkeypatch.setattr(time, 'time', lambda: wall_clock)
+
+        with pool.connection():
+            assert pool.size == 2
+        assert pool.metrics['discarded'] == 0
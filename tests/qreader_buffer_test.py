@@ -0,0 +1,279 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import socket
+import struct
+import threading
+import uuid
+from io import BytesIO
+
+import numpy as np
+import pytest
+
+from qpython import qreader, qwriter
+from qpython.qtype import *  # @UnusedWildImport
+from qpython.qcollection import qlist, qtable, QDictionary, QGuidList, QList, QSymbolCodes, QTable
+
+
+
+def serialize(data):
+    return qwriter.QWriter(None, 3).write(data, 2)
+
+
+def test_zero_copy_vectors():
+    data = qtable(qlist(np.array(['a', 'b', 'c']), qtype = QSYMBOL_LIST),
+                  [qlist(np.arange(1000), qtype = QLONG_LIST),
+                   qlist(np.linspace(0, 1, 1000), qtype = QDOUBLE_LIST),
+                   qlist(np.arange(1000) % 7, qtype = QSHORT_LIST)])
+    message = serialize([qlist(np.arange(100), qtype = QINT_LIST), data])
+    buffer_ = np.frombuffer(message, dtype = np.uint8)
+
+    vector, table = qreader.QReader(None).read(source = message).data
+    assert np.shares_memory(vector, buffer_)
+    assert np.array_equal(vector, np.arange(100))
+    assert table == data
+
+    vector, table = qreader.QReader(None).read(source = message, copy_arrays = True).data
+    assert not np.shares_memory(vector, buffer_)
+    assert np.array_equal(vector, np.arange(100))
+    assert table == data
+
+
+def test_stream_vectors():
+    data = qlist(np.arange(1000), qtype = QLONG_LIST)
+    message = serialize(data)
+
+    for copy_arrays in (False, True):
+        result = qreader.QReader(BytesIO(message)).read(copy_arrays = copy_arrays).data
+        assert isinstance(result, QList)
+        assert result.meta.qtype == QLONG
+        assert np.array_equal(result, data)
+
+
+def test_big_endian_vectors():
+    values = np.array([1, -2, 3, qnull(QLONG)], dtype = np.int64)
+    payload = struct.pack('>bbI', QLONG_LIST, 0, len(values)) + values.astype('>i8').tobytes()
+    message = b'\0\2\0\0' + struct.pack('>I', len(payload) + 8) + payload
+
+    for copy_arrays in (False, True):
+        result = qreader.QReader(None).read(source = message, copy_arrays = copy_arrays).data
+        assert result.dtype == np.int64
+        assert result.dtype.isnative
+        assert result.meta.qtype == QLONG
+        assert np.array_equal(result, values)
+
+
+def send_chunks(sock, data, chunk_size):
+    def send():
+        for i in range(0, len(data), chunk_size):
+            sock.sendall(data[i : i + chunk_size])
+
+    thread = threading.Thread(target = send)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def test_socket_recv_into():
+    writer = qwriter.QWriter(None, 3)
+    messages = [qlist(np.arange(100000), qtype = QLONG_LIST),
+                [np.bytes_('upd'), np.bytes_('trade'), qlist(np.arange(10), qtype = QINT_LIST)],
+                qlist(np.array(['a', 'bc', 'def']), qtype = QSYMBOL_LIST),
+                qlist(np.arange(30000) % 10, qtype = QLONG_LIST)]
+    payload = b''.join(writer.write(data, 2) for data in messages)
+    payload += writer.write(-messages[3], 2)
+    payload += writer.write(messages[3], 2, compress = True)
+
+    client, server = socket.socketpair()
+    try:
+        client.settimeout(10)
+        thread = send_chunks(server, payload, 4093)
+        reader = qreader.QReader(client)
+
+        assert np.array_equal(reader.read().data, messages[0])
+
+        result = reader.read(copy_arrays = True).data
+        assert result[:2] == [b'upd', b'trade']
+        assert np.array_equal(result[2], messages[1][2])
+
+        assert reader.read(raw = True).data == writer.write(messages[2], 2)[8:]
+
+        # vectors referencing the message buffer must not be affected by
+        # subsequent reads
+        first = reader.read().data
+        second = reader.read(copy_arrays = True).data
+        third = reader.read().data
+        assert np.array_equal(first, messages[3])
+        assert np.array_equal(second, -messages[3])
+        assert np.array_equal(third, messages[3])
+
+        thread.join()
+    finally:
+        client.close()
+        server.close()
+
+
+def test_socket_closed():
+    client, server = socket.socketpair()
+    try:
+        message = qwriter.QWriter(None, 3).write(qlist(np.arange(1000), qtype = QLONG_LIST), 2)
+        server.sendall(message[:100])
+        server.close()
+
+        with pytest.raises(qreader.QReaderException):
+            qreader.QReader(client).read()
+    finally:
+        client.close()
+
+
+def test_read_only_stream():
+    class Stream(object):
+        def __init__(self, data):
+            self._data = BytesIO(data)
+
+        def read(self, length):
+            return self._data.read(length)
+
+    data = qlist(np.arange(1000), qtype = QLONG_LIST)
+    message = serialize(data)
+
+    reader = qreader.QReader(Stream(message * 2))
+    assert np.array_equal(reader.read().data, data)
+    assert reader.read(raw = True).data == message[8:]
+
+
+def test_symbol_cache():
+    symbols = qlist(np.array([b'AAPL', b'MSFT', b'AAPL', b'IBM']), qtype = QSYMBOL_LIST)
+    message = serialize([np.bytes_('AAPL'), np.bytes_('MSFT'), symbols])
+
+    reader = qreader.QReader(None)
+    first = reader.read(source = message).data
+    second = reader.read(source = message).data
+    assert first[0] == second[0] == b'AAPL'
+    assert first[0] is not second[0]
+
+    first = reader.read(source = message, symbol_cache = 2).data
+    second = reader.read(source = message, symbol_cache = 2).data
+    assert first[0] is second[0]
+    assert first[1] is second[1]
+    assert np.array_equal(second[2], symbols)
+
+    # least recently used symbol is evicted
+    reader.read(source = serialize([np.bytes_('MSFT'), np.bytes_('IBM')]), symbol_cache = 2)
+    assert reader.read(source = serialize(np.bytes_('MSFT')), symbol_cache = 2).data is first[1]
+    assert reader.read(source = serialize(np.bytes_('AAPL')), symbol_cache = 2).data is not first[0]
+
+
+def test_symbol_codes():
+    symbols = qlist(np.array([b'AAPL', b'MSFT', b'AAPL', b'IBM']), qtype = QSYMBOL_LIST)
+    table = qtable(qlist(np.array(['sym', 'size']), qtype = QSYMBOL_LIST), [symbols, qlist(np.arange(4), qtype = QLONG_LIST)])
+    message = serialize([symbols, qlist(np.array([], dtype = np.bytes_), qtype = QSYMBOL_LIST), table, QDictionary(symbols[:2], symbols[2:])])
+
+    reader = qreader.QReader(None)
+    result = reader.read(source = message, symbol_codes = True, symbol_cache = 100).data
+
+    codes = result[0]
+    assert isinstance(codes, QSymbolCodes)
+    assert codes.dtype == np.int32
+    assert list(codes) == [0, 1, 0, 2]
+    assert list(codes.meta.symbols) == [b'AAPL', b'MSFT', b'IBM']
+    assert codes.meta.qtype == QSYMBOL
+    assert np.array_equal(codes.decode(), symbols)
+    assert np.array_equal(codes[2:].decode(), symbols[2:])
+    assert len(result[1]) == 0 and len(result[1].decode()) == 0
+
+    # records hold symbols, dictionary keys are looked up by symbols
+    assert isinstance(result[2], QTable)
+    assert result[2] == table
+    assert result[3].values.meta.symbols[result[3][b'MSFT']] == b'IBM'
+
+    # codes are serialized as symbols
+    assert serialize(result) == message
+
+    # distinct symbols are shared across messages
+    again = reader.read(source = message, symbol_codes = True, symbol_cache = 100).data
+    assert all(x is y for x, y in zip(again[0].meta.symbols, codes.meta.symbols))
+
+
+def test_compact_guids():
+    guids = qlist(np.array([uuid.UUID(int = i * 2 ** 70 + i) for i in range(1, 5)] + [uuid.UUID(int = 0)]), qtype = QGUID_LIST)
+    table = qtable(qlist(np.array(['id', 'size']), qtype = QSYMBOL_LIST), [guids, qlist(np.arange(5), qtype = QLONG_LIST)])
+    message = serialize([guids, qlist(np.array([], dtype = object), qtype = QGUID_LIST), table, QDictionary(guids[:2], guids[2:4])])
+    buffer_ = np.frombuffer(message, dtype = np.uint8)
+
+    result = qreader.QReader(None).read(source = message).data
+    assert result[0].dtype == object
+    assert list(result[0]) == list(guids)
+
+    result = qreader.QReader(None).read(source = message, compact_guids = True).data
+    vector = result[0]
+    assert isinstance(vector, QGuidList)
+    assert vector.dtype == np.dtype('V16')
+    assert vector.meta.qtype == QGUID_LIST
+    assert np.shares_memory(vector, buffer_)
+    assert vector[1] == guids[1]
+    assert vector[-1] == uuid.UUID(int = 0)
+    assert list(vector) == list(guids)
+    assert vector[1:3].tolist() == list(guids[1:3])
+    assert np.array_equal(vector.decode(), guids)
+    assert len(result[1]) == 0 and len(result[1].decode()) == 0
+
+    # records hold uuid objects, dictionary keys are looked up by guids
+    assert result[2] == table
+    assert result[3][guids[1]] == guids[3]
+
+    # raw values are serialized as guids
+    assert serialize(result) == message
+
+    vector = qreader.QReader(None).read(source = message, compact_guids = True, copy_arrays = True).data[0]
+    assert not np.shares_memory(vector, buffer_)
+    assert list(vector) == list(guids)
+
+
+def test_bytes_buffer():
+    for endianness in ('<', '>'):
+        buffer = qreader.QReader.BytesBuffer()
+        buffer.endianness = endianness
+        buffer.wrap(struct.pack(endianness + 'biIqdh', -2, -3, 2**32 - 1, -2**63, 1.5, 7) + b'abc', size = 27)
+
+        assert buffer.get_byte() == -2
+        assert buffer.get_int() == -3
+        assert buffer.get_uint() == 2**32 - 1
+        assert buffer.get_long() == -2**63
+        assert buffer.get('d') == 1.5
+
+        fork = buffer.fork()
+        assert fork.get('h') == 7
+        assert buffer.get('h') == 7
+        assert buffer.position == 27
+
+        # reads are limited by the wrapped size
+        with pytest.raises(qreader.QReaderException):
+            buffer.get_byte()
+        with pytest.raises(qreader.QReaderException):
+            fork.get('i')
+        assert buffer.position == 27
+
+
+def test_nested_lists():
+    data = [[1, [2.5, np.bytes_('a'), [True, np.int16(3), None]]], QDictionary([np.bytes_('k')], [np.int32(-1)]), b'abc']
+    assert qreader.QReader(None).read(source = serialize(data)).data == data
+
+    payload = (struct.pack('>bbI', QGENERAL_LIST, 0, 3) + struct.pack('>bq', QLONG, 1) +
+               struct.pack('>bbI', QGENERAL_LIST, 0, 2) + struct.pack('>bd', QDOUBLE, 2.5) + struct.pack('>bi', QINT, -1) +
+               struct.pack('>bbI', QSTRING, 0, 3) + b'abc')
+    message = b'\0\2\0\0' + struct.pack('>I', len(payload) + 8) + payload
+    assert qreader.QReader(None).read(source = message).data == [1, [2.5, -1], b'abc']
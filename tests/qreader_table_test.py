@@ -0,0 +1,328 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import binascii
+import io
+import struct
+import uuid
+
+import numpy as np
+import pytest
+
+from qpython import qreader, qwriter
+from qpython.qtype import *  # @UnusedWildImport
+from qpython.qcollection import qlist, qtable, qcolumnar_table, QColumnarTable, QKeyedTable, QList, QTable, LazyQTable
+
+
+
+def read_expressions():
+    expressions = []
+
+    with open('tests/QExpressions3.out', 'rb') as f:
+        while True:
+            query = f.readline().strip()
+            binary = f.readline().strip()
+
+            if not binary:
+                break
+
+            binary = binascii.unhexlify(binary)
+            expressions.append((query, b'\1\2\0\0' + struct.pack('<i', len(binary) + 8) + binary))
+
+    return expressions
+
+
+def wide_table(rows, width):
+    rnd = np.random.RandomState(3)
+    columns, data = [], []
+    for i in range(width):
+        kind = i % 6
+        if kind == 0:
+            column = qlist(np.array([b'AAPL', b'MSFT', b'IBM'])[rnd.randint(0, 3, rows)], qtype = QSYMBOL_LIST)
+        elif kind == 1:
+            column = qlist(rnd.randint(0, 10 ** 9, rows).astype(np.int64), qtype = QTIMESTAMP_LIST)
+        elif kind == 2:
+            column = qlist(rnd.standard_normal(rows), qtype = QDOUBLE_LIST)
+        elif kind == 3:
+            column = qlist(rnd.randint(0, 10000, rows).astype(np.int32), qtype = QDATE_LIST)
+        elif kind == 4:
+            column = qlist(np.array([uuid.UUID(int = int(x)) for x in rnd.randint(0, 2 ** 31, rows)]), qtype = QGUID_LIST)
+        else:
+            column = qlist(rnd.randint(0, 100, rows).astype(np.int16), qtype = QSHORT_LIST)
+        columns.append('c%d' % i)
+        data.append(column)
+
+    return qtable(qlist(np.array(columns), qtype = QSYMBOL_LIST), data)
+
+
+def serialize(data):
+    return qwriter.QWriter(None, 3).write(data, 2)
+
+
+def test_skip_object():
+    reader = qreader.QReader(None)
+    for query, message in read_expressions():
+        reader.read_header(source = message)
+        reader._skip_object()
+        assert reader._buffer.position == len(message), query
+
+    message = serialize([wide_table(10, 12), QKeyedTable(wide_table(5, 2), wide_table(5, 3)), np.bytes_('end')])
+    reader.read_header(source = message)
+    reader._skip_object()
+    assert reader._buffer.position == len(message)
+
+
+@pytest.mark.parametrize('numpy_temporals', [False, True])
+def test_column_threads(numpy_temporals):
+    table = wide_table(1000, 60)
+    message = serialize([np.bytes_('upd'), table, QKeyedTable(wide_table(100, 2), wide_table(100, 7))])
+
+    expected = qreader.QReader(None).read(source = message, numpy_temporals = numpy_temporals).data
+    reader = qreader.QReader(None)
+    for threads in (1, 4, 4, 2):
+        result = reader.read(source = message, numpy_temporals = numpy_temporals, column_threads = threads).data
+        assert result[0] == b'upd'
+        assert isinstance(result[1], QTable)
+        assert result[1].dtype == expected[1].dtype
+        assert result[1].meta.as_dict() == expected[1].meta.as_dict()
+        assert result[1] == expected[1]
+        assert result[2] == expected[2]
+
+
+def test_column_threads_pandas():
+    pandas = pytest.importorskip('pandas')
+    from qpython._pandas import PandasQReader
+
+    message = serialize(wide_table(500, 30))
+    expected = PandasQReader(None).read(source = message, pandas = True).data
+    result = PandasQReader(None).read(source = message, pandas = True, column_threads = 4).data
+
+    assert isinstance(result, pandas.DataFrame)
+    assert result.meta.as_dict() == expected.meta.as_dict()
+    pandas.testing.assert_frame_equal(result, expected)
+
+
+@pytest.mark.parametrize('column_threads', [0, 4])
+def test_columns_projection(column_threads):
+    table = wide_table(100, 12)
+    keyed = QKeyedTable(wide_table(20, 2), wide_table(20, 6))
+    message = serialize([table, keyed, table])
+    columns = ['c2', b'c10', 'c4', 'c5', 'missing']
+
+    expected = qreader.QReader(None).read(source = message).data
+    result = qreader.QReader(None).read(source = message, columns = columns, column_threads = column_threads).data
+
+    for i in (0, 2):
+        assert result[i].dtype.names == ('c2', 'c4', 'c5', 'c10')
+        for column in result[i].dtype.names:
+            assert result[i].meta[column] == expected[i].meta[column]
+            assert np.array_equal(result[i][column], expected[i][column])
+
+    # key columns are always read
+    assert isinstance(result[1], QKeyedTable)
+    assert result[1].keys == expected[1].keys
+    assert result[1].values.dtype.names == ('c2', 'c4', 'c5')
+    assert np.array_equal(result[1].values['c5'], expected[1].values['c5'])
+
+    with pytest.raises(qreader.QReaderException):
+        qreader.QReader(None).read(source = message, columns = ['missing'])
+
+
+def test_columns_projection_pandas():
+    pandas = pytest.importorskip('pandas')
+    from qpython._pandas import PandasQReader
+
+    keys = qtable(qlist(np.array(['id']), qtype = QSYMBOL_LIST), [qlist(np.arange(20), qtype = QLONG_LIST)])
+    message = serialize([wide_table(100, 12), QKeyedTable(keys, wide_table(20, 6))])
+
+    expected = PandasQReader(None).read(source = message, pandas = True).data
+    result = PandasQReader(None).read(source = message, pandas = True, columns = ['c1', 'c3', 'c7']).data
+
+    assert list(result[0].columns) == ['c1', 'c3', 'c7']
+    assert result[0].meta.as_dict() == dict(qtype = QTABLE, c1 = QTIMESTAMP_LIST, c3 = QDATE_LIST, c7 = QTIMESTAMP_LIST)
+    pandas.testing.assert_frame_equal(result[0], expected[0][['c1', 'c3', 'c7']])
+
+    assert list(result[1].index.names) == ['id']
+    assert list(result[1].columns) == ['c1', 'c3']
+    pandas.testing.assert_frame_equal(result[1], expected[1][['c1', 'c3']])
+
+
+def test_lazy_table():
+    table = wide_table(100, 12)
+    general = qtable(qlist(np.array(['name', 'id']), qtype = QSYMBOL_LIST), [[b'ab', b'cde', b''], qlist(np.arange(3), qtype = QLONG_LIST)])
+    message = serialize([table, QKeyedTable(wide_table(20, 2), wide_table(20, 3)), general])
+
+    expected = qreader.QReader(None).read(source = message).data
+    result = qreader.QReader(None).read(source = message, lazy_tables = True).data
+
+    assert isinstance(result[0], LazyQTable)
+    assert len(result[0]) == 100
+    assert result[0].columns == list(expected[0].dtype.names)
+    assert result[0].meta.as_dict() == expected[0].meta.as_dict()
+    assert not any(result[0].is_loaded(column) for column in result[0].columns)
+
+    assert np.array_equal(result[0]['c2'], expected[0]['c2'])
+    assert result[0]['c2'].meta.qtype == QDOUBLE
+    assert result[0].is_loaded('c2') and not result[0].is_loaded('c1')
+    assert result[0]['c2'] is result[0][b'c2']
+    with pytest.raises(KeyError):
+        result[0]['missing']
+
+    materialized = result[0].materialize()
+    assert isinstance(materialized, QTable)
+    assert materialized.dtype == expected[0].dtype
+    assert materialized == expected[0]
+    assert result[0][5] == expected[0][5]
+
+    # keyed tables are decoded eagerly
+    assert isinstance(result[1], QKeyedTable)
+    assert result[1] == expected[1]
+
+    assert len(result[2]) == 3
+    assert result[2].meta.as_dict() == expected[2].meta.as_dict()
+    assert result[2] == expected[2]
+
+    result = qreader.QReader(None).read(source = serialize(table), lazy_tables = True, columns = ['c1', 'c3']).data
+    assert result.columns == ['c1', 'c3']
+    assert result.meta.as_dict() == dict(qtype = QTABLE, c1 = QTIMESTAMP, c3 = QDATE)
+    assert result.materialize() == expected[0][['c1', 'c3']]
+
+
+def test_lazy_table_stream():
+    first, second = wide_table(10, 6), wide_table(10, 6)
+    second['c2'] = 0
+
+    # lazy columns have to outlive the receive buffer reused for copied arrays
+    reader = qreader.QReader(io.BytesIO(serialize(first) + serialize(second)))
+    result = reader.read(lazy_tables = True, copy_arrays = True).data
+    reader.read(lazy_tables = True, copy_arrays = True)
+
+    assert np.array_equal(result['c2'], first['c2'])
+    assert result.materialize() == first
+
+
+def test_columnar_table():
+    table = wide_table(100, 12)
+    message = serialize([table, QKeyedTable(wide_table(20, 2), wide_table(20, 3))])
+
+    expected = qreader.QReader(None).read(source = message).data
+    result = qreader.QReader(None).read(source = message, columnar_tables = True).data
+
+    assert isinstance(result[0], QColumnarTable)
+    assert len(result[0]) == 100
+    assert result[0].columns == list(expected[0].dtype.names)
+    assert result[0].meta.as_dict() == expected[0].meta.as_dict()
+    for column in result[0].columns:
+        assert isinstance(result[0][column], QList)
+        assert np.array_equal(result[0][column], expected[0][column])
+    assert result[0] == expected[0]
+    assert result[0].materialize().dtype == expected[0].dtype
+    assert isinstance(result[1], QKeyedTable)
+    assert result[1] == expected[1]
+
+    # serialized without interleaving columns into records
+    assert serialize(result[0]) == serialize(table)
+    assert serialize(result) == message
+
+    lazy = qreader.QReader(None).read(source = message, lazy_tables = True).data
+    assert serialize(lazy) == message
+
+    projected = qreader.QReader(None).read(source = message, columnar_tables = True, columns = ['c2', 'c4']).data[0]
+    assert projected.columns == ['c2', 'c4']
+    assert projected == qreader.QReader(None).read(source = message, columns = ['c2', 'c4']).data[0]
+
+
+@pytest.mark.parametrize('options', [{}, {'numpy_temporals': True}, {'copy_arrays': True}, {'columnar_tables': True},
+                                     {'symbol_codes': True, 'columnar_tables': True}, {'compact_guids': True, 'columnar_tables': True},
+                                     {'column_threads': 4}, {'columns': ['c2', 'c7']}])
+def test_table_plans(options):
+    tables = [wide_table(rows, 12) for rows in (1, 5, 0, 3)]
+    messages = [serialize([table, QKeyedTable(wide_table(rows, 2), wide_table(rows, 3))]) for rows, table in zip((1, 5, 0, 3), tables)]
+
+    uncached = qreader.QReader(None)
+    uncached.MAX_TABLE_PLANS = 0
+    reader = qreader.QReader(None)
+    for message in messages * 2:
+        expected = uncached.read(source = message, **options).data
+        result = reader.read(source = message, **options).data
+        assert type(result[0]) == type(expected[0])
+        assert result[0].meta.as_dict() == expected[0].meta.as_dict()
+        assert serialize(result) == serialize(expected)
+
+    # schemas of the table, keys and values of the keyed table
+    assert uncached._table_plans == {}
+    assert len(reader._table_plans) == 3
+
+
+def test_table_plans_types():
+    names = qlist(np.array(['a', 'b']), qtype = QSYMBOL_LIST)
+    messages = [serialize(qtable(names, [qlist(np.arange(3), qtype = QLONG_LIST), qlist(np.arange(3.0), qtype = QDOUBLE_LIST)])),
+                serialize(qtable(names, [qlist(np.arange(3.0), qtype = QDOUBLE_LIST), [b'x', b'yz', b'']])),
+                serialize(qtable(names, [qlist(np.arange(3), qtype = QTIMESTAMP_LIST), qlist(np.arange(3), qtype = QLONG_LIST)]))]
+
+    reader = qreader.QReader(None)
+    for message in messages * 2:
+        result = reader.read(source = message).data
+        assert result == qreader.QReader(None).read(source = message).data
+        assert serialize(result) == message
+
+    # big endian message of a known schema
+    payload = (struct.pack('>bbbbbI', QTABLE, 0, QDICTIONARY, QSYMBOL_LIST, 0, 2) + b'a\0b\0' +
+               struct.pack('>bbI', QGENERAL_LIST, 0, 2) +
+               struct.pack('>bbI', QLONG_LIST, 0, 2) + np.array([1, 2], dtype = '>i8').tobytes() +
+               struct.pack('>bbI', QDOUBLE_LIST, 0, 2) + np.array([0.5, 1.5], dtype = '>f8').tobytes())
+    result = reader.read(source = b'\0\2\0\0' + struct.pack('>I', len(payload) + 8) + payload).data
+    assert result['a'].tolist() == [1, 2]
+    assert result['b'].tolist() == [0.5, 1.5]
+
+    # reader options don't leak into cached column names
+    pandas = pytest.importorskip('pandas')
+    from qpython._pandas import PandasQReader
+
+    reader = PandasQReader(None)
+    frame = reader.read(source = messages[0], pandas = True).data
+    assert isinstance(frame, pandas.DataFrame)
+    assert list(frame.columns) == ['a', 'b']
+    assert reader.read(source = messages[0]).data == qreader.QReader(None).read(source = messages[0]).data
+    pandas.testing.assert_frame_equal(reader.read(source = messages[0], pandas = True).data, frame)
+
+
+def test_qcolumnar_table():
+    sym = qlist(np.array([b'Dent', b'Beeblebrox', b'Prefect']), qtype = QSYMBOL_LIST)
+    iq = qlist(np.array([98, 42, 126]), qtype = QLONG_LIST)
+
+    table = qcolumnar_table(qlist(np.array(['name', 'iq']), qtype = QSYMBOL_LIST), [sym, iq])
+    assert table['name'] is sym and table['iq'] is iq
+    assert table.meta.as_dict() == dict(qtype = QTABLE, name = QSYMBOL, iq = QLONG)
+    assert table == qtable(['name', 'iq'], [sym, iq])
+
+    hinted = qcolumnar_table(['name', 'iq', 'pos'], [[b'Dent', b'Beeblebrox', b'Prefect'], [98, 42, 126], [[1], b'', 2.5]], name = QSYMBOL, iq = QLONG)
+    assert hinted.meta.as_dict() == dict(qtype = QTABLE, name = QSYMBOL, iq = QLONG, pos = QGENERAL_LIST)
+    assert hinted['iq'].dtype == np.int64
+    assert hinted.columns == ['name', 'iq', 'pos']
+
+    message = serialize(hinted)
+    result = qreader.QReader(None).read(source = message, columnar_tables = True).data
+    assert result.columns == hinted.columns
+    assert result.meta.as_dict() == hinted.meta.as_dict()
+    assert np.array_equal(result['name'], sym)
+    assert np.array_equal(result['iq'], iq)
+    assert list(result['pos'])[1:] == [b'', 2.5]
+
+    with pytest.raises(ValueError):
+        qcolumnar_table(['name', 'iq'], [sym])
+    with pytest.raises(ValueError):
+        qcolumnar_table(['name', 'iq'], [sym, iq[:2]])
@@ -0,0 +1,185 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import socket
+import struct
+import threading
+
+import numpy as np
+import pytest
+
+from qpython import MetaData, qreader, qwriter
+from qpython.qtype import *  # @UnusedWildImport
+from qpython.qcollection import qlist, qtable
+
+
+
+def serialize(data, writer_class = qwriter.QWriter):
+    # strip message header
+    return writer_class(None, 3).write(data, 2)[8:]
+
+
+def symbol_list(symbols):
+    return struct.pack('=bxi', QSYMBOL_LIST, len(symbols)) + b''.join(symbol + b'\0' for symbol in symbols)
+
+
+def test_write_symbols():
+    symbols = [b'AAPL', b'', b'a', b'BRK.B', b'MSFT', b'\xe9t\xe9']
+    expected = symbol_list(symbols)
+
+    assert serialize(qlist(np.array(symbols), qtype = QSYMBOL_LIST)) == expected
+    assert serialize(qlist(np.array(symbols, dtype = object), qtype = QSYMBOL_LIST)) == expected
+    assert serialize(qlist(np.array([symbol.decode('latin-1') for symbol in symbols]), qtype = QSYMBOL_LIST, adjust_dtype = False)) == expected
+    assert serialize(qlist(np.array([None, 'x', b'y'], dtype = object), qtype = QSYMBOL_LIST, adjust_dtype = False)) == symbol_list([b'', b'x', b'y'])
+
+    assert serialize(qlist(np.array([], dtype = 'S1'), qtype = QSYMBOL_LIST)) == symbol_list([])
+    assert serialize(qlist(np.array([b'', b'']), qtype = QSYMBOL_LIST)) == symbol_list([b'', b''])
+
+    # non-contiguous vector
+    data = np.array(symbols * 2)[::2]
+    assert serialize(qlist(data, qtype = QSYMBOL_LIST)) == symbol_list(list(data))
+
+    codes = qreader.QReader(None).read(source = qwriter.QWriter(None, 3).write(qlist(np.array(symbols), qtype = QSYMBOL_LIST), 2), symbol_codes = True).data
+    assert serialize(codes) == expected
+
+
+def test_write_pandas_symbols():
+    pd = pytest.importorskip('pandas')
+    from qpython._pandas import PandasQWriter
+
+    expected = symbol_list([b'AAPL', b'', b'\xe9t\xe9', b'AAPL', b'x'])
+    assert serialize(pd.Series(['AAPL', None, '\xe9t\xe9', 'AAPL', b'x'], dtype = object), PandasQWriter) == expected
+    assert serialize(pd.Series(['AAPL', None, '\xe9t\xe9', 'AAPL', 'x']), PandasQWriter) == expected
+
+    series = pd.Series([b'AAPL', b'', b'x'])
+    series.meta = MetaData(qtype = QSYMBOL_LIST)
+    assert serialize(series, PandasQWriter) == symbol_list([b'AAPL', b'', b'x'])
+
+
+class ScatterStream(object):
+    '''Stream accepting at most `limit` bytes per sendmsg call.'''
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.calls = []
+        self.data = bytearray()
+
+    def sendmsg(self, buffers):
+        self.calls.append(list(buffers))
+        sent = 0
+        for buffer in buffers:
+            chunk = bytes(buffer[:self.limit - sent])
+            self.data += chunk
+            sent += len(chunk)
+            if sent == self.limit:
+                break
+        return sent
+
+
+def big_table(rows):
+    return qtable(qlist(np.array(['sym', 'price', 'size']), qtype = QSYMBOL_LIST),
+                  [qlist(np.array([b'AAPL', b'MSFT'])[np.arange(rows) % 2], qtype = QSYMBOL_LIST),
+                   qlist(np.linspace(0, 1, rows), qtype = QDOUBLE_LIST),
+                   qlist(np.arange(rows, dtype = np.int32), qtype = QINT_LIST)])
+
+
+def test_scatter_gather_write():
+    if not hasattr(memoryview, 'cast'):
+        pytest.skip('scatter-gather writes require Python 3')
+
+    table = big_table(100000)
+    message = qwriter.QWriter(None, 3).write(table, 2)
+
+    for limit in (7, 65536, 10 ** 7):
+        stream = ScatterStream(limit)
+        qwriter.QWriter(stream, 3).write(table, 2)
+        assert bytes(stream.data) == message
+
+    # large vectors are referenced, not copied
+    data = qlist(np.linspace(0, 1, 100000), qtype = QDOUBLE_LIST)
+    stream = ScatterStream(10 ** 7)
+    qwriter.QWriter(stream, 3).write([data, data], 2)
+    buffers = stream.calls[0]
+    assert len(buffers) == 4
+    assert sum(np.shares_memory(np.frombuffer(buffer, dtype = np.uint8), data) for buffer in buffers) == 2
+
+    # small messages are sent as a single buffer
+    stream = ScatterStream(10 ** 7)
+    qwriter.QWriter(stream, 3).write(qlist(np.arange(10), qtype = QLONG_LIST), 2)
+    assert [len(buffers) for buffers in stream.calls] == [1]
+
+
+def test_socket_write():
+    table = big_table(200000)
+    left, right = socket.socketpair()
+    try:
+        thread = threading.Thread(target = qwriter.QWriter(left, 3).write, args = (table, 2))
+        thread.start()
+        result = qreader.QReader(right.makefile('rb')).read().data
+        thread.join()
+    finally:
+        left.close()
+        right.close()
+
+    assert result == table
+
+
+def test_message_buffer():
+    buffer = qwriter.MessageBuffer(capacity = 4, max_capacity = 64)
+    buffer.pack(qwriter.LIST_HEADER, QSTRING, 3)
+    buffer.write(b'abc')
+    buffer.patch(qwriter.LIST_HEADER, 0, QSTRING, 2)
+    assert buffer.tell() == 9
+    assert buffer.getvalue() == struct.pack('=bxi', QSTRING, 2) + b'abc'
+
+    # buffer is reused by the next message
+    buffer.reset()
+    assert buffer.getvalue() == b''
+    buffer.write(b'x' * 100)
+    assert buffer.getvalue() == b'x' * 100
+
+    # memory above the max_capacity is released, also if referenced
+    views = buffer.getbuffers()
+    buffer.reset()
+    buffer.write(b'y' * 10)
+    assert buffer.getvalue() == b'y' * 10
+    assert bytes(views[0]) == b'x' * 100
+
+
+def test_writer_reuse():
+    writer = qwriter.QWriter(None, 3)
+    messages = [['.u.upd', np.bytes_('trade'), [np.bytes_('AAPL'), 1.5 * i, i]] for i in range(100)]
+    messages.append(qlist(np.arange(10 ** 5), qtype = QLONG_LIST))
+
+    results = [writer.write(message, 1) for message in messages]
+    assert results == [qwriter.QWriter(None, 3).write(message, 1) for message in messages]
+    assert writer.write(messages[0], 1) == results[0]
+
+
+def test_writer_options():
+    assert qwriter.QWriter(None, 3, single_char_strings = True).write('a', 1) == qwriter.QWriter(None, 3).write('a', 1, single_char_strings = True)
+    assert qwriter.QWriter(None, 3, single_char_strings = True).write('a', 1, single_char_strings = False) == qwriter.QWriter(None, 3).write('a', 1)
+
+    data = qlist(np.zeros(1000, dtype = np.int64), qtype = QLONG_LIST)
+    writer = qwriter.QWriter(None, 3)
+    writer.write('a', 1, single_char_strings = True)
+    options = writer._options
+    writer.write('a', 1, single_char_strings = True)
+    assert writer._options is options
+
+    writer = qwriter.QWriter(None, 3, compress = True)
+    assert len(writer.write(data, 1)) < 1000
+    assert len(writer.write(data, 1, compress = False)) > 8000
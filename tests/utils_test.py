@@ -0,0 +1,121 @@
+#
+#  Copyright (c) 2011-2014 Exxeleron GmbH
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import binascii
+import struct
+
+import numpy as np
+import pytest
+
+from collections import OrderedDict
+from qpython import utils
+
+
+
+def read_compressed_expressions():
+    BINARY = OrderedDict()
+
+    with open('tests/QCompressedExpressions3.out', 'rb') as f:
+        while True:
+            query = f.readline().strip()
+            binary = f.readline().strip()
+
+            if not binary:
+                break
+
+            BINARY[query] = binascii.unhexlify(binary)
+
+    return BINARY
+
+
+def uncompressed_message(binary, uncompress):
+    uncompressed_size = struct.unpack('<i', binary[:4])[0]
+    data = uncompress(np.frombuffer(binary[4:], dtype = np.uint8), np.int64(uncompressed_size - 8))
+    return b'\1\0\0\0' + struct.pack('<i', uncompressed_size) + data.tobytes()
+
+
+def sample_messages():
+    rnd = np.random.RandomState(42)
+    symbols = np.array([b'AAPL', b'MSFT', b'IBM', b'GOOG', b'ORCL'])
+    return [
+        b'\1\2\0\0' + struct.pack('<i', 8 + 4000) + b'\0' * 4000,
+        b'\1\2\0\0' + struct.pack('<i', 8 + 8000) + np.arange(1000, dtype = np.int64).tobytes(),
+        b'\1\2\0\0' + struct.pack('<i', 8 + 8000) + np.cumsum(rnd.randint(0, 3, 1000)).astype(np.int64).tobytes(),
+        b'\1\2\0\0' + struct.pack('<i', 8 + 20000) + b'\0'.join(symbols[rnd.randint(0, 5, 4000)])[:20000].ljust(20000, b'\0'),
+        b'\1\2\0\0' + struct.pack('<i', 8 + 3000) + b'quick brown fox ' * 187 + b'jumps ov',
+        b'\1\2\0\0' + struct.pack('<i', 8 + 16100) + b'\0' * 5000 + rnd.randint(0, 256, 3000).astype(np.uint8).tobytes() + b'\1' * 8000 + b'\2' * 100,
+    ]
+
+
+def test_compress_matches_q():
+    for query, binary in iter(read_compressed_expressions().items()):
+        message = uncompressed_message(binary, utils.uncompress)
+        compressed = utils.compress(message)
+        assert compressed is not None, 'compression failed: %s' % query
+        assert compressed.tobytes()[8:] == binary, 'compression mismatch: %s' % query
+
+
+def test_compress_roundtrip():
+    for message in sample_messages():
+        compressed = utils.compress(message)
+        assert compressed is not None
+        assert compressed[2] == 1
+        assert struct.unpack('<I', compressed[4:8].tobytes())[0] == len(compressed)
+        assert struct.unpack('<I', compressed[8:12].tobytes())[0] == len(message)
+
+        uncompressed = utils.uncompress(compressed[12:], np.int64(len(message) - 8))
+        assert uncompressed.tobytes() == message[8:]
+
+
+def test_compress_incompressible():
+    rnd = np.random.RandomState(7)
+    payload = rnd.randint(0, 256, 4000).astype(np.uint8).tobytes()
+    assert utils.compress(b'\1\2\0\0' + struct.pack('<i', 8 + len(payload)) + payload) is None
+    assert utils.compress(b'\1\2\0\0' + struct.pack('<i', 10) + b'\0\0') is None
+
+
+def test_uncompress_vectorized():
+    for query, binary in iter(read_compressed_expressions().items()):
+        assert uncompressed_message(binary, utils.uncompress_vectorized) == uncompressed_message(binary, utils.uncompress), 'decompression mismatch: %s' % query
+
+    for message in sample_messages():
+        compressed = utils.compress(message)[12:]
+        expected = utils.uncompress(compressed, np.int64(len(message) - 8))
+        result = utils.uncompress_vectorized(compressed, np.int64(len(message) - 8))
+        assert result.dtype == expected.dtype
+        assert result.tobytes() == expected.tobytes()
+
+    with pytest.raises(ValueError):
+        compressed = utils.compress(sample_messages()[1])[12:]
+        utils.uncompress_vectorized(compressed[:len(compressed) // 2], np.int64(8000))
+
+
+def test_fastutils_uncompress():
+    fastutils = pytest.importorskip('qpython.fastutils')
+
+    for query, binary in iter(read_compressed_expressions().items()):
+        assert uncompressed_message(binary, fastutils.uncompress) == uncompressed_message(binary, utils.uncompress), 'decompression mismatch: %s' % query
+
+    for message in sample_messages():
+        compressed = utils.compress(message)[12:]
+        expected = utils.uncompress(compressed, np.int64(len(message) - 8))
+        result = fastutils.uncompress(compressed, np.int64(len(message) - 8))
+        assert result.dtype == expected.dtype
+        assert result.tobytes() == expected.tobytes()
+
+    with pytest.raises(ValueError):
+        compressed = utils.compress(sample_messages()[1])[12:]
+        fastutils.uncompress(compressed[:len(compressed) // 2], np.int64(8000))